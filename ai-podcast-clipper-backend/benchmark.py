@@ -0,0 +1,903 @@
+"""Local timing comparisons for the clip pipeline.
+
+Usage:
+    python benchmark.py segmenter --video input.mp4 --clips 60:100,300:345,900:950
+    python benchmark.py faces --frames 1500 --tracks 8
+    python benchmark.py facetrack --video clip.mp4 --intervals 2,5,10
+    python benchmark.py transcribe --audio audio.wav --model small --window 120 --overlap 20
+    python benchmark.py transcribe --audio audio.wav --backend faster-whisper --model small --threads 8 --batch-size 1
+    python benchmark.py moments --minutes 180 --latency 1.5
+    S3_ENDPOINT_URL=http://localhost:9000 python benchmark.py s3 --size-mb 512
+    python benchmark.py render --resolutions 1280x720,1920x1080 --lengths 60 --output render.json --compare previous.json
+    python benchmark.py imports --repeats 5 --output imports.json
+    python benchmark.py concurrency --moto --jobs 6 --per-container 1,3 --episode-s 120 --realtime-factor 20
+"""
+import argparse
+import asyncio
+import functools
+import json
+import multiprocessing
+import os
+import pathlib
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from main import (
+    CLIP_TOOL_CHOICE,
+    CLIP_TOOLS,
+    MOMENT_MODEL,
+    S3_BUCKET,
+    ClipperPipeline,
+    LocalJobQueue,
+    TranscriptCache,
+    TranscriptionBackend,
+    SHOT_STATIC_FRACTION,
+    FasterWhisperBackend,
+    TranscriptIndex,
+    WhisperXBackend,
+    build_subtitle_groups,
+    clip_request_messages,
+    compute_crop_offsets,
+    create_basic_vertical_video,
+    create_subtitles_with_ffmpeg,
+    create_vertical_video,
+    cut_clip_segment,
+    detect_speech_regions,
+    download_with_audio_extract,
+    encode_shortlist,
+    encode_transcript_compact,
+    extract_clip_segments,
+    get_s3_client,
+    get_s3_transfer_config,
+    get_video_encoder,
+    identify_moments_windowed,
+    parse_clip_tool_call,
+    plan_shot_framing,
+    probe_video_stream,
+    process_clip,
+    rank_moment_windows,
+    render_clip_fused,
+    select_speaker_faces,
+    shortlist_request_messages,
+    track_faces,
+    transcribe_chunked,
+    validate_clips,
+    write_audio_slice,
+    write_subtitle_file,
+)
+
+
+def parse_clip_ranges(value: str):
+    clip_ranges = []
+    for index, part in enumerate(value.split(",")):
+        start, end = part.split(":")
+        clip_ranges.append((index, float(start), float(end)))
+    return clip_ranges
+
+
+def benchmark_segmenter(video_path: str, clip_ranges: list, repeats: int = 3):
+    """Compare the per-clip cut loop against the single-pass segmenter"""
+    results = {"per_clip": [], "single_pass": []}
+
+    for _ in range(repeats):
+        work_dir = pathlib.Path(tempfile.mkdtemp(prefix="segmenter-bench-"))
+        try:
+            start = time.perf_counter()
+            for clip_index, start_time, end_time in clip_ranges:
+                clip_dir = work_dir / "per_clip" / f"clip_{clip_index}"
+                clip_dir.mkdir(parents=True, exist_ok=True)
+                cut_clip_segment(video_path, clip_dir / f"clip_{clip_index}_segment.mp4", start_time, end_time)
+            results["per_clip"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            extract_clip_segments(str(work_dir / "single_pass"), video_path, clip_ranges)
+            results["single_pass"].append(time.perf_counter() - start)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    summary = {
+        "clips": len(clip_ranges),
+        "per_clip_best_s": min(results["per_clip"]),
+        "single_pass_best_s": min(results["single_pass"]),
+    }
+    summary["speedup"] = summary["per_clip_best_s"] / max(summary["single_pass_best_s"], 1e-9)
+    return summary
+
+
+def synthetic_face_tracks(num_frames: int, num_tracks: int, seed: int = 0, frame_width: int = 1920, frame_height: int = 1080):
+    """Random Columbia-style tracks/scores covering overlapping frame ranges"""
+    rng = np.random.default_rng(seed)
+    tracks, scores = [], []
+    for _ in range(num_tracks):
+        start = int(rng.integers(0, max(num_frames // 2, 1)))
+        end = int(rng.integers(start + 1, num_frames + 1))
+        length = end - start
+        tracks.append({
+            "track": {"frame": np.arange(start, end)},
+            "proc_track": {
+                "s": rng.uniform(40, 120, length) * frame_width / 1920,
+                "x": rng.uniform(100, 1800, length) * frame_width / 1920,
+                "y": rng.uniform(100, 900, length) * frame_height / 1080,
+            },
+        })
+        scores.append(rng.normal(0, 1, length))
+    return tracks, scores
+
+
+def legacy_face_selection(tracks, scores, num_frames: int, frame_width: int, frame_height: int):
+    """The original per-frame dict + np.mean + max(key=...) selection, kept as a baseline"""
+    faces = [[] for _ in range(num_frames)]
+    for tidx, track in enumerate(tracks):
+        score_array = scores[tidx]
+        for fidx, frame in enumerate(track["track"]["frame"].tolist()):
+            slice_start = max(fidx - 30, 0)
+            slice_end = min(fidx + 30, len(score_array))
+            score_slice = score_array[slice_start:slice_end]
+            avg_score = float(np.mean(score_slice) if len(score_slice) > 0 else 0)
+            faces[frame].append({'track': tidx, 'score': avg_score, 'x': track['proc_track']["x"][fidx]})
+
+    scale = 1920 / frame_height
+    resized_width = int(round(frame_width * scale))
+    offsets = []
+    for current_faces in faces:
+        max_score_face = max(current_faces, key=lambda face: face['score']) if current_faces else None
+        if max_score_face and max_score_face['score'] < 0:
+            max_score_face = None
+        if max_score_face:
+            center_x = int(max_score_face["x"] * scale)
+            offsets.append(max(min(center_x - 1080 // 2, resized_width - 1080), 0))
+        else:
+            offsets.append(-1)
+    return np.array(offsets)
+
+
+def benchmark_face_selection(num_frames: int, num_tracks: int, shot_frames: int = 125, frame_width: int = 1920, frame_height: int = 1080):
+    """Time legacy vs vectorized speaker selection on synthetic tracks, and count crop jumps per-frame vs per-shot"""
+    tracks, scores = synthetic_face_tracks(num_frames, num_tracks)
+
+    start = time.perf_counter()
+    legacy_offsets = legacy_face_selection(tracks, scores, num_frames, frame_width, frame_height)
+    legacy_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    best_track, best_x = select_speaker_faces(tracks, scores, num_frames)
+    offsets = compute_crop_offsets(best_x, best_track >= 0, frame_width, frame_height)
+    vectorized_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    shot_ranges = [(first, min(first + shot_frames, num_frames)) for first in range(0, num_frames, shot_frames)]
+    has_face, center_x = plan_shot_framing(best_track, best_x, shot_ranges, static_px=SHOT_STATIC_FRACTION * frame_width)
+    shot_offsets = compute_crop_offsets(center_x, has_face, frame_width, frame_height)
+    shot_plan_s = time.perf_counter() - start
+
+    return {
+        "frames": num_frames,
+        "tracks": num_tracks,
+        "legacy_s": legacy_s,
+        "vectorized_s": vectorized_s,
+        "speedup": legacy_s / max(vectorized_s, 1e-9),
+        "matches": bool(np.array_equal(legacy_offsets, offsets)),
+        "shots": len(shot_ranges),
+        "shot_plan_s": shot_plan_s,
+        "per_frame_crop_changes": int(np.count_nonzero(np.diff(offsets))),
+        "per_shot_crop_changes": int(np.count_nonzero(np.diff(shot_offsets))),
+        "per_frame_mean_step_px": float(np.abs(np.diff(offsets)).mean()) if num_frames > 1 else 0.0,
+        "per_shot_mean_step_px": float(np.abs(np.diff(shot_offsets)).mean()) if num_frames > 1 else 0.0,
+    }
+
+
+def benchmark_face_tracking(video_path: str, intervals: list, proxy_height: int):
+    """Dense (every frame) vs sparse built-in face tracking: time, and how far the resulting crop moves from dense"""
+    width, height = probe_video_stream(video_path)
+
+    def crop_plan(detect_every):
+        start = time.perf_counter()
+        tracks, scores = track_faces(video_path, detect_every=detect_every, proxy_height=proxy_height)
+        elapsed = time.perf_counter() - start
+        num_frames = max((int(track["track"]["frame"][-1]) + 1 for track in tracks), default=0)
+        best_track, best_x = select_speaker_faces(tracks, scores, num_frames)
+        return elapsed, len(tracks), compute_crop_offsets(best_x, best_track >= 0, width, height)
+
+    dense_s, dense_tracks, dense_offsets = crop_plan(1)
+    results = {"video": video_path, "proxy_height": proxy_height, "dense_s": dense_s, "dense_tracks": dense_tracks, "sparse": []}
+    for interval in intervals:
+        sparse_s, sparse_tracks, offsets = crop_plan(interval)
+        frames = min(len(offsets), len(dense_offsets))
+        both = (offsets[:frames] >= 0) & (dense_offsets[:frames] >= 0)
+        results["sparse"].append({
+            "detect_every": interval,
+            "seconds": sparse_s,
+            "speedup": dense_s / max(sparse_s, 1e-9),
+            "tracks": sparse_tracks,
+            "crop_agreement": float(np.mean((offsets[:frames] >= 0) == (dense_offsets[:frames] >= 0))) if frames else 1.0,
+            "mean_crop_error_px": float(np.abs(offsets[:frames][both] - dense_offsets[:frames][both]).mean()) if both.any() else 0.0,
+        })
+    return results
+
+
+def benchmark_transcription(audio_path: str, backend_name: str, model_size: str, window_s: float, overlap_s: float,
+                            threads: int = 0, batch_size: int = 8, align: bool = True, vad: bool = False):
+    """Whole-file vs windowed transcription on CPU (int8) with the chosen backend.
+
+    vad=True also times the windowed pass over the speech regions only, as the pipeline runs it.
+    """
+    import whisperx
+
+    if backend_name == "whisperx":
+        backend = WhisperXBackend(model_size, device="cpu", compute_type="int8", batch_size=batch_size, align=align)
+    else:
+        backend = FasterWhisperBackend(model_size, threads=threads, batch_size=batch_size, align=align)
+    start = time.perf_counter()
+    backend.load()
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    audio = whisperx.load_audio(audio_path)
+    whole = backend.align(backend.transcribe(audio), audio)
+    whole_s = time.perf_counter() - start
+    audio_s = len(audio) / 16000
+    del audio
+
+    start = time.perf_counter()
+    chunked = list(transcribe_chunked(backend, audio_path, window_s=window_s, overlap_s=overlap_s))
+    chunked_s = time.perf_counter() - start
+
+    whole_words = [word.get("word", "").strip().lower() for segment in whole for word in segment.get("words", [])]
+    chunked_words = [word.get("word", "").strip().lower() for segment in chunked for word in segment.get("words", [])]
+
+    vad_results = {}
+    if vad:
+        start = time.perf_counter()
+        speech_map = detect_speech_regions(audio_path)
+        vad_s = time.perf_counter() - start
+        with tempfile.TemporaryDirectory() as work_dir:
+            speech_path = speech_map.write_compacted(audio_path, pathlib.Path(work_dir) / "speech.wav")
+            start = time.perf_counter()
+            speech_only = [speech_map.remap_segment(segment) for segment in
+                           transcribe_chunked(backend, speech_path, window_s=window_s, overlap_s=overlap_s)]
+            speech_only_s = time.perf_counter() - start
+        speech_words = [word.get("word", "").strip().lower() for segment in speech_only for word in segment.get("words", [])]
+        vad_results = {
+            "vad_s": vad_s,
+            "speech_s": speech_map.speech_s,
+            "speech_regions": len(speech_map.regions),
+            "speech_only_s": speech_only_s,
+            "speech_only_speedup": chunked_s / max(speech_only_s + vad_s, 1e-9),
+            "speech_only_words": len(speech_words),
+        }
+
+    return {
+        "backend": backend.describe(),
+        "load_s": load_s,
+        "audio_s": audio_s,
+        "whole_file_s": whole_s,
+        "chunked_s": chunked_s,
+        "measured_realtime_factor": audio_s / max(chunked_s, 1e-9),
+        "whole_file_words": len(whole_words),
+        "chunked_words": len(chunked_words),
+        "identical_words": whole_words == chunked_words,
+        **vad_results,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def synthetic_transcript(duration_s: float, seed: int = 0):
+    """WhisperX-shaped segments with word timings covering duration_s seconds"""
+    rng = np.random.default_rng(seed)
+    vocabulary = ["so", "the", "thing", "is", "nobody", "talks", "about", "money", "honestly", "crazy",
+                  "why", "would", "you", "ever", "do", "that", "we", "built", "it", "anyway"]
+    segments = []
+    t = 0.0
+    while t < duration_s:
+        words = []
+        for _ in range(int(rng.integers(6, 18))):
+            word_duration = float(rng.uniform(0.15, 0.5))
+            words.append({"word": str(rng.choice(vocabulary)), "start": round(t, 3), "end": round(t + word_duration, 3),
+                          "score": round(float(rng.uniform(0.5, 1.0)), 3)})
+            t += word_duration + float(rng.uniform(0.02, 0.3))
+        words[-1]["word"] += str(rng.choice([".", "?", "!"]))
+        segments.append({"start": words[0]["start"], "end": words[-1]["end"],
+                         "text": " ".join(word["word"] for word in words), "words": words})
+        t += float(rng.uniform(0.2, 1.5))
+    return segments
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible /chat/completions that returns one tool call.
+
+    It proposes a 40s clip starting 10s into the transcript it was sent and
+    reports prompt tokens as characters / 4.
+    """
+
+    latency_s = 0.5
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        content = body["messages"][-1]["content"]
+        first_line = next(line for line in content.splitlines() if line.startswith("["))
+        start = float(first_line[1:first_line.index(",")]) + 10
+        time.sleep(self.latency_s)
+
+        arguments = {"clips": [{"start": start, "end": start + 40, "reason": "stub", "hook": f"Stub clip at {start:.0f}s",
+                                "virality_score": int(start) % 10 + 1}]}
+        response = {
+            "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "tool_calls", "message": {
+                "role": "assistant", "content": None,
+                "tool_calls": [{"id": "call_stub", "type": "function", "function": {
+                    "name": "identify_podcast_clips", "arguments": json.dumps(arguments)}}]}}],
+            "usage": {"prompt_tokens": len(json.dumps(body["messages"])) // 4, "completion_tokens": 60,
+                      "total_tokens": len(json.dumps(body["messages"])) // 4 + 60},
+        }
+        payload = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def benchmark_moments(minutes: float, latency_s: float):
+    """Single blocking request vs windowed concurrent requests vs the locally ranked shortlist, against a local stub server"""
+    from openai import AsyncOpenAI, OpenAI
+
+    StubOpenAIHandler.latency_s = latency_s
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    transcript = synthetic_transcript(minutes * 60)
+    segments = [{"start": s["start"], "end": s["end"], "text": s["text"]} for s in transcript]
+    try:
+        start = time.perf_counter()
+        response = OpenAI(api_key="stub", base_url=base_url).chat.completions.create(
+            model=MOMENT_MODEL,
+            messages=clip_request_messages(encode_transcript_compact(segments)),
+            tools=CLIP_TOOLS,
+            tool_choice=CLIP_TOOL_CHOICE,
+            temperature=0.5
+        )
+        single_clips = validate_clips(parse_clip_tool_call(response))
+        single_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        windowed_clips, window_stats = asyncio.run(
+            identify_moments_windowed(AsyncOpenAI(api_key="stub", base_url=base_url), segments))
+        windowed_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        shortlist = rank_moment_windows(TranscriptIndex(transcript))
+        rank_s = time.perf_counter() - start
+        shortlist_response = OpenAI(api_key="stub", base_url=base_url).chat.completions.create(
+            model=MOMENT_MODEL,
+            messages=shortlist_request_messages(encode_shortlist(segments, shortlist)),
+            tools=CLIP_TOOLS,
+            tool_choice=CLIP_TOOL_CHOICE,
+            temperature=0.5
+        )
+        shortlist_clips = validate_clips(parse_clip_tool_call(shortlist_response))
+        shortlist_s = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    return {
+        "segments": len(segments),
+        "indented_json_tokens": len(json.dumps(segments, indent=2)) // 4,
+        "single_prompt_tokens": response.usage.prompt_tokens,
+        "single_s": single_s,
+        "single_clips": len(single_clips),
+        "windowed_s": windowed_s,
+        "windowed_clips": len(windowed_clips),
+        "windows": window_stats,
+        "rank_s": rank_s,
+        "shortlist_windows": len(shortlist),
+        "shortlist_prompt_tokens": shortlist_response.usage.prompt_tokens,
+        "shortlist_s": shortlist_s,
+        "shortlist_clips": len(shortlist_clips),
+    }
+
+
+class SleepingBackend(TranscriptionBackend):
+    """Stand-in GPU transcriber that sleeps in proportion to the audio and returns word-timed filler segments"""
+
+    name = "sleep"
+
+    def __init__(self, realtime_factor: float, segment_s: float = 4.0):
+        self.realtime_factor = realtime_factor
+        self.segment_s = segment_s
+
+    def transcribe(self, audio):
+        duration = len(audio) / 16000
+        time.sleep(duration / self.realtime_factor)
+        segments = []
+        for start in np.arange(0.0, max(duration - 1.0, 0.0), self.segment_s):
+            words = [{"word": word, "start": float(start + index * 0.5), "end": float(start + index * 0.5 + 0.4), "score": 0.9}
+                     for index, word in enumerate(("this", "is", "a", "stub", "segment"))]
+            segments.append({"start": words[0]["start"], "end": words[-1]["end"],
+                             "text": " ".join(word["word"] for word in words), "words": words})
+        return segments
+
+    def cache_settings(self):
+        return {"realtime_factor": self.realtime_factor}
+
+
+def start_benchmark_s3(use_moto: bool):
+    """Return (s3_client, moto_server_or_None) with S3_BUCKET created"""
+    server = None
+    if use_moto:
+        from moto.server import ThreadedMotoServer
+        server = ThreadedMotoServer(port=5123, verbose=False)
+        server.start()
+        os.environ["S3_ENDPOINT_URL"] = "http://127.0.0.1:5123"
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+
+    s3_client = get_s3_client()
+    try:
+        s3_client.create_bucket(Bucket=S3_BUCKET, CreateBucketConfiguration={"LocationConstraint": os.environ.get("AWS_DEFAULT_REGION", "eu-north-1")})
+    except Exception:
+        pass
+    return s3_client, server
+
+
+def benchmark_concurrency(jobs: int, per_container: list, episode_s: float, realtime_factor: float, latency_s: float,
+                          job_memory_mb: int, use_moto: bool):
+    """Jobs per container vs throughput and transcriber utilization, running ClipperPipeline.run_pipeline on CPU.
+
+    Every job downloads the same synthetic episode from S3, is transcribed by
+    SleepingBackend through the container's gate, picks moments through the
+    stub OpenAI server and renders and uploads its clips. The transcript
+    cache is disabled so every job transcribes, and admission reserves
+    job_memory_mb per job since no model is loaded.
+    """
+    from openai import AsyncOpenAI, OpenAI
+
+    StubOpenAIHandler.latency_s = latency_s
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    openai_client = OpenAI(api_key="stub", base_url=base_url)
+
+    s3_client, moto_server = start_benchmark_s3(use_moto)
+    work_dir = pathlib.Path(tempfile.mkdtemp(prefix="concurrency-bench-"))
+    try:
+        episode_path = work_dir / "episode.mp4"
+        generate_synthetic_podcast(episode_path, 640, 360, episode_s)
+        s3_key = "benchmark/episode.mp4"
+        s3_client.upload_file(str(episode_path), S3_BUCKET, s3_key)
+
+        runs = []
+        for max_jobs in per_container:
+            pipeline = ClipperPipeline()
+            pipeline.setup(SleepingBackend(realtime_factor), max_jobs, openai_client=openai_client,
+                           async_openai_client_factory=functools.partial(AsyncOpenAI, api_key="stub", base_url=base_url))
+            pipeline.transcript_cache = TranscriptCache(work_dir / "transcripts", 0)
+            pipeline.admission.job_memory_bytes = job_memory_mb * 1024 ** 2
+
+            queue = LocalJobQueue(pipeline.run_pipeline, max_workers=jobs)
+            start = time.perf_counter()
+            job_ids = [queue.submit(s3_key) for _ in range(jobs)]
+            records = [queue.result(job_id) for job_id in job_ids]
+            wall_s = time.perf_counter() - start
+            queue.shutdown()
+
+            gate = pipeline.transcriber.gate
+            runs.append({
+                "jobs_per_container": max_jobs,
+                "wall_s": wall_s,
+                "jobs_per_minute": jobs * 60 / wall_s,
+                "transcriber_busy_s": gate.busy_s,
+                "transcriber_utilization": gate.busy_s / wall_s,
+                "succeeded": sum(record["status"] == "succeeded" for record in records),
+                "clips": sum(record["result"]["clips_processed"] for record in records if record["status"] == "succeeded"),
+            })
+        return {"jobs": jobs, "episode_s": episode_s, "realtime_factor": realtime_factor, "openai_latency_s": latency_s, "runs": runs}
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+        if moto_server:
+            moto_server.stop()
+
+
+def benchmark_s3(video_path: str, size_mb: int, use_moto: bool):
+    """Upload/download throughput with boto3 defaults vs the tuned transfer config.
+
+    Points at S3_ENDPOINT_URL (e.g. MinIO), or starts moto's in-process server
+    with --moto. Without --video a file of random bytes is used, so the
+    streamed audio extraction is only exercised with a real video.
+    """
+    from boto3.s3.transfer import TransferConfig
+
+    s3_client, server = start_benchmark_s3(use_moto)
+
+    work_dir = pathlib.Path(tempfile.mkdtemp(prefix="s3-bench-"))
+    try:
+        source = pathlib.Path(video_path) if video_path else work_dir / "payload.bin"
+        if not video_path:
+            with open(source, "wb") as payload:
+                for _ in range(size_mb):
+                    payload.write(os.urandom(1024 * 1024))
+        size = source.stat().st_size / 1e6
+        key = "benchmark/payload"
+
+        def timed(action):
+            start = time.perf_counter()
+            action()
+            elapsed = time.perf_counter() - start
+            return {"seconds": elapsed, "mb_per_s": size / max(elapsed, 1e-9)}
+
+        results = {"size_mb": size}
+        results["upload_default"] = timed(lambda: s3_client.upload_file(str(source), S3_BUCKET, key, Config=TransferConfig()))
+        results["upload_tuned"] = timed(lambda: s3_client.upload_file(str(source), S3_BUCKET, key, Config=get_s3_transfer_config()))
+        results["download_default"] = timed(lambda: s3_client.download_file(S3_BUCKET, key, str(work_dir / "default.bin"), Config=TransferConfig()))
+        results["download_tuned"] = timed(lambda: s3_client.download_file(S3_BUCKET, key, str(work_dir / "tuned.bin"), Config=get_s3_transfer_config()))
+        results["download_with_audio_extract"] = timed(
+            lambda: download_with_audio_extract(s3_client, key, work_dir / "streamed.bin", work_dir / "audio.wav"))
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        if server:
+            server.stop()
+
+
+SPEECH_LIKE_AUDIO = ("aevalsrc='0.5*sin(2*PI*(150+30*sin(2*PI*0.7*t))*t)*(0.55+0.45*sin(2*PI*4*t))*gt(sin(2*PI*0.23*t),-0.7)'"
+                     ":s=44100:d={duration}")
+TONE_AUDIO = "sine=frequency=220:sample_rate=44100:duration={duration}"
+RENDER_STAGES = ["cut", "audio_slice", "basic_vertical", "face_vertical", "subtitles", "fused_render",
+                 "process_clip_fused", "process_clip_multistep"]
+
+
+def generate_synthetic_podcast(output_path, width: int, height: int, duration_s: float, fps: int = 25, audio: str = "speech"):
+    """Encode a lavfi test pattern with a tone or speech-like audio track as a stand-in episode.
+
+    The speech-like track is a pitch-wobbling voice band with a 4 Hz syllable
+    envelope and periodic pauses, which keeps audio filters and the AAC encoder
+    busier than a constant tone.
+    """
+    audio_source = (SPEECH_LIKE_AUDIO if audio == "speech" else TONE_AUDIO).format(duration=duration_s)
+    command = (f"ffmpeg -y -f lavfi -i testsrc2=size={width}x{height}:rate={fps}:duration={duration_s} "
+               f"-f lavfi -i \"{audio_source}\" "
+               f"-c:v libx264 -preset veryfast -g {fps * 2} -pix_fmt yuv420p -c:a aac -b:a 128k -shortest {output_path}")
+    subprocess.run(command, shell=True, check=True, capture_output=True)
+
+    master_audio_path = pathlib.Path(output_path).with_name("audio.wav")
+    subprocess.run(f"ffmpeg -y -i {output_path} -vn -acodec pcm_s16le -ar 16000 -ac 1 {master_audio_path}",
+                   shell=True, check=True, capture_output=True)
+    return master_audio_path
+
+
+def read_proc_status_mb(field: str):
+    with open("/proc/self/status") as status_file:
+        for line in status_file:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def measure_stage(stage_fn, output_seconds: float, frames):
+    """Run stage_fn in a forked worker so CPU time and peak memory belong to this stage alone.
+
+    cpu_s covers the worker and every ffmpeg process it waited for. Peak RSS
+    values start from the worker's RSS at fork (baseline_rss_mb), since a
+    forked or exec'd child inherits its parent's high-water mark.
+    """
+    context = multiprocessing.get_context("fork")
+    reader, writer = context.Pipe(duplex=False)
+
+    def worker():
+        baseline_mb = read_proc_status_mb("VmRSS")
+        start = time.perf_counter()
+        error = None
+        try:
+            stage_fn()
+        except Exception as e:
+            error = repr(e)
+        wall_s = time.perf_counter() - start
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        writer.send({
+            "wall_s": wall_s,
+            "cpu_s": own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+            "baseline_rss_mb": baseline_mb,
+            "peak_rss_mb": max(own.ru_maxrss, children.ru_maxrss) / 1024,
+            "error": error,
+        })
+
+    process = context.Process(target=worker)
+    process.start()
+    # Only the worker holds the write end now, so its death (OOM kill, signal) ends recv() with EOFError
+    writer.close()
+    try:
+        result = reader.recv()
+    except EOFError:
+        process.join()
+        return {"output_s": output_seconds, "frames": frames, "wall_s": None, "cpu_s": None, "baseline_rss_mb": None,
+                "peak_rss_mb": None, "frames_per_s": None, "output_s_per_cpu_s": None,
+                "error": f"worker crashed with exit code {process.exitcode}"}
+    finally:
+        reader.close()
+    process.join()
+
+    result["output_s"] = output_seconds
+    result["frames"] = frames
+    result["frames_per_s"] = frames / max(result["wall_s"], 1e-9) if frames else None
+    result["output_s_per_cpu_s"] = output_seconds / max(result["cpu_s"], 1e-9)
+    for field in ("wall_s", "cpu_s", "baseline_rss_mb", "peak_rss_mb", "frames_per_s", "output_s_per_cpu_s"):
+        if result[field] is not None:
+            result[field] = round(result[field], 3)
+    return result
+
+
+def benchmark_render(width: int, height: int, length_s: float, clip_s: float, fps: int, audio: str, stages: list):
+    """Time each rendering stage on one synthetic episode with the encoder get_video_encoder picks"""
+    work_dir = pathlib.Path(tempfile.mkdtemp(prefix="render-bench-"))
+    try:
+        source_path = work_dir / "input.mp4"
+        master_audio_path = generate_synthetic_podcast(source_path, width, height, length_s, fps, audio)
+
+        clip_s = min(clip_s, length_s)
+        clip_start = (length_s - clip_s) / 2
+        clip_end = clip_start + clip_s
+        clip_frames = int(round(clip_s * fps))
+
+        transcript = TranscriptIndex(synthetic_transcript(length_s))
+        tracks, scores = synthetic_face_tracks(clip_frames, 4, frame_width=width, frame_height=height)
+
+        clip_dir = work_dir / "clip"
+        clip_dir.mkdir(parents=True)
+        segment_path = clip_dir / "segment.mp4"
+        audio_path = clip_dir / "audio.wav"
+        vertical_path = clip_dir / "vertical.mp4"
+        subtitle_path = clip_dir / "subtitles.ass"
+        write_subtitle_file(build_subtitle_groups(transcript, clip_start, clip_end), str(subtitle_path))
+
+        # Untimed inputs, so any subset of stages can run; the timed stages write their own outputs
+        encoder = get_video_encoder()
+        cut_clip_segment(str(source_path), segment_path, clip_start, clip_end)
+        write_audio_slice(master_audio_path, clip_start, clip_end, audio_path)
+        if "subtitles" in stages:
+            create_basic_vertical_video(str(segment_path), str(audio_path), vertical_path)
+
+        def run_process_clip(render_mode):
+            base_dir = work_dir / f"process_{render_mode}"
+            base_dir.mkdir()
+            shutil.copy(master_audio_path, base_dir / "audio.wav")
+            process_clip(str(base_dir), str(source_path), "benchmark/input.mp4", 0, clip_start, clip_end, transcript, render_mode=render_mode)
+
+        stage_fns = {
+            "cut": lambda: cut_clip_segment(str(source_path), clip_dir / "cut.mp4", clip_start, clip_end),
+            "audio_slice": lambda: write_audio_slice(master_audio_path, clip_start, clip_end, clip_dir / "audio_slice.wav"),
+            "basic_vertical": lambda: create_basic_vertical_video(str(segment_path), str(audio_path), clip_dir / "basic_vertical.mp4"),
+            "face_vertical": lambda: create_vertical_video(tracks, scores, str(segment_path), str(audio_path),
+                                                           clip_dir / "face_vertical.mp4", framerate=fps),
+            "subtitles": lambda: create_subtitles_with_ffmpeg(transcript, clip_start, clip_end, str(vertical_path),
+                                                              str(clip_dir / "subtitled.mp4")),
+            "fused_render": lambda: render_clip_fused(str(source_path), clip_start, clip_end, subtitle_path, clip_dir / "fused.mp4"),
+            "process_clip_fused": lambda: run_process_clip("fused"),
+            "process_clip_multistep": lambda: run_process_clip("multistep"),
+        }
+
+        results = {}
+        for stage in RENDER_STAGES:
+            if stage in stages:
+                frames = None if stage == "audio_slice" else clip_frames
+                results[stage] = measure_stage(stage_fns[stage], clip_s, frames)
+        return {"resolution": f"{width}x{height}", "length_s": length_s, "clip_s": clip_s, "fps": fps, "audio": audio,
+                "codec": encoder.codec, "tier": encoder.tier, "stages": results}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+HEAVY_MODULES = ["torch", "whisperx", "transformers", "pyannote", "cv2", "boto3", "botocore", "pysubs2", "tqdm", "openai"]
+
+
+def parse_importtime(stderr: str, module: str):
+    """Direct imports of module from `python -X importtime` output as {name: (self_us, cumulative_us)}, plus its own cumulative time"""
+    pending = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, package = line[len("import time:"):].split("|")
+        # Each nesting level is indented two spaces and printed before the module that imported it
+        depth = (len(package) - len(package.lstrip()) - 1) // 2
+        if depth == 1:
+            pending[package.strip()] = (int(self_us), int(cumulative_us))
+        elif depth == 0:
+            if package.strip() == module:
+                return pending, int(cumulative_us)
+            pending = {}
+    raise RuntimeError(f"{module} not found in -X importtime output")
+
+
+def benchmark_imports(module: str, repeats: int, top: int):
+    """Cold import cost of module in fresh interpreters, and which heavy dependencies it pulls in"""
+    script_dir = str(pathlib.Path(__file__).resolve().parent)
+
+    def timed_run(code, *flags):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, *flags, "-c", code], cwd=script_dir, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"{code!r} failed: {result.stderr[-2000:]}")
+        return time.perf_counter() - start, result
+
+    startup_s = float(np.median([timed_run("pass")[0] for _ in range(repeats)]))
+    import_runs = [timed_run(f"import {module}")[0] - startup_s for _ in range(repeats)]
+    _, traced = timed_run(f"import {module}", "-X", "importtime")
+    children, module_us = parse_importtime(traced.stderr, module)
+    _, loaded = timed_run(f"import {module}, json, sys; print(json.dumps(sorted(set({HEAVY_MODULES!r}) & set(sys.modules))))")
+
+    ranked = sorted(children.items(), key=lambda item: item[1][1], reverse=True)
+    return {
+        "module": module,
+        "python": platform.python_version(),
+        "interpreter_startup_s": startup_s,
+        "import_s": float(np.median(import_runs)),
+        "import_runs_s": import_runs,
+        "importtime_ms": module_us / 1000,
+        "top_imports": [{"module": name, "cumulative_ms": cumulative / 1000, "self_ms": self_us / 1000}
+                        for name, (self_us, cumulative) in ranked[:top]],
+        "heavy_modules_loaded": json.loads(loaded.stdout.strip().splitlines()[-1]),
+    }
+
+
+def benchmark_environment():
+    ffmpeg_version = subprocess.run("ffmpeg -version", shell=True, capture_output=True, text=True).stdout.split("\n")[0]
+    commit = subprocess.run("git rev-parse --short HEAD", shell=True, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    return {
+        "commit": commit or None,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "cpus": len(os.sched_getaffinity(0)),
+        "ffmpeg": ffmpeg_version,
+    }
+
+
+def compare_render_results(current: dict, baseline: dict):
+    """Per run and stage, the ratio of current to baseline frames/s and output-seconds per CPU-second"""
+    def run_key(run):
+        return run["resolution"], run["length_s"], run["clip_s"], run["audio"], run.get("codec"), run.get("tier")
+
+    baseline_runs = {run_key(run): run for run in baseline["runs"]}
+    comparison = []
+    for run in current["runs"]:
+        previous = baseline_runs.get(run_key(run))
+        if previous is None:
+            continue
+        for stage, result in run["stages"].items():
+            before = previous["stages"].get(stage)
+            if not before:
+                continue
+            entry = {"resolution": run["resolution"], "length_s": run["length_s"], "stage": stage}
+            for field in ("frames_per_s", "output_s_per_cpu_s"):
+                if result.get(field) and before.get(field):
+                    entry[f"{field}_ratio"] = round(result[field] / before[field], 3)
+            if result.get("peak_rss_mb") is not None and before.get("peak_rss_mb") is not None:
+                entry["peak_rss_mb_delta"] = round(result["peak_rss_mb"] - before["peak_rss_mb"], 1)
+            comparison.append(entry)
+    return {"baseline_commit": baseline["environment"].get("commit"), "stages": comparison}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    segmenter = subparsers.add_parser("segmenter", help="Per-clip cuts vs single-pass segmenting")
+    segmenter.add_argument("--video", required=True)
+    segmenter.add_argument("--clips", required=True, help="Comma separated start:end pairs in seconds")
+    segmenter.add_argument("--repeats", type=int, default=3)
+
+    faces = subparsers.add_parser("faces", help="Legacy vs vectorized speaker-face selection")
+    faces.add_argument("--frames", type=int, default=1500)
+    faces.add_argument("--tracks", type=int, default=8)
+    faces.add_argument("--shot-frames", type=int, default=125, help="Synthetic shot length for the per-shot framing plan")
+
+    facetrack = subparsers.add_parser("facetrack", help="Dense vs sparse built-in CPU face tracking on a real clip")
+    facetrack.add_argument("--video", required=True, help="Clip with visible faces")
+    facetrack.add_argument("--intervals", default="2,5,10", help="Comma-separated detect-every-N values to compare with dense")
+    facetrack.add_argument("--proxy-height", type=int, default=360)
+
+    transcribe = subparsers.add_parser("transcribe", help="Whole-file vs windowed CPU transcription")
+    transcribe.add_argument("--audio", required=True, help="16 kHz mono WAV")
+    transcribe.add_argument("--backend", choices=["whisperx", "faster-whisper"], default="whisperx")
+    transcribe.add_argument("--model", default="small")
+    transcribe.add_argument("--threads", type=int, default=0, help="CPU threads for faster-whisper (0 = all cores)")
+    transcribe.add_argument("--batch-size", type=int, default=8, help="1 decodes sequentially with word timestamps")
+    transcribe.add_argument("--no-align", action="store_true", help="Skip wav2vec2 alignment")
+    transcribe.add_argument("--window", type=float, default=120)
+    transcribe.add_argument("--overlap", type=float, default=20)
+    transcribe.add_argument("--vad", action="store_true", help="Also time transcription of the speech regions only")
+
+    moments = subparsers.add_parser("moments", help="Single vs windowed moment identification against a stub server")
+    moments.add_argument("--minutes", type=float, default=180)
+    moments.add_argument("--latency", type=float, default=1.5, help="Stub response latency in seconds")
+
+    s3 = subparsers.add_parser("s3", help="S3 transfer throughput against MinIO (S3_ENDPOINT_URL) or moto")
+    s3.add_argument("--video", help="Upload this file instead of random bytes")
+    s3.add_argument("--size-mb", type=int, default=256)
+    s3.add_argument("--moto", action="store_true", help="Start an in-process moto server")
+
+    render = subparsers.add_parser("render", help="CPU-only per-stage clip rendering on synthetic lavfi episodes")
+    render.add_argument("--resolutions", default="1280x720,1920x1080", help="Comma separated WxH source sizes")
+    render.add_argument("--lengths", default="60", help="Comma separated episode lengths in seconds")
+    render.add_argument("--clip", type=float, default=30, help="Clip length in seconds, cut from the middle")
+    render.add_argument("--fps", type=int, default=25)
+    render.add_argument("--audio", choices=["speech", "tone"], default="speech")
+    render.add_argument("--stages", default=",".join(RENDER_STAGES))
+    render.add_argument("--encoder", default="x264", choices=["auto", "nvenc", "x264", "x265"],
+                        help="VIDEO_ENCODER backend for every render stage")
+    render.add_argument("--tier", default="final", choices=["preview", "final"])
+    render.add_argument("--output", default="render_benchmark.json")
+    render.add_argument("--compare", help="Earlier render results JSON to compare against")
+
+    imports = subparsers.add_parser("imports", help="Cold import time of the backend module (python -X importtime)")
+    imports.add_argument("--module", default="main")
+    imports.add_argument("--repeats", type=int, default=5)
+    imports.add_argument("--top", type=int, default=15, help="Slowest direct imports of --module to list")
+    imports.add_argument("--output", help="Also write the results to this JSON file")
+
+    concurrency = subparsers.add_parser("concurrency", help="Jobs per container vs throughput, running the pipeline with a stub transcriber")
+    concurrency.add_argument("--jobs", type=int, default=6)
+    concurrency.add_argument("--per-container", default="1,3", help="Comma separated jobs-per-container values")
+    concurrency.add_argument("--episode-s", type=float, default=120, help="Synthetic episode length")
+    concurrency.add_argument("--realtime-factor", type=float, default=20, help="Audio seconds the stub transcribes per second")
+    concurrency.add_argument("--latency", type=float, default=1.5, help="Stub OpenAI response latency in seconds")
+    concurrency.add_argument("--job-memory-mb", type=int, default=512, help="Memory admission reserves per job")
+    concurrency.add_argument("--moto", action="store_true", help="Start an in-process moto server instead of S3_ENDPOINT_URL")
+
+    args = parser.parse_args()
+
+    if args.command == "segmenter":
+        summary = benchmark_segmenter(args.video, parse_clip_ranges(args.clips), args.repeats)
+    elif args.command == "faces":
+        summary = benchmark_face_selection(args.frames, args.tracks, args.shot_frames)
+    elif args.command == "facetrack":
+        summary = benchmark_face_tracking(args.video, [int(value) for value in args.intervals.split(",")], args.proxy_height)
+    elif args.command == "transcribe":
+        summary = benchmark_transcription(args.audio, args.backend, args.model, args.window, args.overlap,
+                                          args.threads, args.batch_size, not args.no_align, args.vad)
+    elif args.command == "moments":
+        summary = benchmark_moments(args.minutes, args.latency)
+    elif args.command == "s3":
+        summary = benchmark_s3(args.video, args.size_mb, args.moto)
+    elif args.command == "render":
+        stages = args.stages.split(",")
+        os.environ["VIDEO_ENCODER"] = args.encoder
+        os.environ["RENDER_TIER"] = args.tier
+        summary = {"environment": benchmark_environment(), "runs": []}
+        for resolution in args.resolutions.split(","):
+            width, height = (int(value) for value in resolution.split("x"))
+            for length in args.lengths.split(","):
+                summary["runs"].append(benchmark_render(width, height, float(length), args.clip, args.fps, args.audio, stages))
+        if args.compare:
+            with open(args.compare) as baseline_file:
+                summary["comparison"] = compare_render_results(summary, json.load(baseline_file))
+        with open(args.output, "w") as output_file:
+            json.dump(summary, output_file, indent=2)
+    elif args.command == "concurrency":
+        summary = benchmark_concurrency(args.jobs, [int(value) for value in args.per_container.split(",")],
+                                        args.episode_s, args.realtime_factor, args.latency, args.job_memory_mb, args.moto)
+    elif args.command == "imports":
+        summary = benchmark_imports(args.module, args.repeats, args.top)
+        summary["environment"] = benchmark_environment()
+        if args.output:
+            with open(args.output, "w") as output_file:
+                json.dump(summary, output_file, indent=2)
+
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,62 @@
+import abc
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import functools
 import glob
+import gzip
+import hashlib
 import json
+import math
 import pathlib
 import pickle
+import resource
 import shutil
 import subprocess
+import threading
 import time
+import urllib.error
+import urllib.request
 import uuid
-import boto3
-import cv2
+import wave
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Literal
 from fastapi import Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-import ffmpegcv
 import modal
 import numpy as np
 from pydantic import BaseModel
 import os
-try:
-    from openai import OpenAI
-except ImportError:
-    OpenAI = None  # Will be available in Modal environment
 
-import pysubs2
-from tqdm import tqdm
-import whisperx
+# whisperx (and the torch stack behind it), cv2, boto3, pysubs2, tqdm and openai
+# are imported where they are first used, so job endpoints, the local
+# entrypoint and the render/subtitle/transcript helpers start without them.
 
 
 class ProcessVideoRequest(BaseModel):
     s3_key: str
+    horizontal: bool = False
+
+
+class SubmitJobRequest(BaseModel):
+    s3_key: str
+    callback_url: str | None = None
+    horizontal: bool = False
+    priority: Literal["normal", "low"] = "normal"
+
+
+class RerenderClipRequest(BaseModel):
+    s3_key: str
+    clip_index: int
+    start_time: float
+    end_time: float
+    subtitles: list[tuple[float, float, str]] | None = None
+    transcript_segments: list[dict] | None = None
+    style: dict | None = None
+    framing: str = "pad"
+    tier: Literal["preview", "final"] | None = None
 
 
 image = (modal.Image.from_registry(
@@ -44,113 +74,757 @@ volume = modal.Volume.from_name(
     "ai-podcast-clipper-model-cache", create_if_missing=True
 )
 
+jobs = modal.Dict.from_name("ai-podcast-clipper-jobs", create_if_missing=True)
+metrics_store = modal.Dict.from_name("ai-podcast-clipper-metrics", create_if_missing=True)
+
 mount_path = "/root/.cache/torch/"
 
+S3_BUCKET = "ai-podcast-clipper11"
+S3_CHUNK_BYTES = 16 * 1024 * 1024
+S3_MAX_CONCURRENCY = 16
+UPLOAD_WORKERS = 4
+
+WHISPER_MODEL = "large-v2"
+TRANSCRIPT_LANGUAGE = "en"
+TRANSCRIBE_WINDOW_SECONDS = 600
+TRANSCRIBE_OVERLAP_SECONDS = 30
+# Energy pre-pass: only speech regions (plus padding) are sent to the transcriber
+VAD_MODE = os.environ.get("VAD_MODE", "energy")
+VAD_FRAME_SECONDS = 0.03
+VAD_MARGIN_DB = 12.0
+VAD_SILENCE_DB = -60.0
+VAD_MIN_SPEECH_SECONDS = 0.25
+VAD_MIN_SILENCE_SECONDS = 1.0
+VAD_PAD_SECONDS = 0.3
+VAD_GAP_SECONDS = 0.5
+VAD_MAX_SPEECH_FRACTION = 0.95
+VAD_MIN_CLIP_SPEECH_RATIO = float(os.environ.get("VAD_MIN_CLIP_SPEECH_RATIO", 0.6))
+TRANSCRIPT_CACHE_DIR = os.environ.get("TRANSCRIPT_CACHE_DIR", os.path.join(mount_path, "transcripts"))
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.environ.get("TRANSCRIPT_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+RENDER_MODE = os.environ.get("RENDER_MODE", "fused")
+RENDER_CACHE_DIR = os.environ.get("RENDER_CACHE_DIR", os.path.join(mount_path, "renders"))
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("RENDER_CACHE_MAX_BYTES", 8 * 1024 ** 3))
+# Entries used this recently may be listed in a render still in progress, so eviction leaves them alone
+RENDER_CACHE_MIN_IDLE_SECONDS = 15 * 60
+RENDER_CHUNK_SECONDS = float(os.environ.get("RENDER_CHUNK_SECONDS", 2.0))
+# Jobs sharing one container: transcription is serialized, everything else overlaps
+JOBS_PER_CONTAINER = int(os.environ.get("JOBS_PER_CONTAINER", 3))
+JOB_MEMORY_BYTES = int(os.environ.get("JOB_MEMORY_BYTES", 4 * 1024 ** 3))
+JOB_DISK_FACTOR = 3.0
+# Face-tracked framing is decided per shot ("shot") or per frame as before ("frame")
+SHOT_FRAMING = os.environ.get("SHOT_FRAMING", "shot")
+SHOT_DETECT_THRESHOLD = 27.0
+SHOT_DETECT_DOWNSCALE = 4
+SHOT_DETECT_FRAME_SKIP = 1
+SHOT_MIN_FACE_FRACTION = 0.5
+SHOT_SMOOTH_FRAMES = 25
+SHOT_STATIC_FRACTION = 0.05
+# Built-in CPU face tracking: detect every Nth frame (1 = dense) on a low-resolution proxy
+FACE_TRACK_FRAMERATE = 25
+FACE_DETECT_INTERVAL = int(os.environ.get("FACE_DETECT_INTERVAL", 5))
+FACE_PROXY_HEIGHT = int(os.environ.get("FACE_PROXY_HEIGHT", 360))
+FACE_TRACK_IOU = 0.3
+
 auth_scheme = HTTPBearer()
 
-def create_vertical_video(tracks, scores, pyframes_path, pyavi_path, audio_path, output_path, framerate=25):
-    target_width = 1080
-    target_height = 1920
+METRICS_LOG_PATH = os.environ.get("METRICS_LOG_PATH")
+METRICS_INSTANCE_ID = os.environ.get("MODAL_TASK_ID") or uuid.uuid4().hex
+METRICS_KEY_PREFIX = "container:"
+
+METRICS_COUNTERS = {
+    "runs": ("clipper_stage_runs_total", "Stage executions"),
+    "failures": ("clipper_stage_failures_total", "Stage executions that raised or had a failing command"),
+    "wall_s": ("clipper_stage_wall_seconds_total", "Wall-clock seconds spent in the stage"),
+    "cpu_s": ("clipper_stage_cpu_seconds_total", "CPU seconds of the stage thread and its child processes"),
+    "bytes_in": ("clipper_stage_bytes_in_total", "Bytes read by the stage"),
+    "bytes_out": ("clipper_stage_bytes_out_total", "Bytes written by the stage"),
+}
+
+class MetricsRegistry:
+    """Process-wide per-stage counters; snapshots are published for the metrics endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+        self._totals = {}
+
+    def observe(self, span: dict):
+        with self._lock:
+            totals = self._totals.setdefault(span["stage"], dict.fromkeys(METRICS_COUNTERS, 0))
+            totals["runs"] += 1
+            totals["failures"] += 0 if span["ok"] else 1
+            for field in ("wall_s", "cpu_s", "bytes_in", "bytes_out"):
+                totals[field] += span.get(field) or 0
+
+    def snapshot(self):
+        with self._lock:
+            stages = {stage: dict(totals) for stage, totals in self._totals.items()}
+        return {"stages": stages, "peak_rss_bytes": peak_rss_kb() * 1024}
+
+    def publish(self, store):
+        """Write this container's snapshot under its own key, so publishers never overwrite each other"""
+        with self._publish_lock:
+            store[f"{METRICS_KEY_PREFIX}{METRICS_INSTANCE_ID}"] = self.snapshot()
+
+def render_prometheus(snapshots):
+    """Sum registry snapshots from every container into the Prometheus text format"""
+    combined = {}
+    peak_rss_bytes = 0
+    for snapshot in snapshots:
+        peak_rss_bytes = max(peak_rss_bytes, snapshot.get("peak_rss_bytes", 0))
+        for stage, totals in snapshot.get("stages", {}).items():
+            stage_totals = combined.setdefault(stage, dict.fromkeys(METRICS_COUNTERS, 0))
+            for field in METRICS_COUNTERS:
+                stage_totals[field] += totals.get(field, 0)
+
+    lines = []
+    for field, (name, help_text) in METRICS_COUNTERS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for stage, totals in sorted(combined.items()):
+            lines.append(f'{name}{{stage="{stage}"}} {totals[field]:g}')
+    lines.append("# HELP clipper_peak_rss_bytes Highest peak resident set size reported by a worker")
+    lines.append("# TYPE clipper_peak_rss_bytes gauge")
+    lines.append(f"clipper_peak_rss_bytes {peak_rss_bytes}")
+    return "\n".join(lines) + "\n"
+
+metrics_registry = MetricsRegistry()
+current_timings = contextvars.ContextVar("current_timings", default=None)
+current_span = contextvars.ContextVar("current_span", default=None)
+current_render_progress = contextvars.ContextVar("current_render_progress", default=None)
+
+def peak_rss_kb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def emit_metrics_line(record: dict):
+    line = json.dumps(record, separators=(",", ":"))
+    print(line)
+    if METRICS_LOG_PATH:
+        with open(METRICS_LOG_PATH, "a") as log_file:
+            log_file.write(line + "\n")
+
+class StageTimings:
+    """Collects the stage spans of one job and summarizes them for the response"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.spans = []
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, span: dict):
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self):
+        """Totals per stage; wall_s of concurrent spans (clip renders, uploads) overlap"""
+        with self._lock:
+            spans = list(self.spans)
+        stages = {}
+        for span in spans:
+            totals = stages.setdefault(span["stage"], {
+                "count": 0, "failures": 0, "wall_s": 0.0, "cpu_s": 0.0, "child_cpu_s": 0.0,
+                "bytes_in": 0, "bytes_out": 0, "peak_rss_mb": 0.0
+            })
+            totals["count"] += 1
+            totals["failures"] += 0 if span["ok"] else 1
+            for field in ("wall_s", "cpu_s", "child_cpu_s", "bytes_in", "bytes_out"):
+                totals[field] += span.get(field) or 0
+            totals["peak_rss_mb"] = max(totals["peak_rss_mb"], span["peak_rss_mb"])
+        for totals in stages.values():
+            for field in ("wall_s", "cpu_s", "child_cpu_s"):
+                totals[field] = round(totals[field], 3)
+        return {
+            "total_wall_s": round(time.perf_counter() - self.started, 3),
+            "peak_rss_mb": round(peak_rss_kb() / 1024, 1),
+            "stages": stages
+        }
+
+@contextlib.contextmanager
+def stage_span(stage: str, **attrs):
+    """Time one pipeline stage and emit it as a JSON line.
+
+    Yields a dict the stage can fill with bytes_in / bytes_out; commands run
+    through run_command inside the span add their exit status and CPU time.
+    wall_s and cpu_s (this thread plus child processes) are exact per span,
+    while peak_rss_mb is the process high-water mark when the span ends.
+    The span is added to the job's StageTimings (current_timings) and to the
+    process-wide Prometheus counters.
+    """
+    span = {"stage": stage, **attrs, "bytes_in": 0, "bytes_out": 0, "child_cpu_s": 0.0}
+    token = current_span.set(span)
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    span["ok"] = True
+    try:
+        yield span
+    except BaseException:
+        span["ok"] = False
+        raise
+    finally:
+        current_span.reset(token)
+        span["wall_s"] = round(time.perf_counter() - wall_start, 3)
+        span["cpu_s"] = round(time.thread_time() - cpu_start + span["child_cpu_s"], 3)
+        span["child_cpu_s"] = round(span["child_cpu_s"], 3)
+        span["peak_rss_mb"] = round(peak_rss_kb() / 1024, 1)
+        if span.get("exit_status", 0) != 0:
+            span["ok"] = False
+
+        timings = current_timings.get()
+        if timings is not None:
+            timings.add(span)
+        metrics_registry.observe(span)
+        emit_metrics_line({"event": "stage", "job_id": timings.job_id if timings else None, **span})
+
+def report_render_position(position_s: float):
+    """Tell the clip rendering in this context how far into the clip its output has got"""
+    report = current_render_progress.get()
+    if report is not None:
+        report(position_s)
+
+def read_ffmpeg_progress(stream, report, offset_s: float):
+    """Read ffmpeg -progress output, reporting offset_s + out_time of each block; returns the text read"""
+    lines = []
+    for line in stream:
+        lines.append(line)
+        key, _, value = line.strip().partition("=")
+        if key == "out_time_us" and value.isdigit():
+            report(offset_s + int(value) / 1e6)
+    return "".join(lines)
+
+def run_command(command: str, progress_offset: float = None):
+    """subprocess.run(command, shell=True, capture_output=True, text=True), plus accounting.
+
+    The child is reaped with os.wait4 so its exact CPU time (including ffmpeg
+    under the shell) and exit status are added to the enclosing stage_span,
+    even while other clips run ffmpeg concurrently. The child's ru_maxrss is
+    not used: after a vfork it starts from this process's own high-water mark.
+
+    Render passes set progress_offset (where their output starts in the
+    clip, in seconds): inside a clip render the ffmpeg command then also
+    writes -progress to stdout, and its position is reported as it encodes.
+    """
+    report = current_render_progress.get()
+    read_stdout = None
+    if progress_offset is not None and report is not None and command.startswith("ffmpeg "):
+        command = "ffmpeg -progress pipe:1 -nostats " + command[len("ffmpeg "):]
+        read_stdout = functools.partial(read_ffmpeg_progress, report=report, offset_s=progress_offset)
+    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    with ThreadPoolExecutor(max_workers=1) as reader:
+        if read_stdout is not None:
+            stdout_future = reader.submit(read_stdout, process.stdout)
+        else:
+            stdout_future = reader.submit(process.stdout.read)
+        stderr = process.stderr.read()
+        stdout = stdout_future.result()
+    process.stdout.close()
+    process.stderr.close()
+    _, wait_status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(wait_status)
+
+    span = current_span.get()
+    if span is not None:
+        span["child_cpu_s"] += usage.ru_utime + usage.ru_stime
+        if span.get("exit_status", 0) == 0:
+            span["exit_status"] = process.returncode
+    return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return 0
+
+VIDEO_ENCODERS = {"nvenc": "h264_nvenc", "x264": "libx264", "x265": "libx265"}
+
+class VideoEncoder:
+    """Codec plus the speed/quality settings of one render tier.
+
+    "final" matches the previous `-preset fast -crf 23` output, while
+    "preview" trades quality for encode speed. Every render function takes
+    its encoder arguments from here.
+    """
+
+    TIER_SETTINGS = {
+        "h264_nvenc": {"preview": ("p1", 30), "final": ("p5", 23)},
+        "libx264": {"preview": ("veryfast", 28), "final": ("fast", 23)},
+        "libx265": {"preview": ("ultrafast", 30), "final": ("fast", 26)},
+    }
+
+    def __init__(self, codec: str, tier: str = "final", threads: int = 0):
+        self.codec = codec
+        self.tier = tier
+        self.threads = threads
+        self.preset, self.quality = self.TIER_SETTINGS[codec][tier]
+
+    @property
+    def is_gpu(self):
+        return self.codec.endswith("_nvenc")
+
+    def output_args(self):
+        """ffmpeg output options for the video stream"""
+        if self.is_gpu:
+            args = f"-c:v {self.codec} -preset {self.preset} -rc vbr -cq {self.quality} -b:v 0"
+        else:
+            args = f"-c:v {self.codec} -preset {self.preset} -crf {self.quality}"
+            if self.threads:
+                args += f" -threads {self.threads}"
+        if self.codec == "libx265":
+            args += " -tag:v hvc1"
+        return args + " -pix_fmt yuv420p"
+
+    def open_frame_pipe(self, output_path, width: int, height: int, framerate: float, audio_path=None):
+        """Start an ffmpeg process that encodes raw BGR frames written to its stdin.
+
+        When audio_path is given it is muxed in the same process, so frames are
+        encoded exactly once and no intermediate video file is written.
+        """
+        command = (f"ffmpeg -y -loglevel error -f rawvideo -pix_fmt bgr24 -s {width}x{height} -r {framerate} -i pipe:0 ")
+        if audio_path:
+            command += f"-i {audio_path} -map 0:v:0 -map 1:a:0 -c:a aac -b:a 128k "
+        command += f"{self.output_args()} {output_path}"
+        return subprocess.Popen(command, shell=True, stdin=subprocess.PIPE)
+
+@functools.lru_cache(maxsize=None)
+def ffmpeg_encoder_works(codec: str):
+    """True when ffmpeg can open codec here; NVENC also needs a visible GPU and driver"""
+    probe_cmd = (f"ffmpeg -hide_banner -loglevel error -f lavfi -i color=black:s=256x256:d=0.04 "
+                 f"-frames:v 1 -c:v {codec} -f null -")
+    return subprocess.run(probe_cmd, shell=True, capture_output=True).returncode == 0
+
+@functools.lru_cache(maxsize=None)
+def select_video_encoder(backend: str, tier: str, threads: int):
+    candidates = ["nvenc", "x264"] if backend == "auto" else [backend, "x264"]
+    for candidate in candidates:
+        codec = VIDEO_ENCODERS[candidate]
+        if ffmpeg_encoder_works(codec):
+            if candidate != candidates[0]:
+                print(f"Video encoder {VIDEO_ENCODERS[candidates[0]]} unavailable, using {codec}")
+            return VideoEncoder(codec, tier, threads)
+    raise RuntimeError(f"No usable video encoder among {candidates}")
+
+def get_video_encoder(tier: str = None):
+    """Encoder for renders on this machine.
+
+    VIDEO_ENCODER picks the backend (auto, nvenc, x264 or x265; auto prefers
+    NVENC when a GPU can encode). RENDER_TIER sets the default tier and
+    ENCODER_THREADS caps CPU encoder threads (0 lets ffmpeg decide). They are
+    read on each call, so CPU workers can be configured through the
+    environment alone.
+    """
+    return select_video_encoder(
+        os.environ.get("VIDEO_ENCODER", "auto"),
+        tier or os.environ.get("RENDER_TIER", "final"),
+        int(os.environ.get("ENCODER_THREADS", 0))
+    )
+
+def probe_video_stream(video_path):
+    """Return (width, height) of the first video stream"""
+    probe_cmd = (f"ffprobe -v error -select_streams v:0 -show_entries stream=width,height "
+                 f"-of json {video_path}")
+    result = run_command(probe_cmd)
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to probe video: {result.stderr}")
+    stream = json.loads(result.stdout)["streams"][0]
+    return int(stream["width"]), int(stream["height"])
+
+def iter_video_frames(video_path, framerate=None, size=None, every: int = 1):
+    """Yield decoded BGR frames from a video without writing them to disk.
+
+    ffmpeg decodes into a pipe and every frame is read into the same numpy
+    buffer, so memory stays at one frame regardless of clip length. The yielded
+    array is overwritten by the next frame; copy it if it must outlive the loop.
+    size=(width, height) scales frames in ffmpeg and every=N yields only frames
+    0, N, 2N, ... of the `framerate` timeline, for cheap analysis proxies.
+    """
+    width, height = size or probe_video_stream(video_path)
+    decode_cmd = ["ffmpeg", "-v", "error", "-i", str(video_path)]
+    filters = []
+    if every > 1:
+        if framerate:
+            filters.append(f"fps={framerate}")
+        filters.append(f"select=not(mod(n\\,{every}))")
+    elif framerate:
+        decode_cmd += ["-r", str(framerate)]
+    if size:
+        filters.append(f"scale={width}:{height}")
+    if filters:
+        decode_cmd += ["-vf", ",".join(filters)]
+    if every > 1:
+        decode_cmd += ["-vsync", "0"]
+    decode_cmd += ["-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"]
+
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame_bytes = memoryview(frame).cast("B")
+    process = subprocess.Popen(decode_cmd, stdout=subprocess.PIPE, bufsize=frame.nbytes)
+    try:
+        while process.stdout.readinto(frame_bytes) == frame.nbytes:
+            yield frame
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+def iter_frame_files(pyframes_path):
+    """Yield frames from a directory of per-frame .jpg files (Columbia layout)"""
+    import cv2
 
     flist = glob.glob(os.path.join(str(pyframes_path), "*.jpg"))
     flist.sort()
-
-    faces = [[] for _ in range(len(flist))]
+    for fname in flist:
+        yield cv2.imread(fname)
+
+def smooth_track_scores(score_array, num_track_frames: int, window: int = 30):
+    """Mean of score_array[i - window:i + window] (clipped) for every track frame i.
+
+    Uses a cumulative sum so each mean is O(1); positions with an empty window
+    average to 0, matching the per-frame slice-and-mean it replaces.
+    """
+    score_array = np.asarray(score_array, dtype=np.float64)
+    cumulative = np.concatenate(([0.0], np.cumsum(score_array)))
+    positions = np.arange(num_track_frames)
+    slice_start = np.minimum(np.maximum(positions - window, 0), len(score_array))
+    slice_end = np.minimum(positions + window, len(score_array))
+    counts = slice_end - slice_start
+
+    means = np.zeros(num_track_frames, dtype=np.float64)
+    has_scores = counts > 0
+    means[has_scores] = (cumulative[slice_end[has_scores]] - cumulative[slice_start[has_scores]]) / counts[has_scores]
+    return means
+
+def select_speaker_faces(tracks, scores, num_frames: int, window: int = 30):
+    """Pick the active speaker for every frame from a dense frames x tracks score matrix.
+
+    Returns (best_track, best_x): the winning track index per frame (-1 when no
+    face is present or the best smoothed score is negative) and that face's x.
+    """
+    score_matrix = np.full((num_frames, len(tracks)), -np.inf, dtype=np.float64)
+    x_matrix = np.zeros((num_frames, len(tracks)), dtype=np.float64)
 
     for tidx, track in enumerate(tracks):
-        score_array = scores[tidx]
-        for fidx, frame in enumerate(track["track"]["frame"].tolist()):
-            slice_start = max(fidx - 30, 0)
-            slice_end = min(fidx + 30, len(score_array))
-            score_slice = score_array[slice_start:slice_end]
-            avg_score = float(np.mean(score_slice)
-                              if len(score_slice) > 0 else 0)
+        frames = np.asarray(track["track"]["frame"], dtype=np.int64)
+        avg_scores = smooth_track_scores(scores[tidx], len(frames), window)
+        in_range = (frames >= 0) & (frames < num_frames)
+        score_matrix[frames[in_range], tidx] = avg_scores[in_range]
+        x_matrix[frames[in_range], tidx] = np.asarray(track["proc_track"]["x"], dtype=np.float64)[in_range]
+
+    if num_frames == 0 or not tracks:
+        return np.full(num_frames, -1, dtype=np.int64), np.zeros(num_frames, dtype=np.float64)
+
+    best_track = np.argmax(score_matrix, axis=1)
+    rows = np.arange(num_frames)
+    best_score = score_matrix[rows, best_track]
+    best_x = x_matrix[rows, best_track]
+    best_track[best_score < 0] = -1
+    return best_track, best_x
+
+def compute_crop_offsets(best_x, has_face, frame_width: int, frame_height: int, target_width: int = 1080, target_height: int = 1920):
+    """Left edge of the 9:16 crop for every frame, or -1 where the frame is letterboxed"""
+    scale = target_height / frame_height
+    resized_width = int(round(frame_width * scale))
+    center_x = np.trunc(np.asarray(best_x) * scale).astype(np.int64)
+    top_x = np.maximum(np.minimum(center_x - target_width // 2, resized_width - target_width), 0)
+    return np.where(has_face, top_x, -1)
+
+def detect_shots(video_path, threshold: float = SHOT_DETECT_THRESHOLD, downscale: int = SHOT_DETECT_DOWNSCALE,
+                 frame_skip: int = SHOT_DETECT_FRAME_SKIP, min_shot_s: float = 0.5):
+    """Shot boundaries of a video as (start_s, end_s) pairs, from PySceneDetect's ContentDetector.
+
+    Frames are analysed at 1/downscale size with frame_skip frames skipped
+    between them, so a cut is placed within frame_skip + 1 frames of the
+    real one.
+    """
+    from scenedetect import SceneManager, open_video
+    from scenedetect.detectors import ContentDetector
+
+    video = open_video(str(video_path))
+    manager = SceneManager()
+    manager.auto_downscale = False
+    manager.downscale = downscale
+    manager.add_detector(ContentDetector(threshold=threshold, min_scene_len=max(int(min_shot_s * video.frame_rate), 1)))
+    manager.detect_scenes(video, frame_skip=frame_skip, show_progress=False)
+    return [(start.get_seconds(), end.get_seconds()) for start, end in manager.get_scene_list(start_in_scene=True)]
+
+def shot_frame_ranges(shots: list, num_frames: int, framerate: float):
+    """[first, last) output frame ranges covering num_frames, split at each shot's start"""
+    cuts = sorted({int(round(start * framerate)) for start, _ in shots[1:]} - {0})
+    cuts = [cut for cut in cuts if cut < num_frames]
+    return list(zip([0] + cuts, cuts + [num_frames]))
+
+def plan_shot_framing(best_track, best_x, shot_ranges: list, static_px: float, min_face_fraction: float = SHOT_MIN_FACE_FRACTION,
+                      smooth_frames: int = SHOT_SMOOTH_FRAMES):
+    """Per-frame (has_face, center_x) with the framing decided per shot.
+
+    A shot is cropped on the speaker when at least min_face_fraction of its
+    frames have one, and letterboxed throughout otherwise. Within a cropped
+    shot the speaker x is interpolated across faceless frames and smoothed
+    over smooth_frames; a shot whose smoothed path moves less than static_px
+    is held at its median. Framing therefore only jumps at shot boundaries.
+    """
+    has_face = np.zeros(len(best_track), dtype=bool)
+    center_x = np.zeros(len(best_track), dtype=np.float64)
+    for first, last in shot_ranges:
+        faces = best_track[first:last] >= 0
+        if not len(faces) or faces.mean() < min_face_fraction:
+            continue
+        path = np.interp(np.arange(last - first), np.flatnonzero(faces), best_x[first:last][faces])
+        path = smooth_track_scores(path, len(path), smooth_frames // 2)
+        if path.max() - path.min() < static_px:
+            path[:] = np.median(path)
+        has_face[first:last] = True
+        center_x[first:last] = path
+    return has_face, center_x
+
+def _box_iou(box, other):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    overlap_w = min(box[0] + box[2], other[0] + other[2]) - max(box[0], other[0])
+    overlap_h = min(box[1] + box[3], other[1] + other[3]) - max(box[1], other[1])
+    if overlap_w <= 0 or overlap_h <= 0:
+        return 0.0
+    intersection = overlap_w * overlap_h
+    return intersection / (box[2] * box[3] + other[2] * other[3] - intersection)
+
+def track_faces(video_path, framerate: float = FACE_TRACK_FRAMERATE, detect_every: int = FACE_DETECT_INTERVAL,
+                proxy_height: int = FACE_PROXY_HEIGHT, iou_threshold: float = FACE_TRACK_IOU, max_missed: int = 2):
+    """CPU face tracks and speaker scores in the Columbia (tracks, scores) shape create_vertical_video takes.
+
+    A Haar cascade runs on every detect_every-th frame of a proxy_height
+    decode; detect_every=1 is dense detection, higher values trade accuracy
+    for speed. Detections join the track whose last box overlaps them by at
+    least iou_threshold, and a track ends after max_missed detection frames
+    without a match. x, y and s (half the box size, in source pixels) are
+    linearly interpolated for the frames in between.
+
+    Without an audio-visual model, a face's speaker score is its share of the
+    face area in the frame plus the normalised frame-to-frame change of the
+    lower half of its box, a stand-in for mouth movement.
+    """
+    import cv2
+
+    source_width, source_height = probe_video_stream(video_path)
+    proxy_height = min(proxy_height, source_height)
+    proxy_width = int(round(source_width * proxy_height / source_height / 2)) * 2
+    to_source = source_height / proxy_height
+    cascade = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml"))
+    min_face = max(proxy_height // 12, 24)
+
+    active, finished = [], []
+    gray = np.empty((proxy_height, proxy_width), dtype=np.uint8)
+    for step, frame in enumerate(iter_video_frames(video_path, framerate=framerate, size=(proxy_width, proxy_height), every=detect_every)):
+        frame_index = step * detect_every
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+        boxes = cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(min_face, min_face))
+        boxes = [tuple(int(value) for value in box) for box in boxes]
+
+        # Greedy matching, best overlap first
+        pairs = sorted(((_box_iou(track["boxes"][-1], box), track_index, box_index)
+                        for track_index, track in enumerate(active) for box_index, box in enumerate(boxes)), reverse=True)
+        matched_tracks, matched_boxes = set(), set()
+        for iou, track_index, box_index in pairs:
+            if iou < iou_threshold or track_index in matched_tracks or box_index in matched_boxes:
+                continue
+            matched_tracks.add(track_index)
+            matched_boxes.add(box_index)
+            active[track_index]["pending"] = boxes[box_index]
+        for box_index, box in enumerate(boxes):
+            if box_index not in matched_boxes:
+                active.append({"frames": [], "boxes": [], "area_share": [], "motion": [], "patch": None, "missed": 0, "pending": box})
+
+        total_area = sum(box[2] * box[3] for box in boxes) or 1
+        still_active = []
+        for track in active:
+            box = track.pop("pending", None)
+            if box is None:
+                track["missed"] += 1
+                (finished if track["missed"] > max_missed else still_active).append(track)
+                continue
+            x, y, w, h = box
+            patch = cv2.resize(gray[y + h // 2:y + h, x:x + w], (32, 16), interpolation=cv2.INTER_AREA).astype(np.float32)
+            track["motion"].append(float(np.abs(patch - track["patch"]).mean()) if track["patch"] is not None else 0.0)
+            track["patch"] = patch
+            track["frames"].append(frame_index)
+            track["boxes"].append(box)
+            track["area_share"].append(w * h / total_area)
+            track["missed"] = 0
+            still_active.append(track)
+        active = still_active
+    finished.extend(active)
+
+    tracks, scores = [], []
+    detections = [track for track in finished if len(track["frames"]) >= 2]
+    motion_scale = np.percentile(np.concatenate([track["motion"] for track in detections]), 95) if detections else 0.0
+    for track in detections:
+        detected = np.asarray(track["frames"], dtype=np.float64)
+        boxes = np.asarray(track["boxes"], dtype=np.float64) * to_source
+        # Hold the last detection until the next detection frame would have run
+        frames = np.arange(track["frames"][0], track["frames"][-1] + detect_every)
+        motion = np.clip(np.asarray(track["motion"]) / motion_scale, 0.0, 1.0) if motion_scale > 0 else np.zeros(len(detected))
+        tracks.append({
+            "track": {"frame": frames},
+            "proc_track": {
+                "x": np.interp(frames, detected, boxes[:, 0] + boxes[:, 2] / 2),
+                "y": np.interp(frames, detected, boxes[:, 1] + boxes[:, 3] / 2),
+                "s": np.interp(frames, detected, np.maximum(boxes[:, 2], boxes[:, 3]) / 2),
+            },
+        })
+        scores.append(np.interp(frames, detected, np.asarray(track["area_share"]) + motion))
+    return tracks, scores
+
+class BlurredBackground:
+    """Letterboxes frames over a blurred, cover-scaled copy of themselves.
+
+    The blur is computed at 1/downscale resolution and upscaled, which looks
+    the same as a 121x121 Gaussian at full size for a fraction of the cost.
+    Output buffers are reused between frames, and the background is only
+    recomputed when a small thumbnail of the frame changes noticeably.
+    """
+
+    # sigma OpenCV derives for a 121x121 kernel with sigma=0
+    FULL_RES_SIGMA = 0.3 * ((121 - 1) * 0.5 - 1) + 0.8
+
+    def __init__(self, target_width: int = 1080, target_height: int = 1920, downscale: int = 8, change_threshold: float = 2.0):
+        self.target_width = target_width
+        self.target_height = target_height
+        self.downscale = downscale
+        self.change_threshold = change_threshold
+        self.output = np.empty((target_height, target_width, 3), dtype=np.uint8)
+        self._background = np.empty_like(self.output)
+        self._foreground = None
+        self._previous_thumbnail = None
+
+    def _background_changed(self, region):
+        import cv2
+
+        thumbnail = cv2.resize(region, (32, 32), interpolation=cv2.INTER_AREA)
+        if self._previous_thumbnail is not None and self._previous_thumbnail.shape == thumbnail.shape:
+            if cv2.norm(thumbnail, self._previous_thumbnail, cv2.NORM_L1) / thumbnail.size < self.change_threshold:
+                return False
+        self._previous_thumbnail = thumbnail
+        return True
+
+    def render(self, img):
+        import cv2
+
+        height, width = img.shape[:2]
+        resized_height = int(height * self.target_width / width)
+
+        if resized_height < self.target_height:
+            # Region of the source that a centred cover-scale crop would show
+            scale_for_bg = max(self.target_width / width, self.target_height / height)
+            region_width = min(width, int(round(self.target_width / scale_for_bg)))
+            region_height = min(height, int(round(self.target_height / scale_for_bg)))
+            region_x = (width - region_width) // 2
+            region_y = (height - region_height) // 2
+            region = img[region_y:region_y + region_height, region_x:region_x + region_width]
+
+            if self._background_changed(region):
+                small = cv2.resize(region, (self.target_width // self.downscale, self.target_height // self.downscale), interpolation=cv2.INTER_AREA)
+                small = cv2.GaussianBlur(small, (0, 0), self.FULL_RES_SIGMA / self.downscale)
+                cv2.resize(small, (self.target_width, self.target_height), dst=self._background, interpolation=cv2.INTER_LINEAR)
+            np.copyto(self.output, self._background)
+
+        if self._foreground is None or self._foreground.shape[0] != resized_height:
+            self._foreground = np.empty((resized_height, self.target_width, 3), dtype=np.uint8)
+        cv2.resize(img, (self.target_width, resized_height), dst=self._foreground, interpolation=cv2.INTER_AREA)
+
+        visible_height = min(resized_height, self.target_height)
+        center_y = max((self.target_height - resized_height) // 2, 0)
+        source_y = max((resized_height - self.target_height) // 2, 0)
+        self.output[center_y:center_y + visible_height] = self._foreground[source_y:source_y + visible_height]
+        return self.output
+
+def create_vertical_video(tracks, scores, frames_source, audio_path, output_path, framerate=25, encoder=None,
+                          shot_framing: str = SHOT_FRAMING, shots=None):
+    """Render the active-speaker 9:16 video.
+
+    frames_source is normally the clip video, whose frames are streamed at
+    `framerate`; a directory of per-frame .jpg files is still accepted.
+    Frames and audio are encoded in one pass by `encoder` (NVENC or a CPU
+    encoder, see get_video_encoder).
+
+    With shot_framing="shot" crop vs letterbox and the crop path are planned
+    per shot (plan_shot_framing). shots are (start_s, end_s) pairs; by default
+    they are detected in the clip video, and a frame directory is one shot.
+    """
+    import cv2
+    from tqdm import tqdm
 
-            faces[frame].append(
-                {'track': tidx, 'score': avg_score, 's': track['proc_track']["s"][fidx], 'x': track['proc_track']["x"][fidx], 'y': track['proc_track']["y"][fidx]})
+    target_width = 1080
+    target_height = 1920
+    encoder = encoder or get_video_encoder()
+
+    if os.path.isdir(str(frames_source)):
+        frames = iter_frame_files(frames_source)
+    else:
+        frames = iter_video_frames(frames_source, framerate=framerate)
+
+    num_frames = max((int(track["track"]["frame"][-1]) + 1 for track in tracks if len(track["track"]["frame"])), default=0)
+    best_track, best_x = select_speaker_faces(tracks, scores, num_frames)
 
-    temp_video_path = os.path.join(str(pyavi_path), "video_only.mp4")
+    if shot_framing == "shot" and shots is None:
+        shots = []
+        if not os.path.isdir(str(frames_source)):
+            try:
+                with stage_span("shot_detect"):
+                    shots = detect_shots(frames_source)
+                print(f"Detected {len(shots)} shots in {frames_source}")
+            except Exception as e:
+                print(f"Shot detection failed, framing the clip as one shot: {e}")
 
     vout = None
-    for fidx, fname in tqdm(enumerate(flist), total=len(flist), desc="Creating vertical video"):
-        img = cv2.imread(fname)
+    cropped = np.empty((target_height, target_width, 3), dtype=np.uint8)
+    crop_offsets = None
+    background = BlurredBackground(target_width, target_height)
+    for fidx, img in tqdm(enumerate(frames), desc="Creating vertical video"):
         if img is None:
             continue
 
-        current_faces = faces[fidx]
-
-        max_score_face = max(
-            current_faces, key=lambda face: face['score']) if current_faces else None
-
-        if max_score_face and max_score_face['score'] < 0:
-            max_score_face = None
+        if crop_offsets is None:
+            has_face, center_x = best_track >= 0, best_x
+            if shot_framing == "shot":
+                has_face, center_x = plan_shot_framing(best_track, best_x, shot_frame_ranges(shots, num_frames, framerate),
+                                                       static_px=SHOT_STATIC_FRACTION * img.shape[1])
+            crop_offsets = compute_crop_offsets(center_x, has_face, img.shape[1], img.shape[0], target_width, target_height)
 
         if vout is None:
-            vout = ffmpegcv.VideoWriterNV(
-                file=temp_video_path,
-                codec=None,
-                fps=framerate,
-                resize=(target_width, target_height)
-            )
-
-        if max_score_face:
+            vout = encoder.open_frame_pipe(output_path, target_width, target_height, framerate, audio_path)
+
+        top_x = crop_offsets[fidx] if fidx < num_frames else -1
+        if top_x >= 0:
             mode = "crop"
         else:
             mode = "resize"
 
-        if mode == "resize":
-            scale = target_width / img.shape[1]
-            resized_height = int(img.shape[0] * scale)
-            resized_image = cv2.resize(
-                img, (target_width, resized_height), interpolation=cv2.INTER_AREA)
-
-            scale_for_bg = max(
-                target_width / img.shape[1], target_height / img.shape[0])
-            bg_width = int(img.shape[1] * scale_for_bg)
-            bg_heigth = int(img.shape[0] * scale_for_bg)
-
-            blurred_background = cv2.resize(img, (bg_width, bg_heigth))
-            blurred_background = cv2.GaussianBlur(
-                blurred_background, (121, 121), 0)
-
-            crop_x = (bg_width - target_width) // 2
-            crop_y = (bg_heigth - target_height) // 2
-            blurred_background = blurred_background[crop_y:crop_y +
-                                                    target_height, crop_x:crop_x + target_width]
-
-            center_y = (target_height - resized_height) // 2
-            blurred_background[center_y:center_y +
-                               resized_height, :] = resized_image
-
-            vout.write(blurred_background)
-
-        elif mode == "crop":
+        if mode == "crop":
             scale = target_height / img.shape[0]
             resized_image = cv2.resize(
                 img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
-            frame_width = resized_image.shape[1]
-
-            center_x = int(
-                max_score_face["x"] * scale if max_score_face else frame_width // 2)
-            top_x = max(min(center_x - target_width // 2,
-                        frame_width - target_width), 0)
 
             image_cropped = resized_image[0:target_height,
                                           top_x:top_x + target_width]
+            if image_cropped.shape == cropped.shape:
+                np.copyto(cropped, image_cropped)
+                vout.stdin.write(cropped)
+            else:
+                # Sources narrower than 9:16 after scaling cannot fill the crop
+                mode = "resize"
 
-            vout.write(image_cropped)
-
-    if vout:
-        vout.release()
+        if mode == "resize":
+            vout.stdin.write(background.render(img))
+        report_render_position((fidx + 1) / framerate)
 
-    ffmpeg_command = (f"ffmpeg -y -i {temp_video_path} -i {str(audio_path)} "
-                      f"-c:v h264 -preset fast -crf 23 -c:a aac -b:a 128k "
-                      f"{str(output_path)}")
-    subprocess.run(ffmpeg_command, shell=True, check=True, text=True)
+    if vout is None:
+        raise RuntimeError(f"No frames decoded from {frames_source}")
+    vout.stdin.close()
+    if vout.wait() != 0:
+        raise RuntimeError(f"Vertical video encode failed for {output_path}")
 
-def create_basic_vertical_video(input_video_path, audio_path, output_path):
+def create_basic_vertical_video(input_video_path, audio_path, output_path, encoder=None):
     """Create a basic vertical video when Columbia script fails"""
     output_path.parent.mkdir(parents=True, exist_ok=True)
+    encoder = encoder or get_video_encoder()
     
     print(f"Checking input video: {input_video_path}")
     print(f"Input video exists: {os.path.exists(input_video_path)}")
@@ -159,106 +833,327 @@ def create_basic_vertical_video(input_video_path, audio_path, output_path):
     
     vertical_cmd = (f"ffmpeg -y -i {input_video_path} -i {audio_path} "
                    f"-vf 'scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2' "
-                   f"-c:v h264 -preset fast -crf 23 -c:a aac -b:a 128k "
+                   f"{encoder.output_args()} -c:a aac -b:a 128k "
                    f"{output_path}")
     
     print(f"Running vertical video command: {vertical_cmd}")
-    result = subprocess.run(vertical_cmd, shell=True, capture_output=True, text=True)
+    with stage_span("vertical_render", codec=encoder.codec) as span:
+        result = run_command(vertical_cmd, progress_offset=0.0)
+        span["bytes_in"] = file_size(input_video_path) + file_size(audio_path)
+        span["bytes_out"] = file_size(output_path)
     if result.returncode != 0:
         print(f"Basic vertical video creation failed: {result.stderr}")
         print(f"FFmpeg stdout: {result.stdout}")
     else:
         print(f"Basic vertical video created: {output_path}")
 
+@functools.lru_cache(maxsize=1)
+def get_s3_client():
+    """Shared S3 client; its connection pool is sized for concurrent multipart parts"""
+    import boto3
+    from botocore.config import Config as BotoConfig
+
+    return boto3.client(
+        "s3",
+        aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
+        region_name=os.environ.get("AWS_DEFAULT_REGION", "eu-north-1"),
+        endpoint_url=os.environ.get("S3_ENDPOINT_URL"),
+        config=BotoConfig(max_pool_connections=S3_MAX_CONCURRENCY * 2, retries={"max_attempts": 5, "mode": "adaptive"})
+    )
+
+@functools.lru_cache(maxsize=1)
+def get_s3_transfer_config():
+    """Multipart settings shared by uploads and downloads"""
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=S3_CHUNK_BYTES,
+        multipart_chunksize=S3_CHUNK_BYTES,
+        max_concurrency=S3_MAX_CONCURRENCY,
+        use_threads=True
+    )
+
 def upload_to_s3(file_path, s3_key, s3_client):
     """Upload file to S3 and return the URL"""
+    with stage_span("upload") as span:
+        try:
+            s3_client.upload_file(str(file_path), S3_BUCKET, s3_key, Config=get_s3_transfer_config())
+        except Exception as e:
+            print(f"S3 upload failed: {e}")
+            span["ok"] = False
+            return None
+        span["bytes_out"] = file_size(file_path)
+        return f"https://{S3_BUCKET}.s3.eu-north-1.amazonaws.com/{s3_key}"
+
+def _get_range(s3_client, s3_key: str, first_byte: int, last_byte: int):
+    response = s3_client.get_object(Bucket=S3_BUCKET, Key=s3_key, Range=f"bytes={first_byte}-{last_byte}")
+    return response["Body"].read()
+
+def download_with_audio_extract(s3_client, s3_key: str, video_path, audio_path):
+    """Download the episode with parallel ranged GETs while extracting its audio from the stream.
+
+    Parts are fetched S3_MAX_CONCURRENCY at a time (with at most one more
+    buffered), written to video_path in order, and piped into an ffmpeg audio
+    extractor as they arrive, so audio.wav is ready about when the download
+    finishes. If a part fails, the extractor is killed and its partial audio
+    removed before the error propagates. Containers that need seeking (an MP4 with its moov atom at the end) cannot be decoded from a
+    pipe; then the partial audio is removed and False is returned so the
+    caller extracts from the finished file. Returns True when audio.wav was
+    produced from the stream.
+    """
+    size = s3_client.head_object(Bucket=S3_BUCKET, Key=s3_key)["ContentLength"]
+    ranges = [(offset, min(offset + S3_CHUNK_BYTES, size) - 1) for offset in range(0, size, S3_CHUNK_BYTES)]
+
+    extract_cmd = f"ffmpeg -y -i pipe:0 -vn -acodec pcm_s16le -ar 16000 -ac 1 {audio_path}"
+    extractor = subprocess.Popen(extract_cmd, shell=True, stdin=subprocess.PIPE,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    extractor_alive = True
+
+    start_time = time.time()
+    # Keep a bounded window of parts in flight: one per download thread plus the part being written
+    pending = {}
     try:
-        s3_client.upload_file(str(file_path), "ai-podcast-clipper11", s3_key)
-        return f"https://ai-podcast-clipper11.s3.eu-north-1.amazonaws.com/{s3_key}"
-    except Exception as e:
-        print(f"S3 upload failed: {e}")
-        return None
-
-
-def create_subtitles_with_ffmpeg(transcript_segments: list, clip_start: float, clip_end: float, clip_video_path: str, output_path: str, max_words: int = 5):
-    temp_dir = os.path.dirname(output_path)
-    os.makedirs(temp_dir, exist_ok=True)
-    subtitle_path = os.path.join(temp_dir, "temp_subtitles.ass")
-
-    clip_segments = [segment for segment in transcript_segments
-                     if segment.get("start") is not None
-                     and segment.get("end") is not None
-                     and segment.get("end") > clip_start
-                     and segment.get("start") < clip_end
-                     ]
-
-    subtitles = []
-    current_words = []
-    current_start = None
-    current_end = None
-
-    for segment in clip_segments:
-        if "words" in segment and segment["words"]:
-            for word_data in segment["words"]:
-                word = word_data.get("word", "").strip()
-                word_start = word_data.get("start")
-                word_end = word_data.get("end")
-
-                if not word or word_start is None or word_end is None:
-                    continue
-
-                start_rel = max(0.0, word_start - clip_start)
-                end_rel = max(0.0, word_end - clip_start)
-
-                if end_rel <= 0:
-                    continue
+        with ThreadPoolExecutor(max_workers=S3_MAX_CONCURRENCY) as executor, open(video_path, "wb") as video_file:
+            next_range = 0
+            for index in range(len(ranges)):
+                while next_range < len(ranges) and next_range <= index + S3_MAX_CONCURRENCY:
+                    pending[next_range] = executor.submit(_get_range, s3_client, s3_key, *ranges[next_range])
+                    next_range += 1
+                data = pending.pop(index).result()
+                video_file.write(data)
+                if extractor_alive:
+                    try:
+                        extractor.stdin.write(data)
+                    except (BrokenPipeError, OSError):
+                        extractor_alive = False
+    except BaseException:
+        # A failed part aborts the download; stop the extractor and drop its partial audio
+        for future in pending.values():
+            future.cancel()
+        try:
+            extractor.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        extractor.kill()
+        extractor.wait()
+        pathlib.Path(audio_path).unlink(missing_ok=True)
+        raise
 
-                if not current_words:
-                    current_start = start_rel
-                    current_end = end_rel
-                    current_words = [word]
-                elif len(current_words) >= max_words:
-                    subtitles.append(
-                        (current_start, current_end, ' '.join(current_words)))
-                    current_words = [word]
-                    current_start = start_rel
-                    current_end = end_rel
-                else:
-                    current_words.append(word)
-                    current_end = end_rel
-        else:
-            text = segment.get("text", "").strip()
+    try:
+        extractor.stdin.close()
+    except (BrokenPipeError, OSError):
+        pass
+    extracted = extractor.wait() == 0 and pathlib.Path(audio_path).exists()
+    if extracted:
+        # A demuxer that could not seek may exit cleanly with little or no audio
+        samples, sample_rate = open_wav_samples(audio_path)
+        duration_cmd = f"ffprobe -v quiet -show_entries format=duration -of csv=p=0 {video_path}"
+        duration_result = run_command(duration_cmd)
+        try:
+            expected_duration = float(duration_result.stdout.strip())
+        except ValueError:
+            expected_duration = None
+        extracted = len(samples) > 0 and (expected_duration is None or len(samples) / sample_rate >= expected_duration - 1.0)
+    elapsed = time.time() - start_time
+    print(f"Downloaded {size / 1e6:.1f} MB in {elapsed:.1f}s ({size / 1e6 / max(elapsed, 1e-9):.1f} MB/s), "
+          f"streamed audio extraction {'succeeded' if extracted else 'unavailable'}")
+
+    if not extracted:
+        pathlib.Path(audio_path).unlink(missing_ok=True)
+    return extracted
+
+
+class TranscriptIndex:
+    """Array-backed, time-indexed view of an aligned transcript, built once per job.
+
+    Word and segment times live in numpy arrays and all text sits in a single
+    string addressed by offsets, so a time-range query is a bisect plus the k
+    hits instead of a scan over every segment dict. Segments without word
+    timings contribute their text split into tokens spanning the segment, the
+    same way subtitles were grouped before.
+    """
+
+    def __init__(self, segments: list):
+        text_parts = []
+        text_length = 0
+
+        def add_text(text):
+            nonlocal text_length
+            start = text_length
+            text_parts.append(text)
+            text_length += len(text)
+            return start, text_length
+
+        segment_start, segment_end, segment_text, segment_words, segment_has_words = [], [], [], [], []
+        word_start, word_end, word_score, word_text = [], [], [], []
+        token_start, token_end, token_text, token_score = [], [], [], []
+
+        def optional(value):
+            return np.nan if value is None else value
+
+        for segment in segments:
             seg_start = segment.get("start")
             seg_end = segment.get("end")
-
-            if not text or seg_start is None or seg_end is None:
-                continue
-
-            start_rel = max(0.0, seg_start - clip_start)
-            end_rel = max(0.0, seg_end - clip_start)
-
-            if end_rel <= 0:
-                continue
-
-            words = text.split()
-            for i, word in enumerate(words):
-                if not current_words:
-                    current_start = start_rel
-                    current_end = end_rel
-                    current_words = [word]
-                elif len(current_words) >= max_words:
-                    subtitles.append(
-                        (current_start, current_end, ' '.join(current_words)))
-                    current_words = [word]
-                    current_start = start_rel
-                    current_end = end_rel
-                else:
-                    current_words.append(word)
-                    current_end = end_rel
-
-    if current_words:
-        subtitles.append(
-            (current_start, current_end, ' '.join(current_words)))
+            text = segment.get("text", "").strip()
+            has_times = seg_start is not None and seg_end is not None
+            seg_text_start, seg_text_end = add_text(text)
+            segment_start.append(optional(seg_start))
+            segment_end.append(optional(seg_end))
+            segment_text.append((seg_text_start, seg_text_end))
+
+            words = segment.get("words") or []
+            first_word = len(word_start)
+            for word_data in words:
+                word = word_data.get("word", "").strip()
+                start = word_data.get("start")
+                end = word_data.get("end")
+                offsets = add_text(word)
+                word_start.append(optional(start))
+                word_end.append(optional(end))
+                word_score.append(optional(word_data.get("score")))
+                word_text.append(offsets)
+                if has_times and word and start is not None and end is not None:
+                    token_start.append(start)
+                    token_end.append(end)
+                    token_text.append(offsets)
+                    token_score.append(optional(word_data.get("score")))
+            segment_words.append((first_word, len(word_start)))
+            segment_has_words.append(bool(words))
+
+            if not words and has_times and text:
+                position = 0
+                for token in text.split():
+                    position = text.index(token, position)
+                    token_start.append(seg_start)
+                    token_end.append(seg_end)
+                    token_text.append((seg_text_start + position, seg_text_start + position + len(token)))
+                    token_score.append(np.nan)
+                    position += len(token)
+
+        self._text = "".join(text_parts)
+        self.segment_start = np.asarray(segment_start, dtype=np.float64)
+        self.segment_end = np.asarray(segment_end, dtype=np.float64)
+        self._segment_text = np.asarray(segment_text, dtype=np.int64).reshape(-1, 2)
+        self._segment_words = np.asarray(segment_words, dtype=np.int64).reshape(-1, 2)
+        self._segment_has_words = np.asarray(segment_has_words, dtype=bool)
+        self.word_start = np.asarray(word_start, dtype=np.float64)
+        self.word_end = np.asarray(word_end, dtype=np.float64)
+        self.word_score = np.asarray(word_score, dtype=np.float64)
+        self._word_text = np.asarray(word_text, dtype=np.int64).reshape(-1, 2)
+
+        order = np.argsort(np.asarray(token_start, dtype=np.float64), kind="stable")
+        self.token_start = np.asarray(token_start, dtype=np.float64)[order]
+        self.token_end = np.asarray(token_end, dtype=np.float64)[order]
+        self._token_text = np.asarray(token_text, dtype=np.int64).reshape(-1, 2)[order]
+        self.token_score = np.asarray(token_score, dtype=np.float64)[order]
+        # Running max of end times keeps the lower-bound bisect valid when tokens overlap
+        self._token_end_max = np.maximum.accumulate(self.token_end) if len(self.token_end) else self.token_end
+
+        # Segment edges with known times, for snapping clips to sentence boundaries
+        self._sentence_starts = np.sort(self.segment_start[~np.isnan(self.segment_start)])
+        self._sentence_ends = np.sort(self.segment_end[~np.isnan(self.segment_end)])
+
+    def __len__(self):
+        return len(self.segment_start)
+
+    def token_range(self, start_time: float, end_time: float):
+        """Indices of tokens overlapping (start_time, end_time), found in O(log n + k)"""
+        lower = int(np.searchsorted(self._token_end_max, start_time, side="right"))
+        upper = int(np.searchsorted(self.token_start, end_time, side="left"))
+        if upper <= lower:
+            return np.zeros(0, dtype=np.int64)
+        candidates = np.arange(lower, upper)
+        return candidates[self.token_end[lower:upper] > start_time]
+
+    def token_text(self, index):
+        start, end = self._token_text[index]
+        return self._text[start:end]
+
+    def subtitle_groups(self, clip_start: float, clip_end: float, max_words: int = 5):
+        """(start, end, text) subtitle lines of up to max_words, relative to clip_start"""
+        subtitles = []
+        tokens = self.token_range(clip_start, clip_end)
+        for group_start in range(0, len(tokens), max_words):
+            group = tokens[group_start:group_start + max_words]
+            subtitles.append((
+                max(0.0, float(self.token_start[group[0]]) - clip_start),
+                max(0.0, float(self.token_end[group[-1]]) - clip_start),
+                " ".join(self.token_text(index) for index in group)
+            ))
+        return subtitles
+
+    def snap_clip(self, start_time: float, end_time: float, max_shift: float = 2.0, min_duration: float = 30, max_duration: float = 60):
+        """Move clip edges onto sentence (segment) edges within max_shift, else onto word edges.
+
+        The start never lands mid-word and the end never cuts a word off. The
+        original range is kept if snapping would break the duration bounds.
+        """
+        def nearest(edges, value):
+            if not len(edges):
+                return None
+            position = int(np.searchsorted(edges, value))
+            neighbours = [float(edges[i]) for i in (position - 1, position) if 0 <= i < len(edges)]
+            best = min(neighbours, key=lambda edge: abs(edge - value))
+            return best if abs(best - value) <= max_shift else None
+
+        snapped_start = nearest(self._sentence_starts, start_time)
+        if snapped_start is None:
+            # Begin with the word being spoken at start_time, if any
+            tokens = self.token_range(start_time, start_time + 1e-6)
+            snapped_start = min(float(self.token_start[tokens[0]]), start_time) if len(tokens) else start_time
+
+        snapped_end = nearest(self._sentence_ends, end_time)
+        if snapped_end is None:
+            tokens = self.token_range(end_time - 1e-6, end_time)
+            snapped_end = max(float(self.token_end[tokens[-1]]), end_time) if len(tokens) else end_time
+
+        if not (min_duration <= snapped_end - snapped_start <= max_duration):
+            return start_time, end_time
+        return snapped_start, snapped_end
+
+    def to_response_segments(self):
+        """Serialize to the transcript segments returned by process_video"""
+        def optional(value):
+            return None if np.isnan(value) else float(value)
+
+        response_segments = []
+        for index in range(len(self.segment_start)):
+            text_start, text_end = self._segment_text[index]
+            segment_data = {
+                "start": optional(self.segment_start[index]),
+                "end": optional(self.segment_end[index]),
+                "text": self._text[text_start:text_end]
+            }
+            # Include word-level timestamps if available
+            if self._segment_has_words[index]:
+                first_word, last_word = self._segment_words[index]
+                segment_data["words"] = [{
+                    "word": self._text[self._word_text[word][0]:self._word_text[word][1]],
+                    "start": optional(self.word_start[word]),
+                    "end": optional(self.word_end[word]),
+                    "score": optional(self.word_score[word])
+                } for word in range(first_word, last_word)]
+            response_segments.append(segment_data)
+        return response_segments
+
+def build_subtitle_groups(transcript, clip_start: float, clip_end: float, max_words: int = 5):
+    """Group the clip's words into (start, end, text) subtitle lines relative to clip_start.
+
+    transcript is a TranscriptIndex, or a list of segments that gets indexed first.
+    """
+    transcript_index = transcript if isinstance(transcript, TranscriptIndex) else TranscriptIndex(transcript)
+    return transcript_index.subtitle_groups(clip_start, clip_end, max_words)
+
+SUBTITLE_STYLE_FIELDS = {"fontname", "fontsize", "bold", "italic", "primarycolor", "outlinecolor", "outline", "shadow", "alignment", "marginv"}
+
+def write_subtitle_file(subtitles: list, subtitle_path: str, style: dict | None = None):
+    """Write subtitle lines to an ASS file styled for 1080x1920 output.
+
+    style overrides fields of the default style (see SUBTITLE_STYLE_FIELDS);
+    colors are given as [r, g, b] or [r, g, b, a] lists.
+    """
+    import pysubs2
 
     subs = pysubs2.SSAFile()
 
@@ -281,6 +1176,10 @@ def create_subtitles_with_ffmpeg(transcript_segments: list, clip_start: float, c
     new_style.marginr = 50
     new_style.marginv = 50
     new_style.spacing = 0.0
+    for field, value in (style or {}).items():
+        if field not in SUBTITLE_STYLE_FIELDS:
+            raise ValueError(f"Unsupported subtitle style field: {field}")
+        setattr(new_style, field, pysubs2.Color(*value) if field.endswith("color") else value)
 
     subs.styles[style_name] = new_style
 
@@ -293,17 +1192,29 @@ def create_subtitles_with_ffmpeg(transcript_segments: list, clip_start: float, c
 
     subs.save(subtitle_path)
 
+def create_subtitles_with_ffmpeg(transcript, clip_start: float, clip_end: float, clip_video_path: str, output_path: str, max_words: int = 5, encoder=None):
+    temp_dir = os.path.dirname(output_path)
+    os.makedirs(temp_dir, exist_ok=True)
+    subtitle_path = os.path.join(temp_dir, "temp_subtitles.ass")
+
+    subtitles = build_subtitle_groups(transcript, clip_start, clip_end, max_words=max_words)
+    write_subtitle_file(subtitles, subtitle_path)
+
     if not subtitles:
         print("No subtitles to add, copying original video")
         shutil.copy(clip_video_path, output_path)
         return
 
     print(f"Creating subtitled video with {len(subtitles)} subtitle segments")
+    encoder = encoder or get_video_encoder()
     ffmpeg_cmd = (f"ffmpeg -y -i {clip_video_path} -vf \"ass={subtitle_path}\" "
-                  f"-c:v h264 -preset fast -crf 23 -c:a copy {output_path}")
+                  f"{encoder.output_args()} -c:a copy {output_path}")
 
     print(f"Running subtitle command: {ffmpeg_cmd}")
-    result = subprocess.run(ffmpeg_cmd, shell=True, capture_output=True, text=True)
+    with stage_span("subtitle_burn", codec=encoder.codec) as span:
+        result = run_command(ffmpeg_cmd, progress_offset=0.0)
+        span["bytes_in"] = file_size(clip_video_path)
+        span["bytes_out"] = file_size(output_path)
     
     if result.returncode != 0:
         print(f"Subtitle creation failed: {result.stderr}")
@@ -313,8 +1224,310 @@ def create_subtitles_with_ffmpeg(transcript_segments: list, clip_start: float, c
     else:
         print(f"Subtitled video created: {output_path}")
 
-def process_clip(base_dir: str, orignal_video_path: str, s3_key: str, clip_index: int, start_time: float, end_time: float, transcript_segments: list):
+VERTICAL_FILTERS = {
+    "pad": "scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2",
+    "crop": "scale=1080:1920:force_original_aspect_ratio=increase,crop=1080:1920",
+}
+
+def render_clip_fused(orignal_video_path: str, start_time: float, end_time: float, subtitle_path, output_path, framing: str = "pad", encoder=None):
+    """Cut, reframe to 9:16 and burn subtitles with a single ffmpeg encode.
+
+    The source is seeked on the input side and decoded once; scale/pad (or crop)
+    and the ass= burn-in run in one filter graph and the source audio is copied
+    through, so the clip is only encoded to H.264 once.
+    """
+    output_path = pathlib.Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    encoder = encoder or get_video_encoder()
+
+    video_filter = VERTICAL_FILTERS[framing]
+    if subtitle_path:
+        video_filter += f",ass={subtitle_path}"
+
+    duration = end_time - start_time
+    fused_cmd = (f"ffmpeg -y -ss {start_time} -t {duration} -i {orignal_video_path} "
+                 f"-map 0:v:0 -map 0:a:0? -vf \"{video_filter}\" "
+                 f"{encoder.output_args()} -c:a copy "
+                 f"{output_path}")
+
+    print(f"Running fused render command: {fused_cmd}")
+    with stage_span("fused_render", codec=encoder.codec) as span:
+        result = run_command(fused_cmd, progress_offset=0.0)
+        span["bytes_out"] = file_size(output_path)
+    if result.returncode != 0 or not output_path.exists():
+        print(f"Fused render failed: {result.stderr}")
+        return False
+    print(f"Fused render created: {output_path}")
+    return True
+
+def cut_clip_segment(orignal_video_path: str, clip_segment_path, start_time: float, end_time: float):
+    """Cut a single clip out of the source with stream copy (per-clip path)"""
+    duration = end_time - start_time
+    cut_command = f"ffmpeg -y -i {orignal_video_path} -ss {start_time} -t {duration} -c copy {clip_segment_path}"
+    print(f"Cutting video with command: {cut_command}")
+    with stage_span("cut", clips=1) as span:
+        result = run_command(cut_command)
+        span["bytes_out"] = file_size(clip_segment_path)
+    if result.returncode != 0:
+        print(f"Video cutting failed: {result.stderr}")
+        return False
+    print(f"Video segment created: {clip_segment_path}")
+    return True
+
+CUT_MODE = os.environ.get("CUT_MODE", "copy")
+SMART_CUT_CODECS = {"h264": ("libx264", "h264_nvenc"), "hevc": ("libx265",)}
+# ffprobe profile names -> encoder -profile:v values; re-encoded edges must share the source's SPS constraints
+SMART_CUT_PROFILES = {
+    "h264": {"Constrained Baseline": "baseline", "Baseline": "baseline", "Main": "main", "High": "high"},
+    "hevc": {"Main": "main"},
+}
+
+def probe_video_codec(video_path: str):
+    """Codec, profile, level, pixel format, time base and frame rate of the first video stream, plus container start time and audio presence"""
+    probe_cmd = (f"ffprobe -v error -show_entries stream=codec_type,codec_name,profile,level,pix_fmt,time_base,avg_frame_rate:format=start_time "
+                 f"-of json {video_path}")
+    result = run_command(probe_cmd)
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to probe video: {result.stderr}")
+    probe = json.loads(result.stdout)
+    video = next(stream for stream in probe["streams"] if stream.get("codec_type") == "video")
+    start_time = probe.get("format", {}).get("start_time")
+    numerator, _, denominator = (video.get("avg_frame_rate") or "0/0").partition("/")
+    return {
+        "codec_name": video.get("codec_name"),
+        "profile": video.get("profile"),
+        "level": video.get("level"),
+        "pix_fmt": video.get("pix_fmt"),
+        "time_base": video.get("time_base"),
+        "fps": float(numerator) / float(denominator) if float(denominator or 0) else 0.0,
+        "start_time": float(start_time) if start_time not in (None, "N/A") else 0.0,
+        "has_audio": any(stream.get("codec_type") == "audio" for stream in probe["streams"])
+    }
+
+@functools.lru_cache(maxsize=8)
+def probe_video_packets(video_path: str):
+    """Presentation times of every frame of the first video stream, in order, and which are keyframes.
+
+    Read from packet timestamps and flags, so nothing is decoded and variable
+    frame rates are handled. Times are relative to the start of the file.
+    Cached per path, so every clip cut from one episode shares a single probe.
+    """
+    probe_cmd = f"ffprobe -v error -select_streams v:0 -show_entries packet=pts_time,flags -of csv=p=0 {video_path}"
+    result = run_command(probe_cmd)
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to probe packets: {result.stderr}")
+
+    frame_times = []
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if pts_time not in ("", "N/A"):
+            frame_times.append(float(pts_time))
+            keyframes.append("K" in flags)
+    order = np.argsort(frame_times, kind="stable")
+    frame_times = np.array(frame_times, dtype=np.float64)[order] - probe_video_codec(video_path)["start_time"]
+    return frame_times, np.array(keyframes, dtype=bool)[order]
+
+def probe_keyframes(video_path: str):
+    """Keyframe times of the first video stream, relative to the start of the file"""
+    frame_times, keyframes = probe_video_packets(video_path)
+    return np.unique(frame_times[keyframes])
+
+def smart_cut_encoder_args(info: dict):
+    """-profile/-level options that keep re-encoded edges on the source's profile and level, or None"""
+    profile = SMART_CUT_PROFILES[info["codec_name"]].get(info["profile"])
+    if profile is None or not info["level"] or info["level"] <= 0:
+        return None
+    if info["codec_name"] == "h264":
+        return f"-profile:v {profile} -level:v {info['level'] / 10:.1f}"
+    # HEVC level_idc is 30x the level number
+    return f"-profile:v {profile} -x265-params level-idc={info['level'] / 30:.1f}"
+
+def verify_smart_cut(clip_segment_path, info: dict, expected_frames: int):
+    """Decode the joined cut with ffprobe and check it is clean and matches the source stream"""
+    probe_cmd = (f"ffprobe -v error -count_frames -select_streams v:0 "
+                 f"-show_entries stream=codec_name,profile,level,pix_fmt,nb_read_frames -of json {clip_segment_path}")
+    result = run_command(probe_cmd)
+    if result.returncode != 0 or result.stderr.strip():
+        print(f"Smart cut did not decode cleanly: {result.stderr.strip()[:500]}")
+        return False
+    streams = json.loads(result.stdout).get("streams") or [{}]
+    stream = streams[0]
+    mismatched = [field for field in ("codec_name", "profile", "level", "pix_fmt") if stream.get(field) != info[field]]
+    frames = int(stream.get("nb_read_frames") or 0)
+    if mismatched or frames != expected_frames:
+        print(f"Smart cut mismatch: {mismatched or 'none'} differ from the source, {frames}/{expected_frames} frames")
+        return False
+    return True
+
+def smart_cut_segment(orignal_video_path: str, clip_segment_path, start_time: float, end_time: float, encoder=None):
+    """Frame-accurate cut that re-encodes only the partial GOPs at the clip edges.
+
+    Video between the first and last keyframes inside [start_time, end_time)
+    is stream copied; the head before the first keyframe and the tail from the
+    last one are encoded in the source's codec family, profile, level and
+    pixel format, so the copied GOPs and the MP4's single sample description
+    stay compatible with them. Parts are written as MPEG-TS, joined with the
+    concat demuxer, and the audio is copied over the exact range; the result
+    is decoded with ffprobe before it is accepted. Returns False when the
+    source can't be smart cut (other codecs, profiles or pixel formats, no
+    keyframe in the clip, a failed step or check) so the caller can fall back.
+    """
+    clip_segment_path = pathlib.Path(clip_segment_path)
+    info = probe_video_codec(orignal_video_path)
+    match_args = smart_cut_encoder_args(info) if info["codec_name"] in SMART_CUT_CODECS else None
+    if match_args is None or info["pix_fmt"] != "yuv420p":
+        print(f"Smart cut unsupported for {info['codec_name']} {info['profile']}@{info['level']}/{info['pix_fmt']}")
+        return False
+
+    frame_times, keyframes = probe_video_packets(orignal_video_path)
+    keyframe_times = np.unique(frame_times[keyframes])
+    # A keyframe right at the end would leave a tail too short to encode
+    inside = keyframe_times[(keyframe_times >= start_time) & (keyframe_times < end_time - 0.1)]
+    if len(inside) == 0:
+        return False
+    first_key, last_key = float(inside[0]), float(inside[-1])
+
+    encoder = encoder or get_video_encoder()
+    if encoder.codec not in SMART_CUT_CODECS[info["codec_name"]]:
+        encoder = VideoEncoder(SMART_CUT_CODECS[info["codec_name"]][0], encoder.tier, encoder.threads)
+    timescale = info["time_base"].split("/")[-1] if info["time_base"] else "90000"
+
+    parts_dir = clip_segment_path.parent / f"{clip_segment_path.stem}_parts"
+    parts_dir.mkdir(parents=True, exist_ok=True)
+    # Parts are bounded by frame counts rather than -t: a stream-copied -t
+    # overshoots by the reordered B-frames, and a float -t can drop the last
+    # frame. Counts come from the packet timestamps, so they hold for variable
+    # frame rates. Seeks land just past keyframes so rounding never picks the
+    # previous GOP; the tail skips accurate seek so its keyframe isn't trimmed away.
+    epsilon = 0.001
+    first_frame, end_frame, first_key_frame, last_key_frame = np.searchsorted(
+        frame_times, [start_time - epsilon, end_time - epsilon, first_key - epsilon, last_key - epsilon])
+    edge_args = f"{encoder.output_args()} {match_args} -fps_mode passthrough"
+    parts = []
+    commands = []
+    if first_key_frame > first_frame:
+        parts.append(parts_dir / "head.ts")
+        commands.append(f"ffmpeg -y -ss {start_time} -i {orignal_video_path} -frames:v {first_key_frame - first_frame} "
+                        f"-map 0:v:0 {edge_args} -f mpegts {parts[-1]}")
+    if last_key_frame > first_key_frame:
+        # Copied packets are in decode order, so whole closed GOPs come out exactly
+        parts.append(parts_dir / "middle.ts")
+        commands.append(f"ffmpeg -y -ss {first_key + epsilon} -i {orignal_video_path} -frames:v {last_key_frame - first_key_frame} "
+                        f"-map 0:v:0 -c copy -f mpegts {parts[-1]}")
+    parts.append(parts_dir / "tail.ts")
+    commands.append(f"ffmpeg -y -noaccurate_seek -ss {last_key + epsilon} -i {orignal_video_path} -frames:v {end_frame - last_key_frame} "
+                    f"-map 0:v:0 {edge_args} -f mpegts {parts[-1]}")
+
+    audio_input = audio_map = ""
+    if info["has_audio"]:
+        audio_input = f"-ss {start_time} -t {end_time - start_time} -i {orignal_video_path} "
+        audio_map = "-map 1:a:0 "
+
+    concat_list = parts_dir / "parts.txt"
+    concat_list.write_text("".join(f"file '{part}'\n" for part in parts))
+    commands.append(f"ffmpeg -y -f concat -safe 0 -i {concat_list} {audio_input}-map 0:v:0 {audio_map}-c copy "
+                    f"-video_track_timescale {timescale} -movflags +faststart {clip_segment_path}")
+
+    try:
+        with stage_span("smart_cut", encoded_s=round(first_key - start_time + end_time - last_key, 3)) as span:
+            for command in commands:
+                result = run_command(command)
+                if result.returncode != 0:
+                    print(f"Smart cut step failed: {command}\n{result.stderr}")
+                    return False
+            if not verify_smart_cut(clip_segment_path, info, int(end_frame - first_frame)):
+                return False
+            span["bytes_out"] = file_size(clip_segment_path)
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    print(f"Smart cut {clip_segment_path}: re-encoded {first_key - start_time:.2f}s head + {end_time - last_key:.2f}s tail, "
+          f"copied {last_key - first_key:.2f}s")
+    return True
+
+def encode_clip_segment(orignal_video_path: str, clip_segment_path, start_time: float, end_time: float, encoder=None):
+    """Frame-accurate cut by re-encoding the whole range (smart cut fallback)"""
+    encoder = encoder or get_video_encoder()
+    duration = end_time - start_time
+    encode_command = (f"ffmpeg -y -ss {start_time} -t {duration} -i {orignal_video_path} "
+                      f"-map 0:v:0 -map 0:a:0? {encoder.output_args()} -c:a copy {clip_segment_path}")
+    with stage_span("cut", clips=1, codec=encoder.codec) as span:
+        result = run_command(encode_command)
+        span["bytes_out"] = file_size(clip_segment_path)
+    if result.returncode != 0:
+        print(f"Segment encode failed: {result.stderr}")
+        return False
+    return True
+
+def extract_clip_segments(base_dir: str, orignal_video_path: str, clip_ranges: list, cut_mode: str = "copy"):
+    """Cut every selected clip from the source in a single ffmpeg run.
+
+    Each clip is opened as its own input with -ss/-t placed before -i, so ffmpeg
+    seeks through the container's keyframe index instead of demuxing the source
+    from the beginning once per clip. Writes the same clip_N/clip_N_segment.mp4
+    files as process_clip and returns {clip_index: segment_path} for the clips
+    that were created.
+
+    Stream copy can only start on a keyframe, so those segments may begin
+    early. cut_mode="smart" makes every segment frame-accurate with
+    smart_cut_segment instead, re-encoding the whole range only where a smart
+    cut is not possible.
+    """
+    base_dir_path = pathlib.Path(base_dir)
+    if not clip_ranges:
+        return {}
+
+    segment_paths = {}
+    for clip_index, start_time, end_time in clip_ranges:
+        clip_name = f"clip_{clip_index}"
+        clip_dir = base_dir_path / clip_name
+        clip_dir.mkdir(parents=True, exist_ok=True)
+        segment_paths[clip_index] = clip_dir / f"{clip_name}_segment.mp4"
+
+    if cut_mode == "smart":
+        created = {}
+        for clip_index, start_time, end_time in clip_ranges:
+            clip_segment_path = segment_paths[clip_index]
+            if (smart_cut_segment(orignal_video_path, clip_segment_path, start_time, end_time)
+                    or encode_clip_segment(orignal_video_path, clip_segment_path, start_time, end_time)):
+                created[clip_index] = clip_segment_path
+        print(f"Smart cut {len(created)}/{len(clip_ranges)} clips")
+        return created
+
+    input_args = []
+    output_args = []
+    for input_index, (clip_index, start_time, end_time) in enumerate(clip_ranges):
+        clip_segment_path = segment_paths[clip_index]
+        duration = end_time - start_time
+        input_args.append(f"-ss {start_time} -t {duration} -i {orignal_video_path}")
+        output_args.append(f"-map {input_index}:v:0 -map {input_index}:a:0? -c copy {clip_segment_path}")
+
+    segment_command = f"ffmpeg -y {' '.join(input_args)} {' '.join(output_args)}"
+    print(f"Cutting {len(clip_ranges)} clips with command: {segment_command}")
+    with stage_span("cut", clips=len(clip_ranges)) as span:
+        result = run_command(segment_command)
+        span["bytes_out"] = sum(file_size(path) for path in segment_paths.values())
+    if result.returncode != 0:
+        print(f"Single-pass segmenting failed: {result.stderr}")
+
+    created = {}
+    for clip_index, start_time, end_time in clip_ranges:
+        clip_segment_path = segment_paths[clip_index]
+        if result.returncode == 0 and clip_segment_path.exists():
+            created[clip_index] = clip_segment_path
+            continue
+        # Fall back to the per-clip cut for anything the shared run did not produce
+        if cut_clip_segment(orignal_video_path, clip_segment_path, start_time, end_time):
+            created[clip_index] = clip_segment_path
+
+    print(f"Segmented {len(created)}/{len(clip_ranges)} clips")
+    return created
+
+def process_clip(base_dir: str, orignal_video_path: str, s3_key: str, clip_index: int, start_time: float, end_time: float, transcript, render_mode: str = "fused", encoder=None,
+                 render_cache=None, source_id=None):
     print(f"=== PROCESSING CLIP {clip_index} ===")
+    encoder = encoder or get_video_encoder()
     print(f"Start time: {start_time}, End time: {end_time}")
     
     clip_name = f"clip_{clip_index}"
@@ -330,31 +1543,66 @@ def process_clip(base_dir: str, orignal_video_path: str, s3_key: str, clip_index
     substitute_output_path = clip_dir / "pyavi" / "video_with_subtitles.mp4"
 
     (clip_dir / "pywork").mkdir(exist_ok=True)
-    pyframes_path = clip_dir / "pyframes"
-    pyavi_path = clip_dir / "pyavi" / "audio-wav"
-
-    pyframes_path.mkdir(parents=True, exist_ok=True)
-    pyavi_path.mkdir(parents=True, exist_ok=True)
-
-    duration = end_time - start_time
-    cut_command = f"ffmpeg -y -i {orignal_video_path} -ss {start_time} -t {duration} -c copy {clip_segment_path}"
-    print(f"Cutting video with command: {cut_command}")
-    result = subprocess.run(cut_command, shell=True, capture_output=True, text=True)
-    if result.returncode != 0:
-        print(f"Video cutting failed: {result.stderr}")
+    (clip_dir / "pyavi").mkdir(exist_ok=True)
+
+    # The fused and cached renders read the source directly and need no pre-cut segment
+    if render_mode == "fused":
+        subtitles = build_subtitle_groups(transcript, start_time, end_time, max_words=5)
+        subtitle_path = None
+        if subtitles:
+            subtitle_path = clip_dir / "pyavi" / "temp_subtitles.ass"
+            write_subtitle_file(subtitles, str(subtitle_path))
+
+        if render_clip_fused(orignal_video_path, start_time, end_time, subtitle_path, substitute_output_path, encoder=encoder):
+            return substitute_output_path
+        print("Falling back to multi-step vertical + subtitle render")
+
+    if render_mode == "cached" and render_cache is not None:
+        subtitles = build_subtitle_groups(transcript, start_time, end_time, max_words=5)
+        if render_clip_cached(render_cache, source_id, lambda: orignal_video_path, start_time, end_time, subtitles, substitute_output_path, encoder=encoder):
+            return substitute_output_path
+        print("Falling back to multi-step vertical + subtitle render")
+
+    # extract_clip_segments writes the segment up front when the render mode needs it
+    if clip_segment_path.exists():
+        print(f"Using pre-cut video segment: {clip_segment_path}")
+    elif not cut_clip_segment(orignal_video_path, clip_segment_path, start_time, end_time):
         return None
-    print(f"Video segment created: {clip_segment_path}")
 
     audio_path = clip_dir / "audio.wav"
-    extract_audio_cmd = f"ffmpeg -y -i {clip_segment_path} -vn -acodec pcm_s16le -ar 16000 -ac 1 {audio_path}"
-    print(f"Extracting audio with command: {extract_audio_cmd}")
-    result = subprocess.run(extract_audio_cmd, shell=True, capture_output=True, text=True)
-    if result.returncode != 0:
-        print(f"Audio extraction failed: {result.stderr}")
-        return None
-    print(f"Audio extracted: {audio_path}")
+    master_audio_path = base_dir_path / "audio.wav"
+    if master_audio_path.exists():
+        # transcribe_video already decoded the episode; slice the samples instead of decoding again
+        with stage_span("audio_slice") as span:
+            write_audio_slice(master_audio_path, start_time, end_time, audio_path)
+            span["bytes_out"] = file_size(audio_path)
+        print(f"Audio sliced from master track: {audio_path}")
+    else:
+        extract_audio_cmd = f"ffmpeg -y -i {clip_segment_path} -vn -acodec pcm_s16le -ar 16000 -ac 1 {audio_path}"
+        print(f"Extracting audio with command: {extract_audio_cmd}")
+        with stage_span("audio_extract") as span:
+            result = run_command(extract_audio_cmd)
+            span["bytes_out"] = file_size(audio_path)
+        if result.returncode != 0:
+            print(f"Audio extraction failed: {result.stderr}")
+            return None
+        print(f"Audio extracted: {audio_path}")
 
-    shutil.copy(clip_segment_path, base_dir_path / f"{clip_name}.mp4")
+    if render_mode == "smart":
+        # Built-in sparse face tracking drives an active-speaker crop; any failure falls back to the basic framing
+        try:
+            with stage_span("face_track") as span:
+                tracks, scores = track_faces(str(clip_segment_path))
+                span["tracks"] = len(tracks)
+            if tracks:
+                with stage_span("vertical_render", codec=encoder.codec, mode="smart"):
+                    create_vertical_video(tracks, scores, str(clip_segment_path), str(audio_path), vertical_mp4_path,
+                                          framerate=FACE_TRACK_FRAMERATE, encoder=encoder)
+                create_subtitles_with_ffmpeg(transcript, start_time, end_time, str(vertical_mp4_path), str(substitute_output_path), max_words=5, encoder=encoder)
+                return substitute_output_path
+            print("No face tracks found, using basic vertical framing")
+        except Exception as e:
+            print(f"Smart framing failed, using basic vertical framing: {e}")
 
     print(f"Creating vertical video immediately with:")
     print(f"  clip_segment_path: {clip_segment_path}")
@@ -363,145 +1611,36 @@ def process_clip(base_dir: str, orignal_video_path: str, s3_key: str, clip_index
     print(f"  clip_segment_path exists: {clip_segment_path.exists()}")
     print(f"  audio_path exists: {audio_path.exists()}")
     
-    create_basic_vertical_video(str(clip_segment_path), str(audio_path), vertical_mp4_path)
+    create_basic_vertical_video(str(clip_segment_path), str(audio_path), vertical_mp4_path, encoder=encoder)
 
-    create_subtitles_with_ffmpeg(transcript_segments, start_time, end_time, str(vertical_mp4_path), str(substitute_output_path), max_words=5)
+    create_subtitles_with_ffmpeg(transcript, start_time, end_time, str(vertical_mp4_path), str(substitute_output_path), max_words=5, encoder=encoder)
     
     return substitute_output_path
 
 
-@app.cls(gpu="L40S", timeout=900, retries=0, scaledown_window=20, secrets=[modal.Secret.from_name("custom-secret")], volumes={mount_path: volume})
-class AiPodcastClipper:
-    @modal.enter()
-    def load_model(self):
-        self.whisperx_model = whisperx.load_model("large-v2", device="cuda", compute_type="float16")
-        self.alignment_model, self.metadata = whisperx.load_align_model(language_code="en", device="cuda")
-        
-        # Replace Gemini with OpenAI for maximum reliability
-        self.openai_client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
-
-    def transcribe_video(self, base_dir: str, video_path: str) -> str:
-        base_dir_path = pathlib.Path(base_dir)
-        audio_path = base_dir_path / "audio.wav"
-        
-        probe_cmd = f"ffprobe -v quiet -select_streams a -show_entries stream=codec_type -of csv=p=0 {video_path}"
-        probe_result = subprocess.run(probe_cmd, shell=True, capture_output=True, text=True)
-        
-        if probe_result.returncode != 0 or not probe_result.stdout.strip():
-            duration_cmd = f"ffprobe -v quiet -show_entries format=duration -of csv=p=0 {video_path}"
-            duration_result = subprocess.run(duration_cmd, shell=True, capture_output=True, text=True)
-            duration = float(duration_result.stdout.strip()) if duration_result.returncode == 0 else 0
-            
-            extract_cmd = f"ffmpeg -f lavfi -i anullsrc=channel_layout=mono:sample_rate=16000 -t {duration} -acodec pcm_s16le -ar 16000 -ac 1 {audio_path}"
-        else:
-            extract_cmd = f"ffmpeg -i {video_path} -vn -acodec pcm_s16le -ar 16000 -ac 1 {audio_path}"
-        
-        result = subprocess.run(extract_cmd, shell=True, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            raise RuntimeError(f"Failed to extract audio: {result.stderr}")
-        
-        if not audio_path.exists():
-            raise RuntimeError(f"Audio file was not created: {audio_path}")
-        
-        start_time = time.time()
-
-        audio = whisperx.load_audio(str(audio_path))
-        result = self.whisperx_model.transcribe(audio, batch_size=16)
-
-        aligned_result = whisperx.align(
-            result["segments"],
-            self.alignment_model,
-            self.metadata,
-            audio,
-            device="cuda",
-            return_char_alignments=False
-        )
-        duration = time.time() - start_time
-        
-        # Verify the result structure
-        print(f"Alignment result type: {type(aligned_result)}")
-        if isinstance(aligned_result, dict):
-            print(f"Alignment result keys: {aligned_result.keys()}")
-            if "segments" in aligned_result:
-                print(f"Aligned segments count: {len(aligned_result['segments'])}")
-            else:
-                print("WARNING: 'segments' key not found in aligned result!")
-        else:
-            print(f"WARNING: Alignment result is not a dict: {type(aligned_result)}")
-        
-        return aligned_result
-
-    def identify_moments(self, transcript: dict):
-        """Use OpenAI to identify 30-60 second viral moments from transcript"""
-        
-        # Extract segments
-        segments_data = []
-        for segment in transcript:
-            segments_data.append({
-                "start": segment["start"],
-                "end": segment["end"], 
-                "text": segment["text"]
-            })
-        
-        print(f"Analyzing {len(segments_data)} transcript segments with GPT-4o-mini...")
-        
-        # Define function schema for structured output
-        tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": "identify_podcast_clips",
-                    "description": "Identify viral 30-60 second clips from video content",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "clips": {
-                                "type": "array",
-                                "description": "30-60 second clips",
-                                "items": {
-                                    "type": "object",
-                                    "properties": {
-                                        "start": {
-                                            "type": "number",
-                                            "description": "Start time in seconds"
-                                        },
-                                        "end": {
-                                            "type": "number",
-                                            "description": "End time in seconds (MUST be 30-60 seconds after start)"
-                                        },
-                                        "reason": {
-                                            "type": "string",
-                                            "description": "Why this moment is viral"
-                                        },
-                                        "hook": {
-                                            "type": "string",
-                                            "description": "Catchy title (under 60 chars)"
-                                        },
-                                        "virality_score": {
-                                            "type": "integer",
-                                            "description": "Score 1-10",
-                                            "minimum": 1,
-                                            "maximum": 10
-                                        }
-                                    },
-                                    "required": ["start", "end", "reason", "hook", "virality_score"]
-                                }
-                            }
-                        },
-                        "required": ["clips"]
-                    }
-                }
-            }
-        ]
-        
-        try:
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",  # Cheaper and fast
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """You identify viral 30-60 second clips from video transcripts.
+MOMENT_MODEL = "gpt-4o-mini"
+MOMENT_WINDOW_SECONDS = 900
+MOMENT_WINDOW_OVERLAP_SECONDS = 120
+MOMENT_CONCURRENCY = 4
+HOOK_MAX_CHARS = 60
+
+# Local pre-ranking: only the best-scoring windows go to the model ("full" sends the whole transcript)
+MOMENT_SELECTION = os.environ.get("MOMENT_SELECTION", "shortlist")
+MOMENT_SHORTLIST_SIZE = int(os.environ.get("MOMENT_SHORTLIST_SIZE", 12))
+RANK_WINDOW_SECONDS = 45
+RANK_STEP_SECONDS = 5
+RANK_CONTEXT_SECONDS = 10
+RANK_KEYWORDS = frozenset({
+    "secret", "secrets", "never", "crazy", "insane", "mistake", "mistakes", "truth", "money", "million", "billion",
+    "biggest", "worst", "best", "why", "actually", "honestly", "shocking", "wrong", "problem", "hate", "love",
+    "failed", "failure", "lesson", "advice", "story", "nobody", "everyone", "changed", "fired", "quit", "scared",
+})
+RANK_FEATURE_WEIGHTS = {
+    "speech_rate": 1.0, "pause_fraction": -1.0, "long_pauses": -0.7, "punctuation": 0.7,
+    "keywords": 1.0, "confidence": 0.5, "loudness_std": 0.8,
+}
+
+CLIP_SYSTEM_PROMPT = """You identify viral 30-60 second clips from video transcripts.
 
 CRITICAL REQUIREMENTS:
 1. Each clip MUST be exactly 30-60 seconds long
@@ -527,72 +1666,1741 @@ AVOID:
 - Abstract philosophy
 
 CRITICAL: Each clip must be 30-60 seconds. If you find a great moment at time X, expand it to [X-15, X+30] or similar."""
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Find viral 30-60 second clips in this transcript:\n\n{json.dumps(segments_data, indent=2)}"
+
+# Function schema for structured output
+CLIP_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "identify_podcast_clips",
+            "description": "Identify viral 30-60 second clips from video content",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "clips": {
+                        "type": "array",
+                        "description": "30-60 second clips",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "start": {
+                                    "type": "number",
+                                    "description": "Start time in seconds"
+                                },
+                                "end": {
+                                    "type": "number",
+                                    "description": "End time in seconds (MUST be 30-60 seconds after start)"
+                                },
+                                "reason": {
+                                    "type": "string",
+                                    "description": "Why this moment is viral"
+                                },
+                                "hook": {
+                                    "type": "string",
+                                    "description": f"Catchy title (under {HOOK_MAX_CHARS} chars)"
+                                },
+                                "virality_score": {
+                                    "type": "integer",
+                                    "description": "Score 1-10",
+                                    "minimum": 1,
+                                    "maximum": 10
+                                }
+                            },
+                            "required": ["start", "end", "reason", "hook", "virality_score"]
+                        }
                     }
-                ],
-                tools=tools,
-                tool_choice={"type": "function", "function": {"name": "identify_podcast_clips"}},
-                temperature=0.5
-            )
-            
-            # Extract the function call
-            tool_call = response.choices[0].message.tool_calls[0]
-            clips_data = json.loads(tool_call.function.arguments)
-            
-            clips = clips_data.get("clips", [])
-            print(f"GPT-4o-mini identified {len(clips)} potential clips")
-            
-            # Validate and filter clips
-            validated_clips = []
-            for clip in clips:
-                if "start" not in clip or "end" not in clip:
-                    print(f"Skipping clip missing start/end: {clip.get('hook', 'Unknown')}")
-                    continue
-                
-                duration = clip["end"] - clip["start"]
-                
-                # Require at least 30 seconds, max 60 seconds
-                if duration < 30:
-                    print(f"Skipping clip too short ({duration:.1f}s): {clip.get('hook')}")
-                    continue
-                elif duration > 60:
-                    print(f"Skipping clip too long ({duration:.1f}s): {clip.get('hook')}")
+                },
+                "required": ["clips"]
+            }
+        }
+    }
+]
+
+CLIP_TOOL_CHOICE = {"type": "function", "function": {"name": "identify_podcast_clips"}}
+
+def encode_transcript_compact(segments: list):
+    """One "[start,end] text" line per segment; far fewer tokens than indented JSON"""
+    return "\n".join(f"[{segment['start']:.1f},{segment['end']:.1f}] {segment['text'].strip()}" for segment in segments)
+
+def split_transcript_windows(segments: list, window_s: float = MOMENT_WINDOW_SECONDS, overlap_s: float = MOMENT_WINDOW_OVERLAP_SECONDS):
+    """Split segments into overlapping (window_start, window_end, segments) time windows.
+
+    The overlap is at least one maximum clip length, so every 30-60s moment
+    fits entirely inside some window.
+    """
+    if not segments:
+        return []
+    total_duration = segments[-1]["end"]
+    windows = []
+    window_start = 0.0
+    while True:
+        window_end = window_start + window_s
+        window_segments = [segment for segment in segments
+                           if segment["end"] > window_start and segment["start"] < window_end]
+        if window_segments:
+            windows.append((window_start, window_end, window_segments))
+        if window_end >= total_duration:
+            break
+        window_start += window_s - overlap_s
+    return windows
+
+def clip_request_messages(transcript_text: str):
+    return [
+        {"role": "system", "content": CLIP_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Find viral 30-60 second clips in this transcript. Each line is [start,end] text with times in seconds:\n\n{transcript_text}"}
+    ]
+
+def moment_window_features(transcript_index: TranscriptIndex, window_starts, window_s: float, audio_path=None):
+    """Feature arrays aligned with window_starts, computed with prefix sums over the tokens.
+
+    speech_rate is tokens per second, pause_fraction the share of the window
+    no token covers, long_pauses the gaps over 2 s, punctuation and keywords
+    the ?/! endings and RANK_KEYWORDS hits per token, confidence the mean word
+    score, and loudness_std the spread in dB of 0.5 s audio levels.
+    """
+    window_starts = np.asarray(window_starts, dtype=np.float64)
+    token_start, token_end = transcript_index.token_start, transcript_index.token_end
+    first = np.searchsorted(token_start, window_starts, side="left")
+    last = np.searchsorted(token_start, window_starts + window_s, side="left")
+    counts = (last - first).astype(np.float64)
+
+    def window_sums(values, lower=first, upper=last):
+        prefix = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+        return prefix[upper] - prefix[lower]
+
+    texts = [transcript_index.token_text(index) for index in range(len(token_start))]
+    punctuation = np.fromiter((text.endswith(("?", "!")) for text in texts), dtype=np.float64, count=len(texts))
+    keywords = np.fromiter((text.strip(".,!?;:\"'").lower() in RANK_KEYWORDS for text in texts), dtype=np.float64, count=len(texts))
+    scored = ~np.isnan(transcript_index.token_score)
+
+    # Tokens may overlap (segment-level timings), so coverage and gaps use the running max end
+    end_max = np.maximum.accumulate(token_end)
+    next_start = np.append(token_start[1:], np.inf)
+    covered = np.clip(np.minimum(end_max, next_start) - token_start, 0.0, None)
+    gaps = np.clip(token_start[1:] - end_max[:-1], 0.0, None)
+    gap_upper = np.maximum(last - 1, first)
+
+    per_token = np.maximum(counts, 1.0)
+    features = {
+        "speech_rate": counts / window_s,
+        "pause_fraction": 1.0 - np.clip(window_sums(covered) / window_s, 0.0, 1.0),
+        "long_pauses": window_sums(gaps > 2.0, first, gap_upper),
+        "punctuation": window_sums(punctuation) / per_token,
+        "keywords": window_sums(keywords) / per_token,
+        "confidence": window_sums(np.where(scored, transcript_index.token_score, 0.0)) / np.maximum(window_sums(scored), 1.0),
+        "loudness_std": np.zeros(len(window_starts)),
+    }
+
+    if audio_path is not None and os.path.exists(audio_path):
+        frame_s = 0.5
+        samples, sample_rate = open_wav_samples(audio_path)
+        levels = np.maximum(frame_energy_db(samples, sample_rate, frame_s), VAD_SILENCE_DB).astype(np.float64)
+        if len(levels):
+            lower = np.clip((window_starts / frame_s).astype(np.int64), 0, len(levels))
+            upper = np.clip(((window_starts + window_s) / frame_s).astype(np.int64), lower, len(levels))
+            frames = np.maximum(upper - lower, 1)
+            mean = window_sums(levels, lower, upper) / frames
+            features["loudness_std"] = np.sqrt(np.clip(window_sums(levels ** 2, lower, upper) / frames - mean ** 2, 0.0, None))
+    return features
+
+def rank_moment_windows(transcript_index: TranscriptIndex, audio_path=None, top_n: int = MOMENT_SHORTLIST_SIZE,
+                        window_s: float = RANK_WINDOW_SECONDS, step_s: float = RANK_STEP_SECONDS):
+    """The top_n best non-overlapping window_s windows (step_s apart) by local features, best first.
+
+    A window's score is the RANK_FEATURE_WEIGHTS-weighted sum of its feature
+    z-scores across all windows of the episode. Each entry has start, end,
+    score, the raw features, each feature's share of the score and a short
+    text preview.
+    """
+    if not len(transcript_index.token_start):
+        return []
+    total_duration = float(transcript_index.token_end.max())
+    window_s = min(window_s, total_duration)
+    if window_s < 30:
+        return []
+
+    window_starts = np.arange(0.0, total_duration - window_s + 1e-9, step_s)
+    features = moment_window_features(transcript_index, window_starts, window_s, audio_path)
+    contributions = {}
+    for name, weight in RANK_FEATURE_WEIGHTS.items():
+        values = features[name]
+        spread = values.std()
+        contributions[name] = weight * (values - values.mean()) / spread if spread > 0 else np.zeros(len(values))
+    scores = np.sum(list(contributions.values()), axis=0)
+
+    shortlist = []
+    for index in np.argsort(-scores, kind="stable"):
+        start = float(window_starts[index])
+        end = start + window_s
+        if any(start < chosen["end"] and chosen["start"] < end for chosen in shortlist):
+            continue
+        tokens = transcript_index.token_range(start, end)[:12]
+        shortlist.append({
+            "start": start,
+            "end": end,
+            "score": round(float(scores[index]), 3),
+            "features": {name: round(float(values[index]), 3) for name, values in features.items()},
+            "contributions": {name: round(float(values[index]), 3) for name, values in contributions.items()},
+            "preview": " ".join(transcript_index.token_text(token) for token in tokens),
+        })
+        if len(shortlist) >= top_n:
+            break
+    return shortlist
+
+def shorten_hook(text: str, max_chars: int = HOOK_MAX_CHARS):
+    """text cut on a word boundary, with "...", so it fits in max_chars"""
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars - 3]
+    if " " in cut and not text[max_chars - 3].isspace():
+        cut = cut.rsplit(" ", 1)[0]
+    return cut.rstrip(" ,.;:-") + "..."
+
+def encode_shortlist(segments: list, shortlist: list, context_s: float = RANK_CONTEXT_SECONDS):
+    """Compact transcript lines of each shortlisted window plus context_s either side, under a candidate header"""
+    blocks = []
+    for rank, candidate in enumerate(shortlist, start=1):
+        context_start, context_end = candidate["start"] - context_s, candidate["end"] + context_s
+        lines = [segment for segment in segments if segment["end"] > context_start and segment["start"] < context_end]
+        blocks.append(f"Candidate {rank} ({candidate['start']:.0f}-{candidate['end']:.0f}s):\n{encode_transcript_compact(lines)}")
+    return "\n\n".join(blocks)
+
+def shortlist_request_messages(shortlist_text: str):
+    return [
+        {"role": "system", "content": CLIP_SYSTEM_PROMPT},
+        {"role": "user", "content": "These candidate windows were pre-selected from a longer transcript. Find viral 30-60 second clips "
+                                    "inside them; a clip may extend into the context lines around its window. Each line is "
+                                    f"[start,end] text with times in seconds:\n\n{shortlist_text}"}
+    ]
+
+def parse_clip_tool_call(response):
+    tool_call = response.choices[0].message.tool_calls[0]
+    return json.loads(tool_call.function.arguments).get("clips", [])
+
+def validate_clips(clips: list):
+    """Keep 30-60s clips, highest virality first, dropping clips that overlap a better one"""
+    validated_clips = []
+    for clip in sorted(clips, key=lambda x: x.get("virality_score", 0), reverse=True):
+        if "start" not in clip or "end" not in clip:
+            print(f"Skipping clip missing start/end: {clip.get('hook', 'Unknown')}")
+            continue
+
+        duration = clip["end"] - clip["start"]
+
+        # Require at least 30 seconds, max 60 seconds
+        if duration < 30:
+            print(f"Skipping clip too short ({duration:.1f}s): {clip.get('hook')}")
+            continue
+        elif duration > 60:
+            print(f"Skipping clip too long ({duration:.1f}s): {clip.get('hook')}")
+            continue
+
+        # Check for overlaps with already validated clips
+        overlaps = False
+        for validated in validated_clips:
+            if not (clip["end"] <= validated["start"] or clip["start"] >= validated["end"]):
+                print(f"Skipping overlapping clip: {clip.get('hook')}")
+                overlaps = True
+                break
+
+        if not overlaps:
+            validated_clips.append(clip)
+            print(f"✓ Validated clip: {clip.get('hook')} ({duration:.1f}s, score: {clip.get('virality_score', 'N/A')})")
+
+    return validated_clips
+
+async def score_transcript_window(async_client, semaphore, window_index: int, window_start: float, window_end: float, segments: list):
+    """Ask the model for clips inside one window; returns (clips, stats)"""
+    async with semaphore:
+        request_start = time.perf_counter()
+        response = await async_client.chat.completions.create(
+            model=MOMENT_MODEL,
+            messages=clip_request_messages(encode_transcript_compact(segments)),
+            tools=CLIP_TOOLS,
+            tool_choice=CLIP_TOOL_CHOICE,
+            temperature=0.5
+        )
+        latency = time.perf_counter() - request_start
+
+    usage = getattr(response, "usage", None)
+    stats = {
+        "window": window_index,
+        "start": window_start,
+        "end": window_end,
+        "segments": len(segments),
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "latency_s": round(latency, 3),
+    }
+    print(f"Moment window stats: {json.dumps(stats)}")
+    return parse_clip_tool_call(response), stats
+
+async def identify_moments_windowed(async_client, segments: list, window_s: float = MOMENT_WINDOW_SECONDS,
+                                    overlap_s: float = MOMENT_WINDOW_OVERLAP_SECONDS, concurrency: int = MOMENT_CONCURRENCY):
+    """Score transcript windows concurrently and merge the candidates globally.
+
+    Returns (validated_clips, window_stats). A window whose request fails is
+    logged and skipped; the remaining windows still contribute candidates.
+    """
+    windows = split_transcript_windows(segments, window_s, overlap_s)
+    semaphore = asyncio.Semaphore(concurrency)
+    results = await asyncio.gather(
+        *(score_transcript_window(async_client, semaphore, index, window_start, window_end, window_segments)
+          for index, (window_start, window_end, window_segments) in enumerate(windows)),
+        return_exceptions=True
+    )
+
+    candidates = []
+    window_stats = []
+    for index, result in enumerate(results):
+        if isinstance(result, Exception):
+            print(f"Moment window {index} failed: {result}")
+            continue
+        clips, stats = result
+        candidates.extend(clips)
+        window_stats.append(stats)
+
+    print(f"{len(windows)} windows produced {len(candidates)} candidate clips")
+    if windows and not window_stats:
+        raise RuntimeError("Every moment window failed")
+    return validate_clips(candidates), window_stats
+
+def clip_worker_count(num_clips: int, running_jobs: int = 1):
+    """Size one job's clip pool by its share of this container's cores among the running_jobs admitted now"""
+    if "CLIP_WORKERS" in os.environ:
+        return max(1, min(num_clips, int(os.environ["CLIP_WORKERS"])))
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    # Each ffmpeg encode is itself multi-threaded, so leave a couple of cores per clip
+    return max(1, min(num_clips, cores // 2 // max(1, running_jobs)))
+
+def render_moment_clip(base_dir: str, orignal_video_path: str, s3_key: str, index: int, moment: dict, transcript, render_cache=None, source_id=None,
+                       report_progress=None):
+    """Render one clip, returning the finished video path or None.
+
+    report_progress(position_s) receives how far the clip's render passes have got.
+    """
+    print(f"\n{'='*60}")
+    print(f"Processing clip {index + 1}")
+    print(f"Hook: {moment.get('hook')}")
+    print(f"Reason: {moment.get('reason')}")
+    print(f"Time: {moment['start']:.1f}s - {moment['end']:.1f}s")
+    print(f"Virality Score: {moment.get('virality_score')}/10")
+    print(f"{'='*60}\n")
+
+    progress_token = current_render_progress.set(report_progress)
+    try:
+        vertical_video_path = process_clip(
+            base_dir,
+            orignal_video_path,
+            s3_key,
+            index,
+            moment["start"],
+            moment["end"],
+            transcript,
+            render_mode=RENDER_MODE,
+            render_cache=render_cache,
+            source_id=source_id
+        )
+    finally:
+        current_render_progress.reset(progress_token)
+
+    if not vertical_video_path or not vertical_video_path.exists():
+        return None
+    return vertical_video_path
+
+def upload_clip(vertical_video_path, s3_key: str, index: int, moment: dict, s3_client, horizontal_path=None):
+    """Upload a rendered clip (and its horizontal original if given), returning its response entry or None"""
+    s3_key_dir = os.path.dirname(s3_key)
+    clip_s3_key = f"{s3_key_dir}/clips/clip_{index}.mp4"
+    video_url = upload_to_s3(vertical_video_path, clip_s3_key, s3_client)
+    if not video_url:
+        return None
+
+    print(f"✓ Uploaded clip {index} to S3: {video_url}")
+    clip_entry = {
+        "clip_index": index,
+        "start_time": moment["start"],
+        "end_time": moment["end"],
+        "duration": moment["end"] - moment["start"],
+        "hook": moment.get("hook", ""),
+        "reason": moment.get("reason", ""),
+        "virality_score": moment.get("virality_score", 0),
+        "video_url": video_url
+    }
+    if "speech_ratio" in moment:
+        clip_entry["speech_ratio"] = moment["speech_ratio"]
+    if horizontal_path:
+        horizontal_url = upload_to_s3(horizontal_path, f"{s3_key_dir}/clips/clip_{index}_horizontal.mp4", s3_client)
+        if horizontal_url:
+            clip_entry["horizontal_video_url"] = horizontal_url
+    return clip_entry
+
+
+def open_wav_samples(audio_path):
+    """Memory-map the samples of a 16-bit PCM WAV file.
+
+    Returns (samples, sample_rate) where samples is a read-only int16 memmap of
+    shape (frames,) for mono or (frames, channels) otherwise.
+    """
+    file_size = os.path.getsize(audio_path)
+    with open(audio_path, "rb") as wav_file:
+        header = wav_file.read(12)
+        if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            raise ValueError(f"Not a WAV file: {audio_path}")
+
+        channels = sample_rate = bits_per_sample = None
+        while True:
+            chunk_header = wav_file.read(8)
+            if len(chunk_header) < 8:
+                raise ValueError(f"No data chunk in {audio_path}")
+            chunk_id = chunk_header[:4]
+            chunk_size = int.from_bytes(chunk_header[4:], "little")
+            if chunk_id == b"fmt ":
+                fmt = wav_file.read(chunk_size)
+                channels = int.from_bytes(fmt[2:4], "little")
+                sample_rate = int.from_bytes(fmt[4:8], "little")
+                bits_per_sample = int.from_bytes(fmt[14:16], "little")
+            elif chunk_id == b"data":
+                data_offset = wav_file.tell()
+                # Streamed WAVs carry a placeholder size; trust the file length instead
+                data_size = min(chunk_size, file_size - data_offset)
+                break
+            else:
+                wav_file.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+    if bits_per_sample != 16:
+        raise ValueError(f"Expected 16-bit PCM, got {bits_per_sample}-bit: {audio_path}")
+
+    frame_count = data_size // (2 * channels)
+    if frame_count == 0:
+        return np.zeros(0, dtype=np.int16), sample_rate
+    shape = (frame_count,) if channels == 1 else (frame_count, channels)
+    samples = np.memmap(audio_path, dtype="<i2", mode="r", offset=data_offset, shape=shape)
+    return samples, sample_rate
+
+def write_audio_slice(master_audio_path, start_time: float, end_time: float, output_path):
+    """Copy the [start_time, end_time) samples of a PCM WAV into a new WAV without decoding"""
+    samples, sample_rate = open_wav_samples(master_audio_path)
+    first_sample = min(max(int(round(start_time * sample_rate)), 0), len(samples))
+    last_sample = min(max(int(round(end_time * sample_rate)), first_sample), len(samples))
+    channels = 1 if samples.ndim == 1 else samples.shape[1]
+
+    with wave.open(str(output_path), "wb") as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(np.ascontiguousarray(samples[first_sample:last_sample]).tobytes())
+    return output_path
+
+def frame_energy_db(samples, sample_rate: int, frame_s: float = VAD_FRAME_SECONDS, block_s: float = 60.0):
+    """RMS level in dBFS of consecutive frame_s frames of int16 samples (trailing partial frame dropped).
+
+    The memmap is read block_s at a time, so only one block is ever converted to float.
+    """
+    frame_samples = max(int(frame_s * sample_rate), 1)
+    frame_count = len(samples) // frame_samples
+    block_frames = max(int(block_s / frame_s), 1)
+    levels = np.empty(frame_count, dtype=np.float32)
+    for first_frame in range(0, frame_count, block_frames):
+        last_frame = min(first_frame + block_frames, frame_count)
+        block = np.asarray(samples[first_frame * frame_samples:last_frame * frame_samples], dtype=np.float32)
+        if block.ndim > 1:
+            block = block.mean(axis=1)
+        power = np.square(block / 32768.0).reshape(-1, frame_samples).mean(axis=1)
+        levels[first_frame:last_frame] = 10 * np.log10(power + 1e-12)
+    return levels
+
+def _runs(mask):
+    """[start, end) frame index pairs of the True runs in a boolean array"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.view(np.int8), [0]))))
+    return edges.reshape(-1, 2)
+
+class SpeechMap:
+    """Speech regions of an episode and the compacted timeline transcription runs on.
+
+    regions are sorted, non-overlapping (start, end) pairs in seconds. The
+    compacted audio holds the regions back to back with gap_s of silence
+    between them; to_original maps a compacted time back onto the episode,
+    snapping times inside an inserted gap to the end of the region before it.
+    """
+
+    def __init__(self, regions: list, total_s: float, gap_s: float = VAD_GAP_SECONDS, threshold_db=None):
+        self.regions = [(float(start), float(end)) for start, end in regions]
+        self.total_s = total_s
+        self.gap_s = gap_s
+        self.threshold_db = threshold_db
+        self.compact_starts = []
+        compact_time = 0.0
+        for start, end in self.regions:
+            self.compact_starts.append(compact_time)
+            compact_time += end - start + gap_s
+
+    @classmethod
+    def whole(cls, total_s: float):
+        return cls([(0.0, total_s)] if total_s > 0 else [], total_s, gap_s=0.0)
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data["regions"], data["total_seconds"], data["gap_seconds"], data.get("threshold_db"))
+
+    def to_dict(self):
+        return {
+            "regions": [[round(start, 3), round(end, 3)] for start, end in self.regions],
+            "speech_seconds": round(self.speech_s, 3),
+            "total_seconds": round(self.total_s, 3),
+            "gap_seconds": self.gap_s,
+            "threshold_db": None if self.threshold_db is None else round(float(self.threshold_db), 1),
+        }
+
+    @property
+    def speech_s(self):
+        return sum(end - start for start, end in self.regions)
+
+    def to_original(self, compact_time: float):
+        index = bisect.bisect_right(self.compact_starts, compact_time) - 1
+        if index < 0:
+            return self.regions[0][0] if self.regions else 0.0
+        start, end = self.regions[index]
+        return min(start + compact_time - self.compact_starts[index], end)
+
+    def remap_segment(self, segment: dict):
+        """Move a compacted-timeline segment (and its words) onto the episode timeline"""
+        remapped = dict(segment)
+        for key in ("start", "end"):
+            if remapped.get(key) is not None:
+                remapped[key] = self.to_original(remapped[key])
+        if segment.get("words"):
+            remapped["words"] = []
+            for word in segment["words"]:
+                word = dict(word)
+                for key in ("start", "end"):
+                    if word.get(key) is not None:
+                        word[key] = self.to_original(word[key])
+                remapped["words"].append(word)
+        return remapped
+
+    def speech_ratio(self, start_time: float, end_time: float):
+        """Fraction of [start_time, end_time) covered by speech"""
+        if end_time <= start_time:
+            return 0.0
+        covered = sum(max(0.0, min(end, end_time) - max(start, start_time)) for start, end in self.regions)
+        return covered / (end_time - start_time)
+
+    def write_compacted(self, audio_path, output_path):
+        """Write the speech regions of a PCM WAV back to back, gap_s of silence apart, without decoding"""
+        samples, sample_rate = open_wav_samples(audio_path)
+        channels = 1 if samples.ndim == 1 else samples.shape[1]
+        gap = np.zeros((int(round(self.gap_s * sample_rate)),) + samples.shape[1:], dtype="<i2").tobytes()
+        with wave.open(str(output_path), "wb") as wav_file:
+            wav_file.setnchannels(channels)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(sample_rate)
+            for start, end in self.regions:
+                first_sample, last_sample = int(round(start * sample_rate)), int(round(end * sample_rate))
+                wav_file.writeframes(np.ascontiguousarray(samples[first_sample:last_sample]).tobytes())
+                wav_file.writeframes(gap)
+        return output_path
+
+def detect_speech_regions(audio_path, frame_s: float = VAD_FRAME_SECONDS, margin_db: float = VAD_MARGIN_DB,
+                          silence_db: float = VAD_SILENCE_DB, min_speech_s: float = VAD_MIN_SPEECH_SECONDS,
+                          min_silence_s: float = VAD_MIN_SILENCE_SECONDS, pad_s: float = VAD_PAD_SECONDS):
+    """Energy-based speech map of a 16-bit WAV.
+
+    Frames louder than the noise floor (10th percentile level of the frames
+    above silence_db) plus margin_db count as active. Pauses shorter than min_silence_s are
+    bridged, bursts shorter than min_speech_s dropped, and regions padded by
+    pad_s. This only finds dead air: music beds at speech level stay in. When
+    the audible frames span less than margin_db, all of them count as active.
+    """
+    samples, sample_rate = open_wav_samples(audio_path)
+    total_s = len(samples) / sample_rate if sample_rate else 0.0
+    levels = frame_energy_db(samples, sample_rate, frame_s)
+    if len(levels) == 0:
+        return SpeechMap.whole(total_s)
+
+    # Digital silence would drag the floor estimate below any real room noise
+    audible = levels[levels > silence_db]
+    if len(audible) == 0:
+        return SpeechMap([], total_s, threshold_db=silence_db)
+    floor_db, loud_db = np.percentile(audible, [10, 95])
+    # Without a quieter floor among the audible frames, everything audible counts as speech
+    threshold_db = floor_db + margin_db if loud_db - floor_db >= margin_db else silence_db
+
+    active = levels > threshold_db
+    # Bridge short pauses between active frames, then drop what is still too short to be speech
+    pauses = _runs(~active)
+    pauses = pauses[(pauses[:, 0] > 0) & (pauses[:, 1] < len(active)) & ((pauses[:, 1] - pauses[:, 0]) < min_silence_s / frame_s)]
+    bridged = np.zeros(len(active) + 1, dtype=np.int32)
+    np.add.at(bridged, pauses[:, 0], 1)
+    np.add.at(bridged, pauses[:, 1], -1)
+    active |= np.cumsum(bridged[:-1]) > 0
+    runs = _runs(active)
+    runs = runs[(runs[:, 1] - runs[:, 0]) >= min_speech_s / frame_s]
+
+    regions = []
+    for start, end in runs:
+        start_s, end_s = max(start * frame_s - pad_s, 0.0), min(end * frame_s + pad_s, total_s)
+        if regions and start_s <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end_s)
+        else:
+            regions.append((start_s, end_s))
+    return SpeechMap(regions, total_s, threshold_db=threshold_db)
+
+def _shift_segment(segment: dict, offset: float):
+    """Move a window-relative segment (and its words) onto the episode timeline"""
+    shifted = dict(segment)
+    for key in ("start", "end"):
+        if shifted.get(key) is not None:
+            shifted[key] = shifted[key] + offset
+    if segment.get("words"):
+        shifted["words"] = []
+        for word in segment["words"]:
+            word = dict(word)
+            for key in ("start", "end"):
+                if word.get(key) is not None:
+                    word[key] = word[key] + offset
+            shifted["words"].append(word)
+    return shifted
+
+def _owned_part(segment: dict, own_start: float, own_end: float):
+    """Trim a segment to the words whose midpoint lies in [own_start, own_end).
+
+    Each point of the overlap between two windows is owned by exactly one of
+    them, so stitched windows never repeat words.
+    """
+    words = segment.get("words") or []
+    timed_words = [word for word in words if word.get("start") is not None and word.get("end") is not None]
+    if not timed_words:
+        if segment.get("start") is None or segment.get("end") is None:
+            return None
+        midpoint = (segment["start"] + segment["end"]) / 2
+        return segment if own_start <= midpoint < own_end else None
+
+    # Untimed words (numbers, symbols) follow the nearest timed word before them
+    owned_words = []
+    owned = own_start <= (timed_words[0]["start"] + timed_words[0]["end"]) / 2 < own_end
+    for word in words:
+        if word.get("start") is not None and word.get("end") is not None:
+            owned = own_start <= (word["start"] + word["end"]) / 2 < own_end
+        if owned:
+            owned_words.append(word)
+
+    if not owned_words:
+        return None
+    if len(owned_words) == len(words):
+        return segment
+
+    trimmed = dict(segment)
+    trimmed["words"] = owned_words
+    timed_owned = [word for word in owned_words if word.get("start") is not None and word.get("end") is not None]
+    trimmed["start"] = timed_owned[0]["start"] if timed_owned else segment["start"]
+    trimmed["end"] = timed_owned[-1]["end"] if timed_owned else segment["end"]
+    trimmed["text"] = " ".join(word.get("word", "").strip() for word in owned_words)
+    return trimmed
+
+class TranscriptionBackend(abc.ABC):
+    """Speech-to-text model used by transcribe_chunked.
+
+    A backend loads its models in load(), turns one float32 16 kHz window into
+    whisperx-style segments with transcribe(), and refines word timings with
+    align() when it aligns. profile declares the speed/accuracy trade-off so
+    callers can send short or low-priority work to cheaper workers:
+    realtime_factor is approximate audio seconds per wall second on the
+    backend's reference hardware, and accuracy is a rough rank against
+    large-v2 with wav2vec2 alignment.
+    """
+
+    name = "base"
+    device = "cpu"
+    aligns = False
+
+    def load(self):
+        pass
+
+    @abc.abstractmethod
+    def transcribe(self, audio):
+        """whisperx-style segments for one float32 16 kHz window"""
+
+    def align(self, segments: list, audio):
+        return segments
+
+    def hold(self):
+        """Context manager held around each window's transcribe and align calls"""
+        return contextlib.nullcontext()
+
+    @property
+    def profile(self):
+        return {}
+
+    @abc.abstractmethod
+    def cache_settings(self):
+        """Everything that changes the transcript, for the transcript cache key"""
+
+    def describe(self):
+        return {"backend": self.name, "device": self.device, **self.cache_settings(), **self.profile}
+
+class WhisperXBackend(TranscriptionBackend):
+    """WhisperX batched inference plus wav2vec2 alignment; the production GPU path"""
+
+    name = "whisperx"
+
+    def __init__(self, model_name: str = WHISPER_MODEL, device: str = "cuda", compute_type: str = "float16",
+                 batch_size: int = 16, align: bool = True):
+        self.model_name = model_name
+        self.device = device
+        self.compute_type = compute_type
+        self.batch_size = batch_size
+        self.aligns = align
+
+    def load(self):
+        import whisperx
+
+        self.model = whisperx.load_model(self.model_name, device=self.device, compute_type=self.compute_type)
+        if self.aligns:
+            self.alignment_model, self.metadata = whisperx.load_align_model(language_code=TRANSCRIPT_LANGUAGE, device=self.device)
+
+    def transcribe(self, audio):
+        return self.model.transcribe(audio, batch_size=self.batch_size)["segments"]
+
+    def align(self, segments: list, audio):
+        if not self.aligns:
+            return segments
+        import whisperx
+
+        return whisperx.align(segments, self.alignment_model, self.metadata, audio,
+                              device=self.device, return_char_alignments=False)["segments"]
+
+    @property
+    def profile(self):
+        return {"realtime_factor": 70 if self.device == "cuda" else 2, "accuracy": "highest",
+                "word_timing": "wav2vec2 alignment" if self.aligns else "none", "needs_gpu": self.device == "cuda"}
+
+    def cache_settings(self):
+        # Same fields as before backends existed, so earlier cache entries stay valid
+        return {"model": self.model_name, "compute_type": self.compute_type, "language": TRANSCRIPT_LANGUAGE,
+                "batch_size": self.batch_size, "align": self.aligns, "return_char_alignments": False}
+
+class FasterWhisperBackend(TranscriptionBackend):
+    """faster-whisper (CTranslate2) on CPU with int8 weights, for GPU-less workers.
+
+    batch_size=1 (the default) decodes sequentially with faster-whisper's own
+    VAD filter and cross-attention word timestamps, which need no alignment
+    model. batch_size > 1 decodes VAD-cut chunks in batches through whisperx's
+    batched CTranslate2 pipeline (the pinned faster-whisper 1.0 has no batched
+    API of its own); segments then carry no word timings unless align=True,
+    so captions and clip-edge snapping fall back to segment timings.
+    """
+
+    name = "faster-whisper"
+
+    # Approximate realtime factor with int8 on 8 cores, and accuracy rank per model size
+    MODEL_PROFILES = {
+        "tiny": (32, "low"), "base": (18, "low"), "small": (8, "medium"),
+        "medium": (3.5, "high"), "large-v2": (1.9, "highest"), "large-v3": (1.9, "highest"),
+    }
+
+    def __init__(self, model_size: str = "small", threads: int = 0, batch_size: int = 1,
+                 compute_type: str = "int8", beam_size: int = 1, align: bool = False):
+        if model_size not in self.MODEL_PROFILES:
+            raise ValueError(f"Unknown faster-whisper model size: {model_size}")
+        self.model_size = model_size
+        self.threads = threads or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.compute_type = compute_type
+        self.beam_size = beam_size
+        self.aligns = align
+
+    def load(self):
+        import whisperx
+
+        if self.batch_size > 1:
+            self.model = whisperx.load_model(self.model_size, device="cpu", compute_type=self.compute_type,
+                                             language=TRANSCRIPT_LANGUAGE, threads=self.threads)
+        else:
+            from faster_whisper import WhisperModel
+            self.model = WhisperModel(self.model_size, device="cpu", compute_type=self.compute_type, cpu_threads=self.threads)
+        if self.aligns:
+            self.alignment_model, self.metadata = whisperx.load_align_model(language_code=TRANSCRIPT_LANGUAGE, device="cpu")
+
+    def transcribe(self, audio):
+        if self.batch_size > 1:
+            return self.model.transcribe(audio, batch_size=self.batch_size)["segments"]
+
+        segments, _ = self.model.transcribe(audio, language=TRANSCRIPT_LANGUAGE, beam_size=self.beam_size,
+                                            vad_filter=True, word_timestamps=not self.aligns)
+        return [{
+            "start": segment.start,
+            "end": segment.end,
+            "text": segment.text,
+            **({"words": [{"word": word.word.strip(), "start": word.start, "end": word.end, "score": word.probability}
+                          for word in segment.words]} if segment.words else {})
+        } for segment in segments]
+
+    def align(self, segments: list, audio):
+        if not self.aligns:
+            return segments
+        import whisperx
+
+        return whisperx.align(segments, self.alignment_model, self.metadata, audio,
+                              device="cpu", return_char_alignments=False)["segments"]
+
+    @property
+    def profile(self):
+        realtime_factor, accuracy = self.MODEL_PROFILES[self.model_size]
+        return {"realtime_factor": round(realtime_factor * min(self.threads, 8) / 8, 1), "accuracy": accuracy,
+                "word_timing": "wav2vec2 alignment" if self.aligns else ("segment only" if self.batch_size > 1 else "cross-attention"),
+                "needs_gpu": False}
+
+    def cache_settings(self):
+        return {"backend": self.name, "model": self.model_size, "compute_type": self.compute_type, "language": TRANSCRIPT_LANGUAGE,
+                "batch_size": self.batch_size, "beam_size": self.beam_size, "align": self.aligns}
+
+TRANSCRIPTION_BACKENDS = {"whisperx": WhisperXBackend, "faster-whisper": FasterWhisperBackend}
+
+def get_transcription_backend(name: str | None = None):
+    """Backend named by name or TRANSCRIBE_BACKEND, configured from the CPU_TRANSCRIBE_* / TRANSCRIBE_* environment"""
+    name = name or os.environ.get("TRANSCRIBE_BACKEND", "whisperx")
+    if name == "whisperx":
+        return WhisperXBackend()
+    if name == "faster-whisper":
+        backend = FasterWhisperBackend(
+            model_size=os.environ.get("CPU_TRANSCRIBE_MODEL", "small"),
+            threads=int(os.environ.get("TRANSCRIBE_THREADS", 0)),
+            batch_size=int(os.environ.get("TRANSCRIBE_BATCH_SIZE", 1)),
+            align=os.environ.get("TRANSCRIBE_ALIGN", "0") == "1"
+        )
+        if backend.profile["word_timing"] == "segment only":
+            print("WARNING: batched faster-whisper without TRANSCRIBE_ALIGN=1 has no word timings; "
+                  "captions are spread across segments and clip edges are not snapped to words")
+        return backend
+    raise ValueError(f"Unknown transcription backend {name!r}; expected one of {sorted(TRANSCRIPTION_BACKENDS)}")
+
+class StageGate:
+    """Lets at most `slots` jobs of a container run one stage at a time.
+
+    The GPU transcriber holds a single model that is not safe to share across
+    threads, so concurrent jobs take turns per window while their downloads,
+    model calls and renders overlap. Time spent waiting is recorded as a
+    `<name>_wait` stage and busy_s accumulates time the stage was held.
+    """
+
+    def __init__(self, name: str, slots: int = 1):
+        self.name = name
+        self._semaphore = threading.BoundedSemaphore(slots)
+        self._lock = threading.Lock()
+        self.busy_s = 0.0
+
+    @contextlib.contextmanager
+    def hold(self):
+        with stage_span(f"{self.name}_wait"):
+            self._semaphore.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.busy_s += time.perf_counter() - start
+            self._semaphore.release()
+
+class GatedBackend(TranscriptionBackend):
+    """A TranscriptionBackend shared by concurrent jobs, which take turns through a StageGate.
+
+    hold() takes the turn; transcribe_chunked holds it for one window's
+    transcribe and align calls, which must not run outside a turn.
+    """
+
+    def __init__(self, backend: TranscriptionBackend, gate: StageGate):
+        self.backend = backend
+        self.gate = gate
+        self.name = backend.name
+        self.device = backend.device
+        self.aligns = backend.aligns
+
+    def load(self):
+        self.backend.load()
+
+    def transcribe(self, audio):
+        return self.backend.transcribe(audio)
+
+    def align(self, segments: list, audio):
+        return self.backend.align(segments, audio)
+
+    def hold(self):
+        return self.gate.hold()
+
+    @property
+    def profile(self):
+        return self.backend.profile
+
+    def cache_settings(self):
+        return self.backend.cache_settings()
+
+def transcribe_chunked(backend: TranscriptionBackend, audio_path, window_s: float = TRANSCRIBE_WINDOW_SECONDS,
+                       overlap_s: float = TRANSCRIBE_OVERLAP_SECONDS):
+    """Transcribe and align audio.wav in overlapping windows, yielding segments window by window.
+
+    Only one window of float32 audio is held in memory at a time. Timestamps are
+    shifted onto the episode timeline and each window keeps the words whose
+    midpoint falls in its half of the overlaps. Audio shorter than one window is
+    transcribed in a single pass, exactly like whole-file mode. backend is any
+    loaded TranscriptionBackend, so this runs the same on GPU and CPU workers.
+    """
+    # Checked here rather than in the generator so a bad configuration fails at the call
+    if overlap_s >= window_s:
+        raise ValueError(f"overlap_s ({overlap_s}) must be shorter than window_s ({window_s})")
+    return _transcribe_windows(backend, audio_path, window_s, overlap_s)
+
+def _transcribe_windows(backend: TranscriptionBackend, audio_path, window_s: float, overlap_s: float):
+    samples, sample_rate = open_wav_samples(audio_path)
+    total_samples = len(samples)
+    window_samples = int(window_s * sample_rate)
+    step_samples = int((window_s - overlap_s) * sample_rate)
+
+    window_start = 0
+    while True:
+        window_end = min(window_start + window_samples, total_samples)
+        is_first = window_start == 0
+        is_last = window_end >= total_samples
+
+        audio = np.asarray(samples[window_start:window_end], dtype=np.float32) / 32768.0
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+
+        offset = window_start / sample_rate
+        # The turn is taken outside the spans so queueing is reported only as its own wait stage
+        with backend.hold():
+            with stage_span("transcribe", window_start_s=round(offset, 1), backend=backend.name) as span:
+                segments = backend.transcribe(audio)
+                span["bytes_in"] = audio.nbytes
+            if backend.aligns:
+                with stage_span("align", window_start_s=round(offset, 1), backend=backend.name):
+                    segments = backend.align(segments, audio)
+
+        own_start = 0.0 if is_first else offset + overlap_s / 2
+        own_end = float("inf") if is_last else window_end / sample_rate - overlap_s / 2
+        print(f"Transcribed window {offset:.0f}s-{window_end / sample_rate:.0f}s ({len(segments)} segments)")
+
+        for segment in segments:
+            owned = _owned_part(_shift_segment(segment, offset), own_start, own_end)
+            if owned is not None:
+                yield owned
+
+        if is_last:
+            break
+        window_start += step_samples
+
+class DiskLRUCache:
+    """Directory of cache entries evicted least-recently-used first once max_bytes is exceeded.
+
+    Entry recency is tracked through file mtimes, so the cache survives
+    container restarts when the directory lives on a mounted volume.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, suffix: str = ""):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, key: str):
+        return self.cache_dir / f"{key}{self.suffix}"
+
+    def touch(self, path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def lookup(self, key: str):
+        """Return the entry path for key (marking it recently used) or None"""
+        path = self.path_for(key)
+        if not path.exists():
+            return None
+        self.touch(path)
+        return path
+
+    def entries(self):
+        return [path for path in self.cache_dir.iterdir() if path.name.endswith(self.suffix) and not path.name.startswith(".")]
+
+    def entry_size(self, path):
+        if path.is_dir():
+            return sum(child.stat().st_size for child in path.rglob("*") if child.is_file())
+        return path.stat().st_size
+
+    def evict(self, min_idle_s: float = 0.0):
+        """Drop least-recently-used entries until the cache fits in max_bytes, keeping any used within min_idle_s"""
+        entries = []
+        for path in self.entries():
+            try:
+                entries.append((path.stat().st_mtime, self.entry_size(path), path))
+            except OSError:
+                continue
+
+        total_bytes = sum(size for _, size, _ in entries)
+        idle_before = time.time() - min_idle_s
+        for mtime, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total_bytes <= self.max_bytes or mtime > idle_before:
+                break
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+            total_bytes -= size
+            print(f"Evicted cache entry: {path.name}")
+
+class TranscriptCache(DiskLRUCache):
+    """Aligned transcripts keyed by a hash of the 16 kHz audio plus model settings.
+
+    Segments are stored as gzipped compact JSON arrays,
+    [start, end, text, [[word, start, end, score], ...]], and expanded back
+    into the dicts whisperx returns on read. The speech map the transcript was
+    made from is stored alongside it.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        super().__init__(cache_dir, max_bytes, suffix=".json.gz")
+
+    @staticmethod
+    def make_key(audio_path, **settings):
+        digest = hashlib.sha256()
+        with open(audio_path, "rb") as audio_file:
+            for chunk in iter(lambda: audio_file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        digest.update(json.dumps(settings, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        path = self.lookup(key)
+        if path is None:
+            return None
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as cache_file:
+                packed = json.load(cache_file)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable transcript cache entry {path}: {e}")
+            return None
+
+        segments = []
+        for start, end, text, words in packed["segments"]:
+            segment = {"start": start, "end": end, "text": text}
+            if words:
+                segment["words"] = [{"word": word, "start": word_start, "end": word_end, "score": score}
+                                    for word, word_start, word_end, score in words]
+            segments.append(segment)
+        transcript = {"segments": segments}
+        if packed.get("speech_map") is not None:
+            transcript["speech_map"] = packed["speech_map"]
+        return transcript
+
+    def put(self, key: str, transcript: dict):
+        packed = {"segments": [
+            [segment.get("start"), segment.get("end"), segment.get("text", ""),
+             [[word.get("word", ""), word.get("start"), word.get("end"), word.get("score")]
+              for word in segment.get("words") or []]]
+            for segment in transcript.get("segments", [])
+        ], "speech_map": transcript.get("speech_map")}
+
+        path = self.path_for(key)
+        temp_path = self.cache_dir / f".{key}.{uuid.uuid4().hex}.tmp"
+        with gzip.open(temp_path, "wt", encoding="utf-8") as cache_file:
+            json.dump(packed, cache_file, separators=(",", ":"))
+        os.replace(temp_path, path)
+        self.evict()
+
+def source_fingerprint(s3_client, s3_key: str):
+    """Identity of an S3 source from its ETag and size, so renders can be reused without downloading it"""
+    head = s3_client.head_object(Bucket=S3_BUCKET, Key=s3_key)
+    identity = f"{S3_BUCKET}/{s3_key}:{head['ETag']}:{head['ContentLength']}"
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+class RenderCache(DiskLRUCache):
+    """Reusable render intermediates, so edits only redo what they change.
+
+    Clips are rendered from fixed RENDER_CHUNK_SECONDS chunks aligned to source
+    time, each starting on an IDR frame, stored at two levels:
+
+    - vertical chunks: reframed 9:16 video without subtitles, keyed by source,
+      framing and encoder settings. A trim only renders chunks it newly covers.
+    - subtitled chunks: a vertical chunk with the subtitle lines that overlap
+      it burned in, keyed by those lines and the style. A subtitle edit only
+      re-encodes the chunks whose lines changed.
+
+    The source's audio and probe info are kept as entries too, so a clip whose
+    chunks are all cached is assembled without the source. Every chunk and
+    sidecar is its own entry, evicted least-recently-used.
+    """
+
+    # Shared by every RenderCache in the process, since concurrent jobs each open their own
+    _evict_lock = threading.Lock()
+
+    def __init__(self, cache_dir: str, max_bytes: int, chunk_seconds: float = 2.0):
+        super().__init__(cache_dir, max_bytes)
+        self.chunk_seconds = chunk_seconds
+
+    def evict(self, min_idle_s: float = RENDER_CACHE_MIN_IDLE_SECONDS):
+        """Evict once per job, after its renders; entries still in use by other renders are kept"""
+        with self._evict_lock:
+            super().evict(min_idle_s)
+
+    @staticmethod
+    def make_key(**parts):
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+    def store(self, temp_path, key: str):
+        path = self.path_for(key)
+        os.replace(temp_path, path)
+        return path
+
+    def temp_dir(self):
+        path = self.cache_dir / f".render-{uuid.uuid4().hex}"
+        path.mkdir()
+        return path
+
+    def chunk_start_frame(self, chunk: int, fps: float):
+        return math.ceil(chunk * self.chunk_seconds * fps - 1e-3)
+
+    def chunk_of_frame(self, frame: int, fps: float):
+        chunk = int(frame / fps // self.chunk_seconds)
+        while self.chunk_start_frame(chunk + 1, fps) <= frame:
+            chunk += 1
+        while chunk > 0 and self.chunk_start_frame(chunk, fps) > frame:
+            chunk -= 1
+        return chunk
+
+    def source_info(self, source_id: str, fetch_source):
+        key = f"{source_id}-info.json"
+        path = self.lookup(key)
+        if path is not None:
+            return json.loads(path.read_text())
+        info = probe_video_codec(fetch_source())
+        temp_path = self.cache_dir / f".{key}.{uuid.uuid4().hex}.tmp"
+        temp_path.write_text(json.dumps(info))
+        self.store(temp_path, key)
+        return info
+
+    def source_audio(self, source_id: str, fetch_source):
+        """Source audio stream copied into its own entry, or None if it fails"""
+        key = f"{source_id}-audio.mka"
+        path = self.lookup(key)
+        if path is not None:
+            return path
+        temp_path = self.cache_dir / f".{key}.{uuid.uuid4().hex}.mka"
+        result = run_command(f"ffmpeg -y -i {fetch_source()} -map 0:a:0 -vn -c:a copy {temp_path}")
+        if result.returncode != 0:
+            temp_path.unlink(missing_ok=True)
+            print(f"Caching source audio failed: {result.stderr}")
+            return None
+        return self.store(temp_path, key)
+
+    def vertical_chunks(self, vertical_key: str, fetch_source, chunks: range, fps: float, video_filter: str, encoder,
+                        clip_start: float = 0.0):
+        """Paths of the vertical chunks, rendering missing runs with one encode each; returns (paths, rendered).
+
+        Render progress is reported relative to clip_start, the clip's start in the source.
+        """
+        paths = {chunk: self.lookup(f"{vertical_key}-{chunk:06d}.ts") for chunk in chunks}
+        missing = [chunk for chunk in chunks if paths[chunk] is None]
+
+        # Consecutive missing chunks are encoded in one pass and split by the segment muxer
+        runs = []
+        for chunk in missing:
+            if runs and runs[-1][-1] == chunk - 1:
+                runs[-1].append(chunk)
+            else:
+                runs.append([chunk])
+
+        for run in runs:
+            first_frame = self.chunk_start_frame(run[0], fps)
+            boundaries = [self.chunk_start_frame(chunk, fps) - first_frame for chunk in run[1:] + [run[-1] + 1]]
+            work_dir = self.temp_dir()
+            try:
+                force_key_frames = "+".join(f"eq(n,{frame})" for frame in [0] + boundaries[:-1])
+                chunk_command = (f"ffmpeg -y -ss {max(0.0, (first_frame - 0.5) / fps)} -i {fetch_source()} "
+                                   f"-frames:v {boundaries[-1]} -map 0:v:0 -vf \"setpts=PTS-STARTPTS,{video_filter}\" "
+                                   f"-force_key_frames \"expr:{force_key_frames}\" {encoder.output_args()} "
+                                   f"{'-forced-idr 1 ' if encoder.is_gpu else ''}"
+                                   f"-f segment -segment_format mpegts -reset_timestamps 1 "
+                                   f"{'-segment_frames ' + ','.join(map(str, boundaries[:-1])) + ' ' if len(run) > 1 else ''}"
+                                   f"{work_dir}/chunk_%06d.ts")
+                result = run_command(chunk_command, progress_offset=first_frame / fps - clip_start)
+                rendered = sorted(work_dir.glob("chunk_*.ts"))
+                if result.returncode != 0 or len(rendered) != len(run):
+                    raise RuntimeError(f"Vertical chunk render failed ({len(rendered)}/{len(run)} chunks): {result.stderr}")
+                for chunk, chunk_path in zip(run, rendered):
+                    paths[chunk] = self.store(chunk_path, f"{vertical_key}-{chunk:06d}.ts")
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        return [paths[chunk] for chunk in chunks], len(missing)
+
+    def subtitled_chunk(self, vertical_path, lines: list, style, encoder):
+        """vertical_path with lines (times relative to the chunk) burned in; returns (path, rendered)"""
+        if not lines:
+            return vertical_path, False
+        key = self.make_key(vertical=vertical_path.name, lines=lines, style=style, codec=encoder.codec, tier=encoder.tier)
+        path = self.lookup(f"{key}.ts")
+        if path is not None:
+            return path, False
+
+        work_dir = self.temp_dir()
+        try:
+            subtitle_path = work_dir / "subtitles.ass"
+            write_subtitle_file(lines, str(subtitle_path), style)
+            output_path = work_dir / "chunk.ts"
+            result = run_command(f"ffmpeg -y -i {vertical_path} -map 0:v:0 -vf \"ass={subtitle_path}\" "
+                                 f"{encoder.output_args()} -f mpegts {output_path}")
+            if result.returncode != 0:
+                raise RuntimeError(f"Subtitle chunk render failed: {result.stderr}")
+            return self.store(output_path, f"{key}.ts"), True
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+def chunk_subtitle_lines(subtitles: list, chunk_start: float, chunk_end: float):
+    """Absolute (start, end, text) lines overlapping a chunk, shifted to chunk time and rounded to the ms"""
+    return [[round(max(0.0, start - chunk_start), 3), round(end - chunk_start, 3), text]
+            for start, end, text in subtitles if end > chunk_start and start < chunk_end]
+
+def render_clip_cached(render_cache: RenderCache, source_id: str, fetch_source, start_time: float, end_time: float,
+                       subtitles: list, output_path, framing: str = "pad", style: dict | None = None, encoder=None):
+    """Render a subtitled 9:16 clip from cached chunks, rendering only what the cache lacks.
+
+    subtitles are (start, end, text) lines relative to start_time, as built by
+    build_subtitle_groups. fetch_source() returns a local path to the source
+    video and is only called when something has to be rendered from it.
+    Chunks fully inside the clip are stream copied; the partial chunks at the
+    edges are re-encoded on every render. Returns render stats, or None if
+    the render failed.
+    """
+    output_path = pathlib.Path(output_path)
+    absolute_subtitles = [(start + start_time, end + start_time, text) for start, end, text in subtitles]
+    stats = {"chunks": 0, "chunks_rendered": 0, "subtitle_chunks_rendered": 0, "edges_rendered": 0}
+    work_dir = None
+    try:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        encoder = encoder or get_video_encoder()
+        video_filter = VERTICAL_FILTERS[framing]
+        vertical_key = RenderCache.make_key(source=source_id, filter=video_filter, codec=encoder.codec, tier=encoder.tier,
+                                            chunk_seconds=render_cache.chunk_seconds)
+        work_dir = render_cache.temp_dir()
+        with stage_span("cached_render", codec=encoder.codec) as span:
+            info = render_cache.source_info(source_id, fetch_source)
+            fps = info["fps"]
+            if not fps:
+                raise RuntimeError("Source frame rate unknown")
+            first_frame = math.ceil(start_time * fps - 1e-3)
+            end_frame = math.ceil(end_time * fps - 1e-3)
+            chunks = range(render_cache.chunk_of_frame(first_frame, fps), render_cache.chunk_of_frame(end_frame - 1, fps) + 1)
+            vertical_paths, stats["chunks_rendered"] = render_cache.vertical_chunks(
+                vertical_key, fetch_source, chunks, fps, video_filter, encoder, clip_start=start_time)
+            stats["chunks"] = len(chunks)
+
+            parts = []
+            for chunk, vertical_path in zip(chunks, vertical_paths):
+                chunk_first = render_cache.chunk_start_frame(chunk, fps)
+                chunk_end = render_cache.chunk_start_frame(chunk + 1, fps)
+                part_first, part_end = max(first_frame, chunk_first), min(end_frame, chunk_end)
+                lines = chunk_subtitle_lines(absolute_subtitles, part_first / fps, part_end / fps)
+                if part_first == chunk_first and part_end == chunk_end:
+                    subtitled_path, rendered = render_cache.subtitled_chunk(vertical_path, lines, style, encoder)
+                    stats["subtitle_chunks_rendered"] += rendered
+                    parts.append(subtitled_path)
                     continue
-                
-                # Check for overlaps with already validated clips
-                overlaps = False
-                for validated in validated_clips:
-                    if not (clip["end"] <= validated["start"] or clip["start"] >= validated["end"]):
-                        print(f"Skipping overlapping clip: {clip.get('hook')}")
-                        overlaps = True
-                        break
-                
-                if not overlaps:
-                    validated_clips.append(clip)
-                    print(f"✓ Validated clip: {clip.get('hook')} ({duration:.1f}s, score: {clip.get('virality_score', 'N/A')})")
-            
-            # Sort by virality score
-            validated_clips.sort(key=lambda x: x.get("virality_score", 0), reverse=True)
+
+                # Clip edge inside the chunk: trim it exactly and burn its lines in one encode.
+                # Chunks are short and MPEG-TS seeks are inexact, so it is decoded from its start.
+                part_path = work_dir / f"edge_{chunk}.ts"
+                edge_filter = f"trim=start_frame={part_first - chunk_first}:end_frame={part_end - chunk_first},setpts=PTS-STARTPTS"
+                if lines:
+                    subtitle_path = work_dir / f"edge_{chunk}.ass"
+                    write_subtitle_file(lines, str(subtitle_path), style)
+                    edge_filter += f",ass={subtitle_path}"
+                result = run_command(f"ffmpeg -y -i {vertical_path} -map 0:v:0 -vf \"{edge_filter}\" "
+                                     f"{encoder.output_args()} -f mpegts {part_path}")
+                if result.returncode != 0:
+                    raise RuntimeError(f"Edge chunk render failed: {result.stderr}")
+                stats["edges_rendered"] += 1
+                parts.append(part_path)
+
+            audio_input = audio_map = ""
+            if info["has_audio"]:
+                audio_path = render_cache.source_audio(source_id, fetch_source)
+                if audio_path:
+                    audio_input = f"-ss {start_time} -t {end_time - start_time} -i {audio_path} "
+                    audio_map = "-map 1:a:0 "
+
+            concat_list = work_dir / "parts.txt"
+            concat_list.write_text("".join(f"file '{part}'\n" for part in parts))
+            result = run_command(f"ffmpeg -y -f concat -safe 0 -i {concat_list} {audio_input}-map 0:v:0 {audio_map}"
+                                 f"-c copy -movflags +faststart {output_path}", progress_offset=0.0)
+            if result.returncode != 0:
+                raise RuntimeError(f"Clip assembly failed: {result.stderr}")
+            span.update(stats)
+            span["bytes_out"] = file_size(output_path)
+    except Exception as e:
+        print(f"Cached render failed: {e}")
+        return None
+    finally:
+        if work_dir is not None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"Cached render {output_path}: {stats['chunks_rendered']}/{stats['chunks']} vertical chunks rendered, "
+          f"{stats['subtitle_chunks_rendered']} subtitle chunks, {stats['edges_rendered']} edges")
+    return stats
+
+JOB_PROGRESS_INTERVAL_SECONDS = 1.0
+
+def check_token(token: HTTPAuthorizationCredentials):
+    if token.credentials != os.environ["AUTH_TOKEN"]:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect bearer token", headers={"WWW-Authenticate": "Bearer"})
+
+class JobTracker:
+    """Publishes the state of one background job into a dict-like store.
+
+    The store is a modal.Dict in production and a plain dict for the local
+    queue. Records look like {"job_id", "s3_key", "status", "stage",
+    "stage_percent", "clips_done", "clips_total", "error", "result",
+    "submitted_at", "updated_at"}; status moves queued -> running ->
+    succeeded | failed.
+    """
+
+    def __init__(self, store, job_id: str, min_interval: float = JOB_PROGRESS_INTERVAL_SECONDS):
+        self.store = store
+        self.job_id = job_id
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._last_progress = None
+        self._last_write = 0.0
+
+    def update(self, **fields):
+        with self._lock:
+            record = dict(self.store.get(self.job_id) or {})
+            record.update(fields)
+            record["updated_at"] = time.time()
+            self.store[self.job_id] = record
+            self._last_write = time.monotonic()
+            return record
+
+    def progress(self, stage: str, percent: float = 0.0, **details):
+        """Record stage progress, throttling percent-only updates within one stage"""
+        now = time.monotonic()
+        if (stage, details) == self._last_progress and percent < 100 and now - self._last_write < self.min_interval:
+            return
+        self._last_progress = (stage, details)
+        self.update(status="running", stage=stage, stage_percent=round(float(percent), 1), **details)
+
+class RenderProgress:
+    """Render-stage progress of one job, in frames, shared by its clip render threads.
+
+    A clip counts as rendered up to the furthest output position any of its
+    render passes has reported, so the single-pass fused render advances with
+    every frame encoded and multi-pass fallbacks never move backwards.
+    Positions are converted to frames at the source frame rate, and
+    progress(stage, percent, **details) receives the percent of all frames.
+    """
+
+    def __init__(self, progress, clip_durations: list, fps: float):
+        self.progress = progress
+        self.fps = fps
+        self.clip_frames = [max(round(duration * fps), 1) for duration in clip_durations]
+        self.frames_done = [0] * len(self.clip_frames)
+        self.clips_done = 0
+        self._lock = threading.Lock()
+
+    def reporter(self, index: int):
+        """report_progress callback for clip index"""
+        return functools.partial(self.advance, index)
+
+    def advance(self, index: int, position_s: float):
+        with self._lock:
+            frames = min(max(round(position_s * self.fps), 0), self.clip_frames[index])
+            if frames > self.frames_done[index]:
+                self.frames_done[index] = frames
+                self._publish()
+
+    def finish(self, index: int):
+        """Count a clip as fully rendered, whether it succeeded or failed"""
+        with self._lock:
+            self.frames_done[index] = self.clip_frames[index]
+            self.clips_done += 1
+            self._publish()
+
+    def _publish(self):
+        self.progress("render", 100 * sum(self.frames_done) / max(sum(self.clip_frames), 1),
+                      clips_done=self.clips_done, clips_total=len(self.clip_frames))
+
+def available_memory_bytes():
+    """Memory this container can still use: the cgroup v2 limit minus usage, else MemAvailable, else None"""
+    try:
+        with open("/sys/fs/cgroup/memory.max") as limit_file, open("/sys/fs/cgroup/memory.current") as usage_file:
+            limit = limit_file.read().strip()
+            if limit != "max":
+                return max(int(limit) - int(usage_file.read().strip()), 0)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+class AdmissionController:
+    """Admits jobs into a container only while its disk and memory can hold them.
+
+    A job reserves disk_factor times its source size on work_dir (source,
+    audio and clip intermediates) plus job_memory_bytes of memory, and waits
+    until fewer than max_jobs are running and the reservations of all
+    running jobs plus its own fit the container's capacity. Capacity is the
+    free disk and memory measured while no job is running, because readings
+    taken mid-job already exclude what running jobs use. A job runs
+    regardless when nothing else is running, so one too large for the
+    container fails on its own instead of waiting forever.
+    """
+
+    def __init__(self, max_jobs: int = JOBS_PER_CONTAINER, work_dir: str = "/tmp", job_memory_bytes: int = JOB_MEMORY_BYTES,
+                 disk_factor: float = JOB_DISK_FACTOR, poll_s: float = 5.0, disk_free=None, memory_free=None):
+        self.max_jobs = max_jobs
+        self.job_memory_bytes = job_memory_bytes
+        self.disk_factor = disk_factor
+        self.poll_s = poll_s
+        self.disk_free = disk_free or (lambda: shutil.disk_usage(work_dir).free)
+        self.memory_free = memory_free or available_memory_bytes
+        self._condition = threading.Condition()
+        self._running = {}
+        self._measure_capacity()
+
+    def _measure_capacity(self):
+        self.disk_capacity = self.disk_free()
+        self.memory_capacity = self.memory_free()
+
+    def _fits(self, disk_bytes: int, memory_bytes: int):
+        if not self._running:
+            self._measure_capacity()
+            return True
+        if len(self._running) >= self.max_jobs:
+            return False
+        reserved_disk = sum(disk for disk, _ in self._running.values())
+        reserved_memory = sum(memory for _, memory in self._running.values())
+        if reserved_disk + disk_bytes > self.disk_capacity:
+            return False
+        return self.memory_capacity is None or reserved_memory + memory_bytes <= self.memory_capacity
+
+    def acquire(self, source_bytes: int, progress=None):
+        """Block until the job fits, then return its ticket for release()"""
+        disk_bytes = int(source_bytes * self.disk_factor)
+        ticket = uuid.uuid4().hex
+        wait_start = time.perf_counter()
+        with self._condition:
+            while not self._fits(disk_bytes, self.job_memory_bytes):
+                if progress:
+                    progress("admission", 0)
+                self._condition.wait(self.poll_s)
+            self._running[ticket] = (disk_bytes, self.job_memory_bytes)
+            running = len(self._running)
+        print(f"Admitted job after {time.perf_counter() - wait_start:.1f}s ({running} running, {disk_bytes / 1e9:.1f} GB disk reserved)")
+        return ticket
+
+    def release(self, ticket: str):
+        with self._condition:
+            self._running.pop(ticket, None)
+            self._condition.notify_all()
+
+    @property
+    def running(self):
+        with self._condition:
+            return len(self._running)
+
+def new_job_record(job_id: str, s3_key: str, callback_url=None):
+    now = time.time()
+    return {
+        "job_id": job_id,
+        "s3_key": s3_key,
+        "status": "queued",
+        "stage": "queued",
+        "stage_percent": 0.0,
+        "clips_done": 0,
+        "clips_total": 0,
+        "callback_url": callback_url,
+        "error": None,
+        "result": None,
+        "submitted_at": now,
+        "updated_at": now
+    }
+
+def post_job_callback(callback_url: str, payload: dict, timeout: float = 10.0):
+    """POST the finished job record to callback_url; failures are only logged"""
+    request = urllib.request.Request(
+        callback_url,
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            print(f"Job callback {callback_url} returned {response.status}")
+            return True
+    except (urllib.error.URLError, OSError) as e:
+        print(f"Job callback {callback_url} failed: {e}")
+        return False
+
+def execute_job(store, job_id: str, s3_key: str, runner, callback_url=None):
+    """Run runner(s3_key, progress) for a submitted job and record its outcome"""
+    tracker = JobTracker(store, job_id)
+    tracker.update(status="running", stage="starting", started_at=time.time())
+    try:
+        result = runner(s3_key, progress=tracker.progress)
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        print(f"Job {job_id} failed: {detail}")
+        record = tracker.update(status="failed", error=detail, finished_at=time.time())
+    else:
+        record = tracker.update(status="succeeded", stage="done", stage_percent=100.0, result=result, finished_at=time.time())
+
+    if callback_url:
+        post_job_callback(callback_url, {key: value for key, value in record.items() if key != "callback_url"})
+    return record
+
+class LocalJobQueue:
+    """In-process stand-in for the Modal job API, backed by a thread pool.
+
+    runner has the signature of AiPodcastClipper.run_pipeline, so tests can
+    drive submit/status/result with a stub pipeline and no GPU.
+    """
+
+    def __init__(self, runner, max_workers: int = 1):
+        self.runner = runner
+        self.store = {}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.futures = {}
+
+    def submit(self, s3_key: str, callback_url=None):
+        job_id = str(uuid.uuid4())
+        self.store[job_id] = new_job_record(job_id, s3_key, callback_url)
+        self.futures[job_id] = self.executor.submit(execute_job, self.store, job_id, s3_key, self.runner, callback_url)
+        return job_id
+
+    def status(self, job_id: str):
+        record = self.store.get(job_id)
+        if record is None:
+            return None
+        return {key: value for key, value in record.items() if key != "result"}
+
+    def result(self, job_id: str, timeout=None):
+        """Wait for the job to finish and return its record"""
+        self.futures[job_id].result(timeout=timeout)
+        return self.store[job_id]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+class ClipperPipeline:
+    """The clipping pipeline, independent of the worker hardware it runs on.
+
+    The Modal classes below subclass it and call setup() with their
+    transcription backend when the container starts. `benchmark.py
+    concurrency` runs it directly on CPU with a stub transcriber and an
+    OpenAI client pointed at a local stub server.
+    """
+
+    def setup(self, transcriber: TranscriptionBackend, max_jobs: int = JOBS_PER_CONTAINER, openai_client=None,
+              async_openai_client_factory=None):
+        # Concurrent jobs share the loaded model, one transcription window at a time
+        self.transcriber = GatedBackend(transcriber, StageGate("transcribe"))
+        self.transcriber.load()
+        print(f"Transcription backend: {self.transcriber.describe()}")
+        self.admission = AdmissionController(max_jobs)
+        self.transcript_cache = TranscriptCache(TRANSCRIPT_CACHE_DIR, TRANSCRIPT_CACHE_MAX_BYTES)
+        
+        # Replace Gemini with OpenAI for maximum reliability
+        # Clients can be injected, e.g. pointed at a local stub server for CPU-only benchmarks
+        from openai import AsyncOpenAI, OpenAI
+        self.openai_client = openai_client or OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+        # Each asyncio.run() gets its own async client: its connection pool is bound to that call's event loop
+        self.async_openai_client_factory = async_openai_client_factory or functools.partial(AsyncOpenAI, api_key=os.environ["OPENAI_API_KEY"])
+
+    async def identify_moments_windowed(self, segments_data: list):
+        async with self.async_openai_client_factory() as async_client:
+            return await identify_moments_windowed(async_client, segments_data)
+
+    def transcribe_video(self, base_dir: str, video_path: str) -> str:
+        base_dir_path = pathlib.Path(base_dir)
+        audio_path = base_dir_path / "audio.wav"
+
+        # The streaming download may already have extracted the audio
+        if audio_path.exists():
+            print(f"Using audio extracted during download: {audio_path}")
+        else:
+            probe_cmd = f"ffprobe -v quiet -select_streams a -show_entries stream=codec_type -of csv=p=0 {video_path}"
+            probe_result = run_command(probe_cmd)
+
+            if probe_result.returncode != 0 or not probe_result.stdout.strip():
+                duration_cmd = f"ffprobe -v quiet -show_entries format=duration -of csv=p=0 {video_path}"
+                duration_result = run_command(duration_cmd)
+                duration = float(duration_result.stdout.strip()) if duration_result.returncode == 0 else 0
+
+                extract_cmd = f"ffmpeg -f lavfi -i anullsrc=channel_layout=mono:sample_rate=16000 -t {duration} -acodec pcm_s16le -ar 16000 -ac 1 {audio_path}"
+            else:
+                extract_cmd = f"ffmpeg -i {video_path} -vn -acodec pcm_s16le -ar 16000 -ac 1 {audio_path}"
+
+            with stage_span("audio_extract") as span:
+                result = run_command(extract_cmd)
+                span["bytes_in"] = file_size(video_path)
+                span["bytes_out"] = file_size(audio_path)
+
+            if result.returncode != 0:
+                raise RuntimeError(f"Failed to extract audio: {result.stderr}")
+
+        if not audio_path.exists():
+            raise RuntimeError(f"Audio file was not created: {audio_path}")
+
+        vad_settings = {"mode": VAD_MODE}
+        if VAD_MODE == "energy":
+            vad_settings.update(frame_s=VAD_FRAME_SECONDS, margin_db=VAD_MARGIN_DB, silence_db=VAD_SILENCE_DB,
+                                min_speech_s=VAD_MIN_SPEECH_SECONDS, min_silence_s=VAD_MIN_SILENCE_SECONDS,
+                                pad_s=VAD_PAD_SECONDS, gap_s=VAD_GAP_SECONDS)
+        cache_key = TranscriptCache.make_key(
+            audio_path, **self.transcriber.cache_settings(),
+            window_s=TRANSCRIBE_WINDOW_SECONDS, overlap_s=TRANSCRIBE_OVERLAP_SECONDS, vad=vad_settings)
+        # Pick up transcripts other containers committed since this one started
+        try:
+            volume.reload()
+        except Exception as e:
+            print(f"Failed to reload the volume, using this container's view of the transcript cache: {e}")
+        cached_result = self.transcript_cache.get(cache_key)
+        if cached_result is not None:
+            print(f"Transcript cache hit: {cache_key[:12]} ({len(cached_result['segments'])} segments)")
+            return cached_result
+
+        with stage_span("vad") as span:
+            if VAD_MODE == "energy":
+                speech_map = detect_speech_regions(audio_path)
+            else:
+                samples, sample_rate = open_wav_samples(audio_path)
+                speech_map = SpeechMap.whole(len(samples) / sample_rate)
+            span["bytes_in"] = file_size(audio_path)
+            span["speech_s"] = round(speech_map.speech_s, 1)
+        print(f"Speech map: {speech_map.speech_s:.0f}s of speech in {len(speech_map.regions)} regions "
+              f"({speech_map.total_s:.0f}s audio)")
+
+        # Windows are memory-mapped from audio.wav, so peak memory no longer grows with episode length.
+        # Segments are collected before returning because moment selection needs the whole transcript.
+        # Dead air is cut out first so transcription time follows speech time, not episode length.
+        if not speech_map.regions:
+            segments = []
+        elif speech_map.speech_s < VAD_MAX_SPEECH_FRACTION * speech_map.total_s:
+            speech_path = speech_map.write_compacted(audio_path, base_dir_path / "speech.wav")
+            segments = [speech_map.remap_segment(segment) for segment in transcribe_chunked(self.transcriber, speech_path)]
+        else:
+            segments = list(transcribe_chunked(self.transcriber, audio_path))
+        aligned_result = {"segments": segments, "speech_map": speech_map.to_dict()}
+
+        try:
+            self.transcript_cache.put(cache_key, aligned_result)
+            volume.commit()
+        except Exception as e:
+            print(f"Failed to store transcript in cache: {e}")
+
+        return aligned_result
+
+    def identify_moments(self, transcript: list, transcript_index: TranscriptIndex | None = None, audio_path=None):
+        """Use OpenAI to identify 30-60 second viral moments from transcript.
+
+        Windows are pre-ranked locally first; unless MOMENT_SELECTION=full, only
+        the shortlist goes to the model when it is shorter than the whole
+        transcript. The same ranking is the fallback when the model fails.
+        """
+        
+        # Extract segments
+        segments_data = []
+        for segment in transcript:
+            segments_data.append({
+                "start": segment["start"],
+                "end": segment["end"], 
+                "text": segment["text"]
+            })
+
+        shortlist = []
+        try:
+            with stage_span("rank_moments"):
+                shortlist = rank_moment_windows(transcript_index or TranscriptIndex(transcript), audio_path)
+            print(f"Locally ranked shortlist: {[(round(c['start']), c['score']) for c in shortlist]}")
+        except Exception as e:
+            print(f"Local moment ranking failed: {e}")
+        
+        print(f"Analyzing {len(segments_data)} transcript segments with GPT-4o-mini...")
+        
+        try:
+            total_duration = segments_data[-1]["end"] if segments_data else 0
+            transcript_text = encode_transcript_compact(segments_data)
+            shortlist_text = encode_shortlist(segments_data, shortlist) if shortlist else ""
+            if MOMENT_SELECTION == "shortlist" and shortlist and len(shortlist_text) < len(transcript_text):
+                response = self.openai_client.chat.completions.create(
+                    model=MOMENT_MODEL,
+                    messages=shortlist_request_messages(shortlist_text),
+                    tools=CLIP_TOOLS,
+                    tool_choice=CLIP_TOOL_CHOICE,
+                    temperature=0.5
+                )
+                usage = getattr(response, "usage", None)
+                print(f"Shortlist request: {len(shortlist)} windows, {len(shortlist_text)} of {len(transcript_text)} transcript chars, "
+                      f"prompt_tokens={getattr(usage, 'prompt_tokens', None)}")
+
+                clips = parse_clip_tool_call(response)
+                print(f"GPT-4o-mini identified {len(clips)} potential clips")
+                validated_clips = validate_clips(clips)
+            elif total_duration > MOMENT_WINDOW_SECONDS:
+                # Long episodes: score overlapping windows concurrently, then merge
+                validated_clips, _ = asyncio.run(self.identify_moments_windowed(segments_data))
+            else:
+                response = self.openai_client.chat.completions.create(
+                    model=MOMENT_MODEL,  # Cheaper and fast
+                    messages=clip_request_messages(transcript_text),
+                    tools=CLIP_TOOLS,
+                    tool_choice=CLIP_TOOL_CHOICE,
+                    temperature=0.5
+                )
+
+                clips = parse_clip_tool_call(response)
+                print(f"GPT-4o-mini identified {len(clips)} potential clips")
+                validated_clips = validate_clips(clips)
             
             print(f"Final validated clips: {len(validated_clips)}")
             
             # If no clips found, create fallback clips
             if len(validated_clips) == 0:
                 print("No clips validated, creating fallback clips...")
-                return self.create_fallback_clips(segments_data)
+                return self.create_fallback_clips(segments_data, shortlist)
             
             return validated_clips
             
         except Exception as e:
             print(f"Error calling OpenAI API: {e}")
             print(f"Falling back to automatic clip generation")
-            return self.create_fallback_clips(segments_data)
+            return self.create_fallback_clips(segments_data, shortlist)
     
-    def create_fallback_clips(self, segments_data):
-        """Create fallback 30-45 second clips when AI fails"""
+    def create_fallback_clips(self, segments_data, shortlist=None):
+        """Clips from the local ranking when AI fails, else evenly spaced 30 second clips"""
+        if shortlist:
+            clips = []
+            for candidate in shortlist[:5]:
+                # The features that added most to the score explain the pick
+                strengths = sorted(candidate["contributions"], key=candidate["contributions"].get, reverse=True)[:2]
+                clips.append({
+                    "start": candidate["start"],
+                    "end": candidate["end"],
+                    "reason": f"Locally ranked (score {candidate['score']:.2f}; {', '.join(strengths)})",
+                    "hook": shorten_hook(candidate["preview"]) or "Watch this moment",
+                    "virality_score": int(min(10, max(1, round(5 + candidate["score"]))))
+                })
+            print(f"Created {len(clips)} fallback clips from the local ranking")
+            return clips
+
         if not segments_data:
             return []
         
@@ -618,146 +3426,344 @@ CRITICAL: Each clip must be 30-60 seconds. If you find a great moment at time X,
         print(f"Created {len(clips)} fallback clips")
         return clips
 
-    @modal.fastapi_endpoint(method="POST")
-    def process_video(self, request: ProcessVideoRequest, token: HTTPAuthorizationCredentials = Depends(auth_scheme)):
-        s3_key = request.s3_key
+    def run_pipeline(self, s3_key: str, progress=None, horizontal: bool = False):
+        """Download, transcribe, pick moments, then render and upload clips for one video.
+
+        progress(stage, percent, **details) is called as the pipeline advances;
+        the job API uses it to publish per-stage progress. horizontal=True also
+        uploads each clip's frame-accurate smart-cut segment in the source framing.
+        """
+        progress = progress or (lambda stage, percent=0.0, **details: None)
 
-        if token.credentials != os.environ["AUTH_TOKEN"]:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect bearer token", headers={"WWW-Authenticate": "Bearer"})
-        
         run_id = str(uuid.uuid4())
         base_dir = pathlib.Path("/tmp") / run_id
         base_dir.mkdir(parents=True, exist_ok=True)
 
-        video_path = base_dir / "input.mp4"
-        s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
-            aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
-            region_name=os.environ.get("AWS_DEFAULT_REGION", "eu-north-1")
-        )
-        
+        # Stage spans anywhere below (including worker threads) report into this job's timings
+        timings = StageTimings(run_id)
+        timings_token = current_timings.set(timings)
+        admission_ticket = None
+
         try:
-            s3_client.head_object(Bucket="ai-podcast-clipper11", Key=s3_key)
-            s3_client.download_file("ai-podcast-clipper11", s3_key, str(video_path))
-            
-        except s3_client.exceptions.NoSuchKey:
-            raise HTTPException(status_code=404, detail=f"File {s3_key} not found in S3 bucket")
-        except s3_client.exceptions.ClientError as e:
-            error_code = e.response['Error']['Code']
-            if error_code == '403':
-                raise HTTPException(status_code=403, detail="Access denied to S3 bucket. Check permissions.")
-            else:
-                raise HTTPException(status_code=500, detail=f"S3 error: {error_code}")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Download failed: {str(e)}")
-
-        # Transcribe video
-        transcript_result = self.transcribe_video(str(base_dir), str(video_path))
-        print(f"Transcript result type: {type(transcript_result)}")
-        print(f"Transcript result keys: {transcript_result.keys() if isinstance(transcript_result, dict) else 'Not a dict'}")
-        transcript_segments = transcript_result.get("segments", [])
-        print(f"Raw transcript segments count: {len(transcript_segments)}")
-        if len(transcript_segments) > 0:
-            print(f"First segment sample: {transcript_segments[0]}")
-            print(f"First segment keys: {transcript_segments[0].keys() if isinstance(transcript_segments[0], dict) else 'Not a dict'}")
-
-        # Use OpenAI to identify moments (much more reliable than Gemini)
-        print(f"Transcript segments count: {len(transcript_segments)}")
-        clip_moments = self.identify_moments(transcript_segments)
-
-        # Process clips
-        print(f"Processing {len(clip_moments)} clips")
-        generated_videos = []
-        
-        for index, moment in enumerate(clip_moments[:5]):  # Process top 5 clips
-            print(f"\n{'='*60}")
-            print(f"Processing clip {index + 1}/{len(clip_moments)}")
-            print(f"Hook: {moment.get('hook')}")
-            print(f"Reason: {moment.get('reason')}")
-            print(f"Time: {moment['start']:.1f}s - {moment['end']:.1f}s")
-            print(f"Virality Score: {moment.get('virality_score')}/10")
-            print(f"{'='*60}\n")
-            
-            vertical_video_path = process_clip(
-                str(base_dir), 
-                str(video_path), 
-                s3_key, 
-                index, 
-                moment["start"], 
-                moment["end"], 
-                transcript_segments
-            )
-            
-            # Upload to S3
-            if vertical_video_path and vertical_video_path.exists():
-                s3_key_dir = os.path.dirname(s3_key)
-                clip_s3_key = f"{s3_key_dir}/clips/clip_{index}.mp4"
-                video_url = upload_to_s3(vertical_video_path, clip_s3_key, s3_client)
-                if video_url:
-                    generated_videos.append({
-                        "clip_index": index,
-                        "start_time": moment["start"],
-                        "end_time": moment["end"],
-                        "duration": moment["end"] - moment["start"],
-                        "hook": moment.get("hook", ""),
-                        "reason": moment.get("reason", ""),
-                        "virality_score": moment.get("virality_score", 0),
-                        "video_url": video_url
-                    })
-                    print(f"✓ Uploaded clip {index} to S3: {video_url}")
-
-        # Prepare transcript segments for response
-        transcript_segments_response = []
-        print(f"\n=== PREPARING TRANSCRIPT FOR RESPONSE ===")
-        print(f"Input transcript_segments count: {len(transcript_segments)}")
-        
-        for segment in transcript_segments:
-            segment_data = {
-                "start": segment.get("start"),
-                "end": segment.get("end"),
-                "text": segment.get("text", "").strip()
-            }
-            # Include word-level timestamps if available
-            if "words" in segment and segment["words"]:
-                words_data = []
-                for word_data in segment["words"]:
-                    words_data.append({
-                        "word": word_data.get("word", "").strip(),
-                        "start": word_data.get("start"),
-                        "end": word_data.get("end"),
-                        "score": word_data.get("score")
-                    })
-                segment_data["words"] = words_data
-            transcript_segments_response.append(segment_data)
-        
-        print(f"Prepared transcript_segments_response count: {len(transcript_segments_response)}")
-        if len(transcript_segments_response) > 0:
-            print(f"First response segment sample: {transcript_segments_response[0]}")
-        
-        # Build response
-        response_data = {
-            "status": "success", 
-            "total_clips_identified": len(clip_moments),
-            "clips_processed": len(generated_videos),
-            "generated_videos": generated_videos,
-            "transcript": {
-                "segments": transcript_segments_response
+            video_path = base_dir / "input.mp4"
+            s3_client = get_s3_client()
+
+            # Wait for disk and memory before starting; a missing key fails in the download below
+            try:
+                source_bytes = s3_client.head_object(Bucket=S3_BUCKET, Key=s3_key)["ContentLength"]
+            except Exception:
+                source_bytes = 0
+            progress("admission", 0)
+            with stage_span("admission"):
+                admission_ticket = self.admission.acquire(source_bytes, progress)
+
+            progress("download", 0)
+            try:
+                with stage_span("download") as span:
+                    span["streamed_audio"] = download_with_audio_extract(s3_client, s3_key, video_path, base_dir / "audio.wav")
+                    span["bytes_in"] = file_size(video_path)
+            except s3_client.exceptions.NoSuchKey:
+                raise HTTPException(status_code=404, detail=f"File {s3_key} not found in S3 bucket")
+            except s3_client.exceptions.ClientError as e:
+                error_code = e.response['Error']['Code']
+                if error_code in ('404', 'NoSuchKey'):
+                    raise HTTPException(status_code=404, detail=f"File {s3_key} not found in S3 bucket")
+                elif error_code == '403':
+                    raise HTTPException(status_code=403, detail="Access denied to S3 bucket. Check permissions.")
+                else:
+                    raise HTTPException(status_code=500, detail=f"S3 error: {error_code}")
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Download failed: {str(e)}")
+
+            # Transcribe video
+            progress("transcribe", 0)
+            transcript_result = self.transcribe_video(str(base_dir), str(video_path))
+            transcript_segments = transcript_result.get("segments", [])
+            speech_map = SpeechMap.from_dict(transcript_result["speech_map"]) if transcript_result.get("speech_map") else None
+
+            # One time index serves moment ranking, subtitle grouping, clip snapping and the response
+            transcript_index = TranscriptIndex(transcript_segments)
+
+            # Use OpenAI to identify moments (much more reliable than Gemini)
+            progress("identify_moments", 0)
+            with stage_span("identify_moments", segments=len(transcript_segments)):
+                clip_moments = self.identify_moments(transcript_segments, transcript_index, base_dir / "audio.wav")
+
+            # Process clips
+            print(f"Processing {len(clip_moments)} clips")
+
+            # Drop candidates that are mostly dead air so the next-best moments take their place
+            candidate_moments = clip_moments
+            if speech_map is not None:
+                for moment in clip_moments:
+                    moment["speech_ratio"] = round(speech_map.speech_ratio(moment["start"], moment["end"]), 3)
+                spoken_moments = [moment for moment in clip_moments if moment["speech_ratio"] >= VAD_MIN_CLIP_SPEECH_RATIO]
+                if len(spoken_moments) < len(clip_moments):
+                    print(f"Dropped {len(clip_moments) - len(spoken_moments)} clips under {VAD_MIN_CLIP_SPEECH_RATIO:.0%} speech")
+                candidate_moments = spoken_moments or clip_moments
+
+            selected_moments = candidate_moments[:5]  # Process top 5 clips
+
+            for moment in selected_moments:
+                moment["start"], moment["end"] = transcript_index.snap_clip(moment["start"], moment["end"])
+
+            # Render progress counts frames encoded across all clips
+            try:
+                source_fps = probe_video_codec(str(video_path))["fps"] or FACE_TRACK_FRAMERATE
+            except Exception:
+                source_fps = FACE_TRACK_FRAMERATE
+            render_progress = RenderProgress(progress, [moment["end"] - moment["start"] for moment in selected_moments], source_fps)
+            progress("render", 0, clips_done=0, clips_total=len(selected_moments))
+
+            # Cut all selected clips in one pass over the source; horizontal
+            # originals are shipped as-is, so they need frame-accurate cuts.
+            # Fused and cached renders read the source themselves and cut only on fallback.
+            segment_paths = {}
+            if horizontal or RENDER_MODE not in ("fused", "cached"):
+                segment_paths = extract_clip_segments(
+                    str(base_dir),
+                    str(video_path),
+                    [(index, moment["start"], moment["end"]) for index, moment in enumerate(selected_moments)],
+                    cut_mode="smart" if horizontal else CUT_MODE
+                )
+
+            # Cached mode keeps per-chunk intermediates on the volume for later edits
+            render_cache = source_id = None
+            if RENDER_MODE == "cached":
+                render_cache = RenderCache(RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES, RENDER_CHUNK_SECONDS)
+                source_id = source_fingerprint(s3_client, s3_key)
+
+            # Render and upload clips concurrently; results keep virality order
+            max_workers = clip_worker_count(len(selected_moments), self.admission.running)
+            print(f"Rendering {len(selected_moments)} clips with {max_workers} workers")
+
+            clip_results = [None] * len(selected_moments)
+            upload_futures = {}
+            # Uploads run on their own pool so later clips keep rendering meanwhile
+            with ThreadPoolExecutor(max_workers=max_workers) as render_executor, ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as upload_executor:
+                render_futures = {
+                    render_executor.submit(contextvars.copy_context().run, render_moment_clip, str(base_dir), str(video_path), s3_key, index, moment, transcript_index, render_cache, source_id,
+                                           render_progress.reporter(index)): index
+                    for index, moment in enumerate(selected_moments)
+                }
+                for future in as_completed(render_futures):
+                    index = render_futures[future]
+                    render_progress.finish(index)
+                    try:
+                        vertical_video_path = future.result()
+                    except Exception as e:
+                        print(f"Clip {index} failed: {e}")
+                        continue
+                    if vertical_video_path:
+                        horizontal_path = segment_paths.get(index) if horizontal else None
+                        upload_futures[index] = upload_executor.submit(contextvars.copy_context().run, upload_clip, vertical_video_path, s3_key, index, selected_moments[index], s3_client, horizontal_path)
+
+                progress("upload", 0, clips_done=0, clips_total=len(upload_futures))
+                for uploaded, (index, future) in enumerate(upload_futures.items(), start=1):
+                    try:
+                        clip_results[index] = future.result()
+                    except Exception as e:
+                        print(f"Clip {index} upload failed: {e}")
+                    progress("upload", 100 * uploaded / len(upload_futures), clips_done=uploaded, clips_total=len(upload_futures))
+
+            generated_videos = [clip for clip in clip_results if clip]
+            if render_cache is not None:
+                try:
+                    render_cache.evict()
+                    volume.commit()
+                except Exception as e:
+                    print(f"Failed to commit render cache: {e}")
+
+            # Prepare transcript segments for response
+            transcript_segments_response = transcript_index.to_response_segments()
+
+            # Build response
+            response_data = {
+                "status": "success",
+                "total_clips_identified": len(clip_moments),
+                "clips_processed": len(generated_videos),
+                "generated_videos": generated_videos,
+                "transcript": {
+                    "segments": transcript_segments_response
+                },
+                "speech_map": speech_map.to_dict() if speech_map is not None else None,
+                "timings": timings.summary()
             }
+            emit_metrics_line({"event": "job", "job_id": run_id, "s3_key": s3_key, "transcript_segments": len(transcript_segments_response),
+                               "clips_identified": len(clip_moments), "clips_processed": len(generated_videos), **response_data["timings"]})
+
+            return response_data
+        finally:
+            current_timings.reset(timings_token)
+            try:
+                metrics_registry.publish(metrics_store)
+            except Exception as e:
+                print(f"Failed to publish metrics: {e}")
+
+            # Cleanup
+            if base_dir.exists():
+                shutil.rmtree(base_dir, ignore_errors=True)
+            if admission_ticket is not None:
+                self.admission.release(admission_ticket)
+
+
+# Several jobs share a GPU container; only their transcription windows are serialized
+@app.cls(gpu="L40S", timeout=3600, retries=0, scaledown_window=20, secrets=[modal.Secret.from_name("custom-secret")], volumes={mount_path: volume},
+         allow_concurrent_inputs=JOBS_PER_CONTAINER)
+class AiPodcastClipper(ClipperPipeline):
+    @modal.enter()
+    def load_model(self):
+        self.setup(WhisperXBackend())
+
+    @modal.fastapi_endpoint(method="POST")
+    def process_video(self, request: ProcessVideoRequest, token: HTTPAuthorizationCredentials = Depends(auth_scheme)):
+        check_token(token)
+        return self.run_pipeline(request.s3_key, horizontal=request.horizontal)
+
+    @modal.method()
+    def run_job(self, job_id: str, s3_key: str, callback_url: str | None = None, horizontal: bool = False):
+        execute_job(jobs, job_id, s3_key, functools.partial(self.run_pipeline, horizontal=horizontal), callback_url)
+
+
+# Low-priority jobs run here: faster-whisper int8 on CPU, configured through the TRANSCRIBE_* environment
+@app.cls(cpu=8.0, memory=16384, timeout=3600, retries=0, scaledown_window=20, secrets=[modal.Secret.from_name("custom-secret")], volumes={mount_path: volume})
+class AiPodcastClipperCPU(ClipperPipeline):
+    @modal.enter()
+    def load_model(self):
+        # No allow_concurrent_inputs: one job at a time gets every core for its clips
+        self.setup(get_transcription_backend("faster-whisper"), max_jobs=1)
+
+    @modal.method()
+    def run_job(self, job_id: str, s3_key: str, callback_url: str | None = None, horizontal: bool = False):
+        execute_job(jobs, job_id, s3_key, functools.partial(self.run_pipeline, horizontal=horizontal), callback_url)
+
+
+# The job API runs on CPU containers so polling clients never hold a GPU
+@app.function(secrets=[modal.Secret.from_name("custom-secret")])
+@modal.fastapi_endpoint(method="POST")
+def submit_job(request: SubmitJobRequest, token: HTTPAuthorizationCredentials = Depends(auth_scheme)):
+    """Queue a video for background processing and return its job id immediately"""
+    check_token(token)
+
+    job_id = str(uuid.uuid4())
+    worker = "cpu" if request.priority == "low" else "gpu"
+    jobs[job_id] = {**new_job_record(job_id, request.s3_key, request.callback_url), "worker": worker}
+    clipper = AiPodcastClipperCPU() if worker == "cpu" else AiPodcastClipper()
+    clipper.run_job.spawn(job_id, request.s3_key, request.callback_url, request.horizontal)
+    print(f"Queued job {job_id} for {request.s3_key} on the {worker} worker")
+    return {"job_id": job_id, "status": "queued", "worker": worker}
+
+@app.function(secrets=[modal.Secret.from_name("custom-secret")])
+@modal.fastapi_endpoint(method="GET")
+def job_status(job_id: str, token: HTTPAuthorizationCredentials = Depends(auth_scheme)):
+    check_token(token)
+
+    record = jobs.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return {key: value for key, value in record.items() if key not in ("result", "callback_url")}
+
+@app.function(secrets=[modal.Secret.from_name("custom-secret")])
+@modal.fastapi_endpoint(method="GET")
+def metrics(token: HTTPAuthorizationCredentials = Depends(auth_scheme)):
+    """Prometheus text exposition of the stage counters published by every worker"""
+    check_token(token)
+
+    snapshots = [snapshot for key, snapshot in metrics_store.items() if key.startswith(METRICS_KEY_PREFIX)]
+    return PlainTextResponse(render_prometheus(snapshots), media_type="text/plain; version=0.0.4")
+
+@app.function(secrets=[modal.Secret.from_name("custom-secret")])
+@modal.fastapi_endpoint(method="GET")
+def job_result(job_id: str, token: HTTPAuthorizationCredentials = Depends(auth_scheme)):
+    check_token(token)
+
+    record = jobs.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if record["status"] in ("queued", "running"):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is still {record['status']}")
+    if record["status"] == "failed":
+        raise HTTPException(status_code=500, detail=record.get("error") or "Job failed")
+    return record["result"]
+
+# Edits render on CPU from the chunks cached on the volume, downloading the source only for uncached ranges
+@app.function(secrets=[modal.Secret.from_name("custom-secret")], volumes={mount_path: volume}, cpu=4.0, timeout=900)
+@modal.fastapi_endpoint(method="POST")
+def rerender_clip(request: RerenderClipRequest, token: HTTPAuthorizationCredentials = Depends(auth_scheme)):
+    """Re-render one clip after a trim, subtitle or style edit, reusing cached render chunks.
+
+    Subtitles are taken from `subtitles` ([start, end, text] relative to
+    start_time) or grouped from `transcript_segments`; with neither the clip
+    is rendered without subtitles. tier="preview" renders a faster, lower
+    quality clip for the editor; by default RENDER_TIER decides.
+    """
+    check_token(token)
+    if request.end_time <= request.start_time:
+        raise HTTPException(status_code=400, detail="end_time must be after start_time")
+    if request.framing not in VERTICAL_FILTERS:
+        raise HTTPException(status_code=400, detail=f"Unknown framing: {request.framing}")
+    unknown_style = set(request.style or {}) - SUBTITLE_STYLE_FIELDS
+    if unknown_style:
+        raise HTTPException(status_code=400, detail=f"Unsupported subtitle style fields: {sorted(unknown_style)}")
+
+    if request.subtitles is not None:
+        subtitles = [tuple(line) for line in request.subtitles]
+    elif request.transcript_segments is not None:
+        subtitles = build_subtitle_groups(request.transcript_segments, request.start_time, request.end_time, max_words=5)
+    else:
+        subtitles = []
+
+    s3_client = get_s3_client()
+    try:
+        source_id = source_fingerprint(s3_client, request.s3_key)
+    except s3_client.exceptions.ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            raise HTTPException(status_code=404, detail=f"File {request.s3_key} not found in S3 bucket")
+        raise
+
+    run_dir = pathlib.Path("/tmp") / str(uuid.uuid4())
+    run_dir.mkdir(parents=True, exist_ok=True)
+    video_path = run_dir / "input.mp4"
+
+    def fetch_source():
+        if not video_path.exists():
+            with stage_span("download") as span:
+                s3_client.download_file(S3_BUCKET, request.s3_key, str(video_path), Config=get_s3_transfer_config())
+                span["bytes_in"] = file_size(video_path)
+        return str(video_path)
+
+    try:
+        volume.reload()
+        render_cache = RenderCache(RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES, RENDER_CHUNK_SECONDS)
+        output_path = run_dir / "clip.mp4"
+        encoder = get_video_encoder(request.tier)
+        stats = render_clip_cached(render_cache, source_id, fetch_source, request.start_time, request.end_time,
+                                   subtitles, output_path, framing=request.framing, style=request.style, encoder=encoder)
+        if stats is None:
+            raise HTTPException(status_code=500, detail="Clip render failed")
+        render_cache.evict()
+        volume.commit()
+
+        # Each distinct edit gets its own key, so the original clip stays available
+        edit_key = RenderCache.make_key(start=request.start_time, end=request.end_time, subtitles=subtitles,
+                                        style=request.style, framing=request.framing, tier=encoder.tier)
+        clip_s3_key = f"{os.path.dirname(request.s3_key)}/clips/clip_{request.clip_index}_edit_{edit_key[:12]}.mp4"
+        video_url = upload_to_s3(output_path, clip_s3_key, s3_client)
+        if not video_url:
+            raise HTTPException(status_code=500, detail="Failed to upload re-rendered clip")
+
+        print(f"Re-rendered clip {request.clip_index}: {video_url}")
+        return {
+            "clip_index": request.clip_index,
+            "start_time": request.start_time,
+            "end_time": request.end_time,
+            "duration": request.end_time - request.start_time,
+            "video_url": video_url,
+            "tier": encoder.tier,
+            "render": stats
         }
-        
-        print(f"\n=== RESPONSE DATA ===")
-        print(f"Response keys: {response_data.keys()}")
-        print(f"Has transcript: {'transcript' in response_data}")
-        print(f"Transcript segments count in response: {len(response_data['transcript']['segments'])}")
-        print(f"Response structure: status={response_data['status']}, clips={len(generated_videos)}, transcript_segments={len(transcript_segments_response)}")
-        print(f"========================\n")
-
-        # Cleanup
-        if base_dir.exists():
-            shutil.rmtree(base_dir, ignore_errors=True)
-        
-        return response_data
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
 
 
 @app.local_entrypoint()
@@ -0,0 +1,23 @@
+import pathlib
+import sys
+import wave
+
+import numpy as np
+import pytest
+
+# main.py lives next to this directory and is imported as a top-level module
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def write_wav(tmp_path):
+    """Write int16 mono samples to a 16 kHz WAV under tmp_path and return its path"""
+    def write(samples, name="audio.wav", sample_rate=16000):
+        path = tmp_path / name
+        with wave.open(str(path), "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(sample_rate)
+            wav_file.writeframes(np.asarray(samples, dtype=np.int16).tobytes())
+        return path
+    return write
@@ -0,0 +1,130 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from main import AdmissionController, GatedBackend, StageGate, TranscriptionBackend, clip_worker_count, transcribe_chunked
+
+GB = 1024 ** 3
+
+
+def admit_in_background(admission, source_bytes):
+    admitted = threading.Event()
+    tickets = []
+
+    def acquire():
+        tickets.append(admission.acquire(source_bytes))
+        admitted.set()
+
+    threading.Thread(target=acquire, daemon=True).start()
+    return admitted, tickets
+
+
+def test_third_job_waits_for_memory_then_is_admitted():
+    admission = AdmissionController(max_jobs=3, job_memory_bytes=GB, poll_s=0.05,
+                                    disk_free=lambda: 100 * GB, memory_free=lambda: int(2.5 * GB))
+    first = admission.acquire(GB)
+    second = admission.acquire(GB)
+
+    admitted, tickets = admit_in_background(admission, GB)
+    assert not admitted.wait(0.3)
+    assert admission.running == 2
+
+    admission.release(first)
+    assert admitted.wait(2)
+    assert admission.running == 2
+    admission.release(second)
+    admission.release(tickets[0])
+    assert admission.running == 0
+
+
+def test_disk_reservation_and_job_limit_hold_jobs_back():
+    admission = AdmissionController(max_jobs=2, job_memory_bytes=0, disk_factor=3, poll_s=0.05,
+                                    disk_free=lambda: 10 * GB, memory_free=lambda: None)
+    first = admission.acquire(2 * GB)
+
+    # 6 GB reserved + 6 GB more exceeds the 10 GB measured while idle
+    admitted, _ = admit_in_background(admission, 2 * GB)
+    assert not admitted.wait(0.3)
+    admission.release(first)
+    assert admitted.wait(2)
+
+    admission.acquire(GB)
+    admitted, _ = admit_in_background(admission, 0)
+    assert not admitted.wait(0.3)
+    assert admission.running == 2
+
+
+def test_a_job_larger_than_the_container_still_runs_alone():
+    admission = AdmissionController(max_jobs=3, job_memory_bytes=8 * GB,
+                                    disk_free=lambda: GB, memory_free=lambda: GB)
+
+    ticket = admission.acquire(10 * GB)
+
+    assert admission.running == 1
+    admission.release(ticket)
+
+
+class SlowBackend(TranscriptionBackend):
+    """Stub transcriber that records how many windows run at once"""
+
+    name = "slow"
+    aligns = True
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def _enter(self):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.02)
+        with self.lock:
+            self.active -= 1
+
+    def transcribe(self, audio):
+        self._enter()
+        return [{"start": 0.5, "end": 1.0, "text": "hi", "words": [{"word": "hi", "start": 0.5, "end": 1.0}]}]
+
+    def align(self, segments, audio):
+        self._enter()
+        return segments
+
+    def cache_settings(self):
+        return {}
+
+
+def test_gated_backend_serializes_windows_across_jobs(write_wav):
+    audio_path = write_wav(np.zeros(20 * 16000))
+    backend = SlowBackend()
+    gated = GatedBackend(backend, StageGate("transcribe"))
+    results = {}
+
+    def job(name):
+        results[name] = list(transcribe_chunked(gated, audio_path, window_s=4, overlap_s=1))
+
+    threads = [threading.Thread(target=job, args=(name,)) for name in ("a", "b", "c")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert backend.max_active == 1
+    assert gated.gate.busy_s > 0
+    assert results["a"] == results["b"] == results["c"]
+    assert len(results["a"]) == 7
+
+
+def test_clip_workers_split_cores_between_running_jobs(monkeypatch):
+    monkeypatch.delenv("CLIP_WORKERS", raising=False)
+    monkeypatch.setattr("os.sched_getaffinity", lambda pid: set(range(8)))
+
+    assert clip_worker_count(5, running_jobs=1) == 4
+    assert clip_worker_count(5, running_jobs=3) == 1
+    assert clip_worker_count(2, running_jobs=1) == 2
+
+    monkeypatch.setenv("CLIP_WORKERS", "3")
+    assert clip_worker_count(5, running_jobs=3) == 3
@@ -0,0 +1,19 @@
+from main import HOOK_MAX_CHARS, ClipperPipeline, shorten_hook
+
+
+def test_ranked_fallback_hooks_fit_the_hook_limit():
+    preview = "So the thing about building a company is that nobody ever tells you how hard payroll is"
+    shortlist = [{"start": 10.0, "end": 55.0, "score": 1.2, "contributions": {"keywords": 0.8, "speech_rate": 0.4},
+                  "preview": preview},
+                 {"start": 90.0, "end": 135.0, "score": 0.3, "contributions": {"keywords": 0.1}, "preview": ""}]
+
+    clips = ClipperPipeline().create_fallback_clips([], shortlist)
+
+    assert clips[0]["hook"] == "So the thing about building a company is that nobody ever..."
+    assert len(clips[0]["hook"]) <= HOOK_MAX_CHARS
+    assert clips[1]["hook"] == "Watch this moment"
+
+
+def test_shorten_hook_keeps_short_text_and_cuts_long_words():
+    assert shorten_hook("  Why   payroll broke us ") == "Why payroll broke us"
+    assert shorten_hook("x" * 80) == "x" * (HOOK_MAX_CHARS - 3) + "..."
@@ -0,0 +1,121 @@
+import http.server
+import json
+import threading
+
+import pytest
+
+from main import JobTracker, LocalJobQueue, RenderProgress, execute_job, new_job_record
+
+
+def test_local_queue_reports_progress_then_result():
+    running = threading.Event()
+    release = threading.Event()
+
+    def runner(s3_key, progress):
+        progress("download", 0)
+        progress("render", 40, clips_done=2, clips_total=5)
+        running.set()
+        release.wait(5)
+        return {"clips": [s3_key]}
+
+    queue = LocalJobQueue(runner)
+    try:
+        job_id = queue.submit("uploads/episode.mp4")
+        assert running.wait(5)
+        status = queue.status(job_id)
+        assert status["status"] == "running"
+        assert (status["stage"], status["stage_percent"], status["clips_done"], status["clips_total"]) == ("render", 40.0, 2, 5)
+        assert "result" not in status
+
+        release.set()
+        record = queue.result(job_id, timeout=5)
+        assert record["status"] == "succeeded"
+        assert record["stage_percent"] == 100.0
+        assert record["result"] == {"clips": ["uploads/episode.mp4"]}
+        assert queue.status("missing") is None
+    finally:
+        release.set()
+        queue.shutdown()
+
+
+def test_failed_job_records_the_error():
+    def runner(s3_key, progress):
+        raise RuntimeError("transcription backend unavailable")
+
+    queue = LocalJobQueue(runner)
+    try:
+        record = queue.result(queue.submit("uploads/episode.mp4"), timeout=5)
+    finally:
+        queue.shutdown()
+
+    assert record["status"] == "failed"
+    assert record["error"] == "transcription backend unavailable"
+    assert record["result"] is None
+
+
+@pytest.fixture
+def callback_server():
+    received = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/done", received
+    server.shutdown()
+    server.server_close()
+
+
+def test_execute_job_posts_the_finished_record(callback_server):
+    callback_url, received = callback_server
+    store = {"job-1": new_job_record("job-1", "uploads/episode.mp4", callback_url)}
+
+    record = execute_job(store, "job-1", "uploads/episode.mp4", lambda s3_key, progress: {"ok": True}, callback_url)
+
+    assert record["status"] == "succeeded"
+    assert len(received) == 1
+    assert received[0]["job_id"] == "job-1"
+    assert received[0]["result"] == {"ok": True}
+    assert "callback_url" not in received[0]
+
+
+def test_job_tracker_throttles_percent_only_updates():
+    store = {}
+    tracker = JobTracker(store, "job-1", min_interval=60)
+
+    tracker.progress("render", 10, clips_done=0, clips_total=2)
+    tracker.progress("render", 20, clips_done=0, clips_total=2)
+    assert store["job-1"]["stage_percent"] == 10.0
+
+    tracker.progress("render", 30, clips_done=1, clips_total=2)
+    assert store["job-1"]["stage_percent"] == 30.0
+    tracker.progress("render", 100, clips_done=1, clips_total=2)
+    assert store["job-1"]["stage_percent"] == 100.0
+    tracker.progress("upload", 0, clips_done=0, clips_total=2)
+    assert store["job-1"]["stage"] == "upload"
+
+
+def test_render_progress_counts_frames_across_clips():
+    calls = []
+    render_progress = RenderProgress(lambda stage, percent, **details: calls.append((stage, percent, details)),
+                                     [10.0, 30.0], fps=25)
+    first, second = render_progress.reporter(0), render_progress.reporter(1)
+
+    first(5.0)
+    assert calls[-1] == ("render", pytest.approx(12.5), {"clips_done": 0, "clips_total": 2})
+    # A later pass starting over, or an audio-only pass past the clip end, never moves progress backwards or past the clip
+    first(1.0)
+    second(60.0)
+    assert len(calls) == 2
+    assert calls[-1][1] == pytest.approx(87.5)
+
+    render_progress.finish(0)
+    assert calls[-1] == ("render", pytest.approx(100.0), {"clips_done": 1, "clips_total": 2})
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from main import SpeechMap, detect_speech_regions, open_wav_samples
+
+SAMPLE_RATE = 16000
+
+
+def tone(duration_s, amplitude):
+    t = np.arange(int(duration_s * SAMPLE_RATE)) / SAMPLE_RATE
+    return amplitude * np.sin(2 * np.pi * 220 * t)
+
+
+def place(samples, start_s, burst):
+    first = int(start_s * SAMPLE_RATE)
+    samples[first:first + len(burst)] += burst
+
+
+def test_detects_speech_between_room_noise(write_wav):
+    rng = np.random.default_rng(3)
+    samples = rng.normal(0, 30, 60 * SAMPLE_RATE)
+    place(samples, 5.0, tone(10.0, 8000))
+    # A 0.4 s pause inside speech is bridged, a 0.1 s click is dropped
+    samples[int(9.0 * SAMPLE_RATE):int(9.4 * SAMPLE_RATE)] = 0
+    place(samples, 20.0, tone(0.1, 8000))
+    place(samples, 30.0, tone(10.0, 8000))
+
+    speech_map = detect_speech_regions(write_wav(samples))
+
+    assert len(speech_map.regions) == 2
+    for (start, end), (expected_start, expected_end) in zip(speech_map.regions, [(4.7, 15.3), (29.7, 40.3)]):
+        assert start == pytest.approx(expected_start, abs=0.05)
+        assert end == pytest.approx(expected_end, abs=0.05)
+    assert speech_map.total_s == pytest.approx(60.0)
+
+
+def test_digital_silence_has_no_speech(write_wav):
+    assert detect_speech_regions(write_wav(np.zeros(5 * SAMPLE_RATE))).regions == []
+
+
+def test_level_audio_without_a_quieter_floor_is_all_speech(write_wav):
+    speech_map = detect_speech_regions(write_wav(tone(5.0, 8000)))
+
+    assert speech_map.regions == [pytest.approx((0.0, 5.0))]
+
+
+def test_compacted_times_map_back_to_the_episode():
+    speech_map = SpeechMap([(10.0, 20.0), (50.0, 55.0)], 60.0, gap_s=0.5)
+
+    assert speech_map.to_original(3.0) == pytest.approx(13.0)
+    # Times inside the inserted gap snap to the end of the region before it
+    assert speech_map.to_original(10.2) == pytest.approx(20.0)
+    assert speech_map.to_original(10.5) == pytest.approx(50.0)
+    assert speech_map.to_original(12.0) == pytest.approx(51.5)
+
+    segment = {"start": 9.5, "end": 11.0, "text": "across the gap",
+               "words": [{"word": "across", "start": 9.5, "end": 9.9}, {"word": "gap", "start": 10.6, "end": 11.0},
+                         {"word": "42"}]}
+    remapped = speech_map.remap_segment(segment)
+    assert (remapped["start"], remapped["end"]) == pytest.approx((19.5, 50.5))
+    assert [(word.get("start"), word.get("end")) for word in remapped["words"]] == [
+        pytest.approx((19.5, 19.9)), pytest.approx((50.1, 50.5)), (None, None)]
+    assert segment["start"] == 9.5
+
+
+def test_compacted_audio_lines_up_with_to_original(write_wav, tmp_path):
+    # Each sample stores its own position in 32-sample ticks
+    audio_path = write_wav(np.arange(30 * SAMPLE_RATE) // 32)
+    speech_map = SpeechMap([(2.0, 5.0), (12.5, 20.0)], 30.0, gap_s=0.5)
+
+    compacted, _ = open_wav_samples(speech_map.write_compacted(audio_path, tmp_path / "speech.wav"))
+
+    assert len(compacted) == int((3.0 + 0.5 + 7.5 + 0.5) * SAMPLE_RATE)
+    for compact_time in (0.0, 1.7, 2.99, 3.5, 4.0, 10.9):
+        original = int(compacted[int(compact_time * SAMPLE_RATE)]) * 32 / SAMPLE_RATE
+        assert original == pytest.approx(speech_map.to_original(compact_time), abs=32 / SAMPLE_RATE)
+    assert not compacted[int(3.2 * SAMPLE_RATE)]
+
+
+def test_speech_ratio_and_dict_round_trip():
+    speech_map = SpeechMap([(10.0, 20.0), (50.0, 55.0)], 60.0, gap_s=0.5, threshold_db=-41.23)
+
+    assert speech_map.speech_ratio(15.0, 25.0) == pytest.approx(0.5)
+    assert speech_map.speech_ratio(20.0, 50.0) == 0.0
+    assert speech_map.speech_ratio(5.0, 5.0) == 0.0
+
+    restored = SpeechMap.from_dict(speech_map.to_dict())
+    assert restored.regions == speech_map.regions
+    assert (restored.total_s, restored.gap_s, restored.speech_s) == (60.0, 0.5, 15.0)
+    assert restored.threshold_db == pytest.approx(-41.2)
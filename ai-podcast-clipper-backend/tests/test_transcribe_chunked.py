@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from main import TranscriptionBackend, transcribe_chunked
+
+SAMPLE_RATE = 16000
+# Each sample stores its own position in TICK-sample units, so a window knows where it starts
+TICK = 32
+WORD_S = 0.25
+WORD_STEP_S = 0.4
+
+
+def timeline_samples(duration_s):
+    return np.arange(int(duration_s * SAMPLE_RATE)) // TICK
+
+
+class TimelineBackend(TranscriptionBackend):
+    """Hears a word every WORD_STEP_S seconds of the episode, grouped into 2 s segments"""
+
+    name = "timeline"
+
+    def __init__(self):
+        self.windows = []
+
+    def transcribe(self, audio):
+        offset = round(audio[0] * 32768) * TICK / SAMPLE_RATE
+        duration = len(audio) / SAMPLE_RATE
+        self.windows.append((offset, duration))
+        segments = {}
+        first = int(np.ceil(offset / WORD_STEP_S - 1e-9))
+        for index in range(first, int((offset + duration) / WORD_STEP_S) + 1):
+            start = index * WORD_STEP_S
+            if start + WORD_S > offset + duration:
+                break
+            word = {"word": f"w{index}", "start": start - offset, "end": start + WORD_S - offset}
+            segments.setdefault(int(start // 2), []).append(word)
+        return [{"start": words[0]["start"], "end": words[-1]["end"],
+                 "text": " ".join(word["word"] for word in words), "words": words}
+                for _, words in sorted(segments.items())]
+
+    def cache_settings(self):
+        return {}
+
+
+def episode_words(duration_s):
+    count = int((duration_s - WORD_S) / WORD_STEP_S) + 1
+    return [f"w{index}" for index in range(count)]
+
+
+def test_windows_stitch_without_duplicate_or_missing_words(write_wav):
+    audio_path = write_wav(timeline_samples(60))
+    backend = TimelineBackend()
+
+    segments = list(transcribe_chunked(backend, audio_path, window_s=20, overlap_s=4))
+
+    assert len(backend.windows) > 1
+    words = [word for segment in segments for word in segment["words"]]
+    assert [word["word"] for word in words] == episode_words(60)
+    for word in words:
+        index = int(word["word"][1:])
+        assert word["start"] == pytest.approx(index * WORD_STEP_S)
+        assert word["end"] == pytest.approx(index * WORD_STEP_S + WORD_S)
+    for segment in segments:
+        assert segment["text"] == " ".join(word["word"] for word in segment["words"])
+        assert segment["start"] == pytest.approx(segment["words"][0]["start"])
+
+
+def test_short_audio_matches_whole_file_transcription(write_wav):
+    samples = timeline_samples(12)
+    audio_path = write_wav(samples)
+
+    chunked = list(transcribe_chunked(TimelineBackend(), audio_path, window_s=20, overlap_s=4))
+
+    assert chunked == TimelineBackend().transcribe(samples.astype(np.float32) / 32768.0)
+
+
+def test_overlap_must_be_shorter_than_window(write_wav):
+    audio_path = write_wav(timeline_samples(1))
+
+    with pytest.raises(ValueError):
+        transcribe_chunked(TimelineBackend(), audio_path, window_s=10, overlap_s=10)
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from main import TranscriptIndex, build_subtitle_groups
+
+
+def sentence(start, words, step=0.5, length=0.4):
+    timed = [{"word": word, "start": start + i * step, "end": start + i * step + length, "score": 0.9}
+             for i, word in enumerate(words)]
+    return {"start": timed[0]["start"], "end": timed[-1]["end"], "text": " " + " ".join(words), "words": timed}
+
+
+def test_token_range_matches_a_linear_scan():
+    rng = np.random.default_rng(7)
+    segments = []
+    for index in range(200):
+        start = float(rng.uniform(0, 600))
+        # Some words run long so they overlap later tokens
+        words = [{"word": f"t{index}_{i}", "start": start + i * 0.3, "end": start + i * 0.3 + float(rng.uniform(0.1, 3.0))}
+                 for i in range(int(rng.integers(1, 6)))]
+        segments.append({"start": words[0]["start"], "end": words[-1]["end"], "text": "x", "words": words})
+    index = TranscriptIndex(segments)
+
+    all_words = [word for segment in segments for word in segment["words"]]
+    for _ in range(200):
+        start = float(rng.uniform(0, 620))
+        end = start + float(rng.uniform(0.01, 40))
+        expected = sorted(word["word"] for word in all_words if word["end"] > start and word["start"] < end)
+        assert sorted(index.token_text(i) for i in index.token_range(start, end)) == expected
+
+
+def test_subtitle_groups_are_relative_and_capped():
+    segments = [sentence(10.0, ["one", "two", "three", "four", "five", "six", "seven"]),
+                {"start": 20.0, "end": 22.0, "text": "no word timings"}]
+
+    groups = build_subtitle_groups(segments, 10.0, 30.0, max_words=5)
+
+    # Untimed segments contribute tokens spanning the segment; lines run across segments
+    assert [text for _, _, text in groups] == ["one two three four five", "six seven no word timings"]
+    assert groups[0][:2] == pytest.approx((0.0, 2.4))
+    assert groups[1][:2] == pytest.approx((2.5, 12.0))
+    assert build_subtitle_groups(segments, 12.42, 12.48) == []
+
+
+def test_snap_clip_prefers_sentence_edges_then_word_edges():
+    segments = [sentence(float(start), ["a", "b", "c", "d"]) for start in range(0, 100, 5)]
+    index = TranscriptIndex(segments)
+
+    # Sentence edges within 2 s: starts at 5.0, ends at 41.9 (sentence at 40 ends 40 + 1.5 + 0.4)
+    assert index.snap_clip(5.8, 42.3) == pytest.approx((5.0, 41.9))
+    # Too far from sentence edges with max_shift=0.3: extend to the word being spoken
+    assert index.snap_clip(6.1, 46.7, max_shift=0.3) == pytest.approx((6.0, 46.9))
+    # Snapping that breaks the duration bounds keeps the original range
+    assert index.snap_clip(5.8, 35.1, max_duration=30.5) == (5.8, 35.1)
+
+
+def test_response_segments_round_trip():
+    segments = [sentence(1.0, ["hello", "there"]),
+                {"start": 3.0, "end": 4.0, "text": " untimed words"},
+                {"start": 5.0, "end": 6.0, "text": "42 percent",
+                 "words": [{"word": "42"}, {"word": "percent", "start": 5.4, "end": 6.0, "score": 0.5}]}]
+
+    response = TranscriptIndex(segments).to_response_segments()
+
+    assert response[0] == {"start": 1.0, "end": 1.9, "text": "hello there", "words": [
+        {"word": "hello", "start": 1.0, "end": 1.4, "score": 0.9},
+        {"word": "there", "start": 1.5, "end": 1.9, "score": 0.9}]}
+    assert response[1] == {"start": 3.0, "end": 4.0, "text": "untimed words"}
+    assert response[2]["words"][0] == {"word": "42", "start": None, "end": None, "score": None}
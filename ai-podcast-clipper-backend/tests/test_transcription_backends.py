@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from main import FasterWhisperBackend, TranscriptCache, TranscriptionBackend, get_transcription_backend
+
+
+class FakeWhisperModel:
+    """Stands in for faster_whisper.WhisperModel, returning its segment objects"""
+
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, **options):
+        self.calls.append(options)
+        words = [SimpleNamespace(word=" hello", start=0.5, end=0.9, probability=0.8),
+                 SimpleNamespace(word=" world", start=1.0, end=1.4, probability=0.7)]
+        segments = [SimpleNamespace(start=0.5, end=1.4, text=" hello world", words=words if options["word_timestamps"] else None)]
+        return iter(segments), SimpleNamespace(language="en")
+
+
+def test_backends_must_implement_transcribe_and_cache_settings():
+    class Incomplete(TranscriptionBackend):
+        def transcribe(self, audio):
+            return []
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_faster_whisper_defaults_to_cpu_word_timings(monkeypatch):
+    for variable in ("CPU_TRANSCRIBE_MODEL", "TRANSCRIBE_THREADS", "TRANSCRIBE_BATCH_SIZE", "TRANSCRIBE_ALIGN"):
+        monkeypatch.delenv(variable, raising=False)
+
+    backend = get_transcription_backend("faster-whisper")
+
+    assert (backend.model_size, backend.batch_size, backend.compute_type, backend.aligns) == ("small", 1, "int8", False)
+    assert backend.profile["needs_gpu"] is False
+    assert backend.profile["word_timing"] == "cross-attention"
+    assert backend.describe()["device"] == "cpu"
+
+
+def test_environment_configures_faster_whisper(monkeypatch, capsys):
+    monkeypatch.setenv("CPU_TRANSCRIBE_MODEL", "tiny")
+    monkeypatch.setenv("TRANSCRIBE_THREADS", "2")
+    monkeypatch.setenv("TRANSCRIBE_BATCH_SIZE", "8")
+    monkeypatch.delenv("TRANSCRIBE_ALIGN", raising=False)
+
+    backend = get_transcription_backend("faster-whisper")
+
+    assert (backend.model_size, backend.threads, backend.batch_size) == ("tiny", 2, 8)
+    assert backend.profile["word_timing"] == "segment only"
+    assert "WARNING" in capsys.readouterr().out
+
+
+def test_unknown_backend_or_model_is_rejected():
+    with pytest.raises(ValueError):
+        get_transcription_backend("kaldi")
+    with pytest.raises(ValueError):
+        FasterWhisperBackend(model_size="huge")
+
+
+def test_transcribe_returns_whisperx_segments_with_word_timings():
+    backend = FasterWhisperBackend(model_size="tiny", threads=1)
+    backend.model = FakeWhisperModel()
+
+    segments = backend.transcribe(np.zeros(16000, dtype=np.float32))
+
+    assert backend.model.calls[0]["word_timestamps"] is True
+    assert backend.model.calls[0]["vad_filter"] is True
+    assert segments == [{"start": 0.5, "end": 1.4, "text": " hello world", "words": [
+        {"word": "hello", "start": 0.5, "end": 0.9, "score": 0.8},
+        {"word": "world", "start": 1.0, "end": 1.4, "score": 0.7}]}]
+
+
+def test_transcript_cache_key_changes_with_backend_settings(write_wav):
+    audio_path = write_wav(np.zeros(1600))
+
+    keys = {TranscriptCache.make_key(audio_path, **backend.cache_settings()) for backend in (
+        FasterWhisperBackend(model_size="tiny"), FasterWhisperBackend(model_size="small"),
+        FasterWhisperBackend(model_size="small", batch_size=8), FasterWhisperBackend(model_size="small", align=True))}
+
+    assert len(keys) == 4